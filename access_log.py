@@ -0,0 +1,87 @@
+import os
+import re
+import json
+import time
+import random
+import logging
+from flask import g, request, has_request_context
+
+logger = logging.getLogger("access")
+
+# "json" for one structured line per record, "text" for the classic format
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Fraction of successful requests that get an access log line (errors are always logged)
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+# Opt-in: include the (redacted, truncated) request body in access log lines
+LOG_BODIES = os.getenv("LOG_BODIES", "").lower() in ("1", "true", "yes")
+MAX_LOGGED_BODY = int(os.getenv("MAX_LOGGED_BODY", "2048"))
+
+_SENSITIVE = re.compile(r"token|secret|password|authorization|api[_-]?key", re.IGNORECASE)
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; extra fields passed as `extra={"fields": {...}}` are merged in."""
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging():
+    """Set up the root logger from LOG_LEVEL and LOG_FORMAT."""
+    handler = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), handlers=[handler], force=True)
+
+def redact(value):
+    """Mask values under sensitive-looking keys in parsed JSON."""
+    if isinstance(value, dict):
+        return {k: "[redacted]" if _SENSITIVE.search(str(k)) else redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    return value
+
+def record_upstream_call():
+    """Count a Todoist call against the current request, if there is one."""
+    if has_request_context():
+        g.upstream_calls = g.get("upstream_calls", 0) + 1
+
+def _start_timer():
+    g.request_started = time.perf_counter()
+    g.upstream_calls = 0
+
+def _log_access(response):
+    if response.status_code < 400 and random.random() >= ACCESS_LOG_SAMPLE_RATE:
+        return response
+    started = g.get("request_started")
+    fields = {
+        "method": request.method,
+        "route": request.url_rule.rule if request.url_rule else None,
+        "path": request.path,
+        "status": response.status_code,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2) if started else None,
+        "upstream_calls": g.get("upstream_calls", 0),
+        "bytes": response.content_length,
+    }
+    if LOG_BODIES:
+        body = request.get_json(silent=True)
+        if body is not None:
+            fields["request_body"] = json.dumps(redact(body), default=str)[:MAX_LOGGED_BODY]
+    logger.info(
+        f"{request.method} {request.path} {response.status_code} {fields['duration_ms']}ms upstream={fields['upstream_calls']}",
+        extra={"fields": fields},
+    )
+    return response
+
+def init_access_log(app):
+    """Register the timing and access-log hooks on the app."""
+    app.before_request(_start_timer)
+    app.after_request(_log_access)
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
-from utils import get_headers
-import requests
+from store import get_store, SyncError
+from streaming import list_response
+from models import Task
 from datetime import datetime, timedelta
 
 ai_bp = Blueprint('ai', __name__)
@@ -65,19 +66,22 @@ def summarize_project():
     project_id = data.get("project_id")
     if not project_id:
         return jsonify({"error": "project_id required"}), 400
-    tasks_resp = requests.get(f"https://api.todoist.com/rest/v2/tasks?project_id={project_id}", headers=get_headers())
-    tasks = tasks_resp.json()
+    try:
+        tasks = get_store().query(project_id=project_id)
+    except SyncError as e:
+        return jsonify({"error": "Failed to fetch tasks"}), e.status_code
     summary = {
         "total": len(tasks),
-        "completed": sum(1 for t in tasks if t.get("is_completed")),
-        "remaining": sum(1 for t in tasks if not t.get("is_completed")),
-        "tasks": [t.get("content") for t in tasks]
+        "completed": 0,  # the store only mirrors active tasks
+        "remaining": len(tasks),
+        "tasks": [t.content for t in tasks]
     }
     return jsonify(summary)
 
 @ai_bp.route("/get-blocked-tasks", methods=["GET"])
 def get_blocked_tasks():
-    resp = requests.get("https://api.todoist.com/rest/v2/tasks", headers=get_headers())
-    tasks = resp.json()
-    blocked = [t for t in tasks if 'blocked' in [lbl.lower() for lbl in t.get('labels', [])]]
-    return jsonify(blocked)
+    try:
+        blocked = get_store().query(label="blocked")
+    except SyncError as e:
+        return jsonify({"error": "Failed to fetch tasks"}), e.status_code
+    return list_response(blocked, Task.to_dict)
@@ -1,81 +1,117 @@
-from flask import Flask, request, jsonify
-from tasks import tasks_bp
-from projects import projects_bp
-from sections import sections_bp
-from labels import labels_bp
-from ai import ai_bp
-from filters import filters_bp
-from collab import collab_bp
-from webhook import webhook_bp
-from edit_tasks import edit_tasks_bp
-
+import os
 import logging
+from importlib import import_module
+from dotenv import load_dotenv
 
-# Set up logging for debugging
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger(__name__)
+# Load environment variables from .env before any module reads its settings
+load_dotenv()
+
+from flask import Flask, Response, jsonify
+from access_log import configure_logging, init_access_log
+from compression import init_compression
+from metrics import init_metrics, render as render_metrics, reset as reset_metrics
+from ratelimit import RateLimited
+from tenants import NoTenant, init_tenants
+
+# Log every registered URL rule at startup (off by default; it runs on every worker boot)
+LOG_URL_RULES = os.getenv("LOG_URL_RULES", "").lower() in ("1", "true", "yes")
 
-app = Flask(__name__)
+# (module, blueprint, url prefix), imported when the app is built
+BLUEPRINTS = [
+    ("tasks", "tasks_bp", None),
+    ("projects", "projects_bp", None),
+    ("sections", "sections_bp", None),
+    ("labels", "labels_bp", None),
+    ("ai", "ai_bp", None),
+    ("filters", "filters_bp", None),
+    ("collab", "collab_bp", None),
+    ("webhook", "webhook_bp", None),
+    ("batch", "batch_bp", None),
+    ("jobs", "jobs_bp", None),
+    # NOTE: All edit-tasks endpoints will now be available at /tasks/*
+    ("edit_tasks", "edit_tasks_bp", "/tasks"),
+]
+
+logger = logging.getLogger(__name__)
 
 # Log blueprint registration with optional URL prefix
-def log_and_register_blueprint(blueprint, url_prefix=None):
+def log_and_register_blueprint(app, blueprint, url_prefix=None):
     if url_prefix:
-        logger.info(f"Registering blueprint: {blueprint.name} at prefix: {url_prefix}")
+        logger.debug(f"Registering blueprint: {blueprint.name} at prefix: {url_prefix}")
         app.register_blueprint(blueprint, url_prefix=url_prefix)
     else:
-        logger.info(f"Registering blueprint: {blueprint.name}")
+        logger.debug(f"Registering blueprint: {blueprint.name}")
         app.register_blueprint(blueprint)
 
-# Register all blueprints
-log_and_register_blueprint(tasks_bp)
-log_and_register_blueprint(projects_bp)
-log_and_register_blueprint(sections_bp)
-log_and_register_blueprint(labels_bp)
-log_and_register_blueprint(ai_bp)
-log_and_register_blueprint(filters_bp)
-log_and_register_blueprint(collab_bp)
-log_and_register_blueprint(webhook_bp)
-# NOTE: All edit-tasks endpoints will now be available at /tasks/*
-log_and_register_blueprint(edit_tasks_bp, url_prefix="/tasks")
-
-@app.route("/", methods=["GET"])
-def index():
-    logger.debug("Index route called")
-    return {"status": "FlexBot Todoist API running."}
-
 # Log all registered URL rules for enhanced debugging
-def log_url_rules():
+def log_url_rules(app):
     logger.info("\n=== Registered URL Rules ===")
     for rule in app.url_map.iter_rules():
         logger.info(rule)
     logger.info("=== End of URL Rules ===\n")
 
-# Always log URL rules at startup
-with app.app_context():
-    log_url_rules()
-
-# Log every request (for extra debugging)
-@app.before_request
-def log_request_info():
-    logger.debug(f"Handling {request.method} request for {request.url}")
-    logger.debug(f"Request headers: {dict(request.headers)}")
-    logger.debug(f"Request body: {request.get_data()}")
-
-# Log responses (for debugging responses)
-@app.after_request
-def log_response_info(response):
-    logger.debug(f"Response status: {response.status}")
-    logger.debug(f"Response data: {response.get_data(as_text=True)}")
-    return response
-
-# Enhanced error handler (shows errors in logs)
-@app.errorhandler(Exception)
-def handle_exception(e):
-    logger.exception(f"Exception occurred: {e}")
-    response = jsonify({"error": str(e)})
-    response.status_code = 500
-    return response
+def create_app():
+    """
+    Build the app and import every blueprint module. `app` below is built when app.py is
+    imported, so with preload_app the gunicorn master imports everything once and forks
+    the workers from it. Nothing in the modules talks to Todoist or starts threads until
+    the first request, which keeps that fork safe.
+    """
+    # Structured logging; LOG_LEVEL=DEBUG brings back the verbose output
+    configure_logging()
+
+    app = Flask(__name__)
+    init_access_log(app)
+    init_metrics(app)
+    init_tenants(app)
+    # Registered last so it runs first: the access log and metrics see the compressed size
+    init_compression(app)
+
+    for module, name, url_prefix in BLUEPRINTS:
+        log_and_register_blueprint(app, getattr(import_module(module), name), url_prefix)
+
+    @app.route("/", methods=["GET"])
+    def index():
+        logger.debug("Index route called")
+        return {"status": "FlexBot Todoist API running."}
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        """Prometheus text exposition of the request, upstream and cache metrics of every worker on the host."""
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+    # Upstream calls that would queue too long for a rate-limit token
+    @app.errorhandler(RateLimited)
+    def handle_rate_limited(e):
+        logger.warning(str(e))
+        response = jsonify({"error": str(e)})
+        response.status_code = 429
+        response.headers["Retry-After"] = str(max(1, round(e.retry_after)))
+        return response
+
+    # Requests that name no usable Todoist account
+    @app.errorhandler(NoTenant)
+    def handle_no_tenant(e):
+        response = jsonify({"error": str(e)})
+        response.status_code = 401
+        return response
+
+    # Enhanced error handler (shows errors in logs)
+    @app.errorhandler(Exception)
+    def handle_exception(e):
+        logger.exception(f"Exception occurred: {e}")
+        response = jsonify({"error": str(e)})
+        response.status_code = 500
+        return response
+
+    if LOG_URL_RULES:
+        log_url_rules(app)
+    logger.info(f"App ready with {len(BLUEPRINTS)} blueprints")
+    return app
+
+app = create_app()
 
 if __name__ == "__main__":
     logger.info("Starting FlexBot Todoist API (debug mode)...")
+    reset_metrics()
     app.run(debug=True)
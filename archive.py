@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import logging
+import tempfile
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+import requests
+import ratelimit
+import todoist_client
+import tenants
+from sqlite_db import Database, transaction
+
+logger = logging.getLogger(__name__)
+
+# SQLite file with every account's completed items and daily counts, shared by the workers on the host
+ARCHIVE_PATH = os.getenv("ARCHIVE_PATH", os.path.join(tempfile.gettempdir(), "flexbot-archive.db"))
+# Seconds between pulls of newly completed items
+ARCHIVE_REFRESH_INTERVAL = float(os.getenv("ARCHIVE_REFRESH_INTERVAL", "60"))
+# Items per completed/get_all page (Todoist allows at most 200)
+ARCHIVE_PAGE_SIZE = int(os.getenv("ARCHIVE_PAGE_SIZE", "200"))
+
+# Summary windows ending today (UTC), in days
+WINDOWS = {"week": 7, "month": 30}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS completed (
+        tenant TEXT NOT NULL, id TEXT NOT NULL, completed_at TEXT NOT NULL, item TEXT NOT NULL,
+        PRIMARY KEY (tenant, id)
+    );
+    CREATE INDEX IF NOT EXISTS completed_by_time ON completed(tenant, completed_at);
+    CREATE TABLE IF NOT EXISTS daily (
+        tenant TEXT NOT NULL, day TEXT NOT NULL, project_id TEXT NOT NULL, label TEXT NOT NULL,
+        count INTEGER NOT NULL, PRIMARY KEY (tenant, day, project_id, label)
+    );
+    CREATE TABLE IF NOT EXISTS cursors (
+        tenant TEXT PRIMARY KEY, completed_at TEXT, refreshed_at REAL NOT NULL
+    );
+    -- A pull that has stored some pages but not all: where the next attempt picks up
+    CREATE TABLE IF NOT EXISTS pulls (
+        tenant TEXT PRIMARY KEY, since TEXT, until TEXT NOT NULL, "offset" INTEGER NOT NULL, newest TEXT
+    );
+"""
+
+class ArchiveError(Exception):
+    """Raised when the archive is empty and Todoist can't be reached."""
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.status_code = status_code
+
+def _item_id(item):
+    # Completion records have their own id; fall back to task and time for older payloads
+    return str(item.get("id") or f"{item.get('task_id')}@{item['completed_at']}")
+
+def _api_time(stamp):
+    """completed_at ("2024-05-01T10:13:00.000000Z") in the since/until format Todoist expects."""
+    return stamp[:19]
+
+def summary_window(window=None, since=None, until=None):
+    """
+    Resolve a summary window to inclusive (since, until) UTC days as ISO strings.
+    `window` is "week" or "month" (ending today); since/until are YYYY-MM-DD and win over it.
+    Raises ValueError on bad input.
+    """
+    today = datetime.now(timezone.utc).date()
+    if window is not None and window not in WINDOWS:
+        raise ValueError(f"window must be one of {', '.join(WINDOWS)}")
+    start = today - timedelta(days=WINDOWS[window or "week"] - 1)
+    end = today
+    try:
+        if since:
+            start = datetime.strptime(since, "%Y-%m-%d").date()
+        if until:
+            end = datetime.strptime(until, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError("since and until must be dates (YYYY-MM-DD)")
+    if start > end:
+        raise ValueError("since must not be after until")
+    return start.isoformat(), end.isoformat()
+
+class Archive:
+    """
+    Append-only local copy of one account's completed items. Each refresh pulls only
+    items completed since the newest one seen, and counts every new item into daily
+    buckets per project and per label, so summaries never rescan the history.
+    """
+    def __init__(self, path=ARCHIVE_PATH, tenant=None):
+        self.path = path
+        self.tenant = tenant
+        self._db = Database(path, SCHEMA)
+        self._refresh_lock = Lock()
+
+    def close(self):
+        self._db.close()
+
+    def _cursor(self):
+        with self._db.connect() as conn:
+            row = conn.execute(
+                "SELECT completed_at, refreshed_at FROM cursors WHERE tenant = ?", (self.tenant,)).fetchone()
+        return row or (None, 0.0)
+
+    def refresh(self, force=False):
+        """
+        Pull items completed since the last refresh (at most every ARCHIVE_REFRESH_INTERVAL
+        seconds unless forced). Returns how many new items were archived. If Todoist fails,
+        the archive keeps serving what it has, unless it has nothing yet; either way the
+        next attempt waits out the interval and resumes after the last stored page.
+        """
+        newest, refreshed_at = self._cursor()
+        if not force and time.time() - refreshed_at < ARCHIVE_REFRESH_INTERVAL:
+            return 0
+        if not self._refresh_lock.acquire(blocking=force):
+            return 0  # another thread is already pulling
+        try:
+            return self._refresh(newest)
+        except (ArchiveError, ratelimit.RateLimited, requests.RequestException):
+            with self._db.connect() as conn:
+                conn.execute(
+                    "INSERT INTO cursors (tenant, completed_at, refreshed_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (tenant) DO UPDATE SET refreshed_at = excluded.refreshed_at",
+                    (self.tenant, newest, time.time()))
+            if self._empty():
+                raise
+            logger.exception("Archive refresh failed; serving the archived items")
+            return 0
+        finally:
+            self._refresh_lock.release()
+
+    def _empty(self):
+        with self._db.connect() as conn:
+            return conn.execute("SELECT 1 FROM completed WHERE tenant = ? LIMIT 1", (self.tenant,)).fetchone() is None
+
+    def _refresh(self, newest):
+        # A fixed `until` keeps offsets stable while new items are completed during the pull;
+        # pages come newest first, and a repeated item is ignored by its primary key.
+        # Each page is stored with the pull's position, so a failed backfill resumes there.
+        with self._db.connect() as conn:
+            pull = conn.execute(
+                'SELECT since, until, "offset", newest FROM pulls WHERE tenant = ?', (self.tenant,)).fetchone()
+        if pull is None:
+            pull = (_api_time(newest) if newest else None, _api_time(datetime.now(timezone.utc).isoformat()), 0, newest)
+        since, until, offset, newest = pull
+        params = {"limit": ARCHIVE_PAGE_SIZE, "until": until, "annotate_items": "true"}
+        if since:
+            params["since"] = since
+        added = 0
+        while True:
+            resp = todoist_client.get("/sync/v9/completed/get_all", params={**params, "offset": offset})
+            try:
+                items = resp.json().get("items", [])
+            except (ValueError, AttributeError):
+                items = None
+            if resp.status_code != 200 or items is None:
+                raise ArchiveError("Failed to fetch completed tasks", resp.status_code)
+            newest = max([newest or "", *(item["completed_at"] for item in items)]) or None
+            offset += len(items)
+            done = len(items) < ARCHIVE_PAGE_SIZE
+            added += self._append(items, (since, until, offset, newest), done)
+            if done:
+                break
+        if added:
+            logger.info(f"Archived {added} completed items")
+        return added
+
+    def _append(self, items, pull, done):
+        """
+        Insert new items, bump their daily buckets and record the pull's position in one
+        transaction; when the pull is `done`, advance the cursor instead. Returns how many were new.
+        """
+        added = 0
+        with self._db.connect() as conn, transaction(conn):
+            for item in items:
+                task = item.pop("item_object", None) or {}
+                inserted = conn.execute(
+                    "INSERT OR IGNORE INTO completed (tenant, id, completed_at, item) VALUES (?, ?, ?, ?)",
+                    (self.tenant, _item_id(item), item["completed_at"], json.dumps(item, separators=(",", ":"))),
+                ).rowcount
+                if not inserted:
+                    continue
+                added += 1
+                # label "" is the project's total; one more row per label the task carried
+                day, project_id = item["completed_at"][:10], str(item.get("project_id") or "")
+                conn.executemany(
+                    "INSERT INTO daily (tenant, day, project_id, label, count) VALUES (?, ?, ?, ?, 1) "
+                    "ON CONFLICT (tenant, day, project_id, label) DO UPDATE SET count = count + 1",
+                    [(self.tenant, day, project_id, label) for label in ["", *(task.get("labels") or [])]],
+                )
+            if done:
+                conn.execute("DELETE FROM pulls WHERE tenant = ?", (self.tenant,))
+                conn.execute("INSERT OR REPLACE INTO cursors (tenant, completed_at, refreshed_at) VALUES (?, ?, ?)",
+                             (self.tenant, pull[3], time.time()))
+            else:
+                conn.execute('INSERT OR REPLACE INTO pulls (tenant, since, until, "offset", newest) VALUES (?, ?, ?, ?, ?)',
+                             (self.tenant, *pull))
+        return added
+
+    def items(self, since, until):
+        """Archived items completed on UTC days since..until (inclusive), newest first."""
+        with self._db.connect() as conn:
+            rows = conn.execute(
+                "SELECT item FROM completed WHERE tenant = ? AND completed_at >= ? AND completed_at < ? "
+                "ORDER BY completed_at DESC",
+                (self.tenant, since, (datetime.strptime(until, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")),
+            )
+            return [json.loads(item) for (item,) in rows]
+
+    def summary(self, since, until):
+        """Completed counts for UTC days since..until (inclusive): total, per day, per project and per label."""
+        args = (self.tenant, since, until)
+        where = "tenant = ? AND day BETWEEN ? AND ?"
+        with self._db.connect() as conn:
+            by_day = dict(conn.execute(
+                f"SELECT day, SUM(count) FROM daily WHERE {where} AND label = '' GROUP BY day ORDER BY day", args))
+            by_project = dict(conn.execute(
+                f"SELECT project_id, SUM(count) FROM daily WHERE {where} AND label = '' GROUP BY project_id", args))
+            by_label = dict(conn.execute(
+                f"SELECT label, SUM(count) FROM daily WHERE {where} AND label != '' GROUP BY label", args))
+        return {"since": since, "until": until, "total": sum(by_day.values()),
+                "by_day": by_day, "by_project": by_project, "by_label": by_label}
+
+def get_archive():
+    """Return the current tenant's completed-items archive."""
+    tenant = tenants.current()
+    return tenant.resource("archive", lambda: Archive(ARCHIVE_PATH, tenant.key))
@@ -0,0 +1,115 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, request, jsonify
+from store import refresh_after_write
+import todoist_client
+import ratelimit
+
+batch_bp = Blueprint('batch', __name__)
+batch_bp.after_request(refresh_after_write)
+
+# Upper bound on operations accepted in one /batch request
+MAX_BATCH_OPERATIONS = int(os.getenv("MAX_BATCH_OPERATIONS", "1000"))
+# Upper bound on concurrent upstream requests in "parallel" mode
+MAX_BATCH_CONCURRENCY = int(os.getenv("MAX_BATCH_CONCURRENCY", str(todoist_client.POOL_SIZE)))
+
+OPS = ("create", "update", "close", "delete", "move", "assign_labels")
+
+def build_command(operation, index):
+    """Translate one /batch operation into a Sync API command. Raises ValueError if it is invalid."""
+    op = operation.get("op")
+    args = dict(operation.get("args") or {})
+    task_id = operation.get("task_id")
+    if op not in OPS:
+        raise ValueError(f"Unknown op: {op}")
+    if op != "create" and not task_id:
+        raise ValueError("task_id required")
+
+    if op == "create":
+        if "title" in args:
+            args["content"] = args.pop("title")
+        if not args.get("content"):
+            raise ValueError("args.content (or args.title) required")
+        return todoist_client.command("item_add", args, temp_id=f"batch-{index}")
+    if op == "update":
+        return todoist_client.command("item_update", {**args, "id": task_id})
+    if op == "close":
+        return todoist_client.command("item_close", {"id": task_id})
+    if op == "delete":
+        return todoist_client.command("item_delete", {"id": task_id})
+    if op == "move":
+        target = {k: args[k] for k in ("project_id", "section_id", "parent_id") if args.get(k) is not None}
+        if len(target) != 1:
+            raise ValueError("move needs exactly one of project_id, section_id or parent_id")
+        return todoist_client.command("item_move", {**target, "id": task_id})
+    if op == "assign_labels":
+        if not isinstance(args.get("labels"), list):
+            raise ValueError("args.labels (list of label names) required")
+        return todoist_client.command("item_update", {"id": task_id, "labels": args["labels"]})
+
+def run_commands(commands, mode="sync", concurrency=MAX_BATCH_CONCURRENCY):
+    """
+    Execute commands either as chunked Sync batches ("sync") or one command per request
+    on a bounded thread pool ("parallel"). Returns (sync_status, temp_id_mapping).
+    """
+    if mode != "parallel" or len(commands) < 2:
+        return todoist_client.sync_commands(commands)
+    sync_status, temp_id_mapping = {}, {}
+    workers = max(1, min(concurrency, MAX_BATCH_CONCURRENCY, len(commands)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        send = ratelimit.bind(lambda cmd: todoist_client.sync_commands([cmd]))
+        for status, mapping in pool.map(send, commands):
+            sync_status.update(status)
+            temp_id_mapping.update(mapping)
+    return sync_status, temp_id_mapping
+
+@batch_bp.route("/batch", methods=["POST"])
+def batch():
+    data = request.get_json() or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    operations = data.get("operations")
+    mode = data.get("mode", "sync")
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "operations (non-empty list) required"}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({"error": f"At most {MAX_BATCH_OPERATIONS} operations per batch"}), 400
+    if mode not in ("sync", "parallel"):
+        return jsonify({"error": "mode must be 'sync' or 'parallel'"}), 400
+    concurrency = data.get("concurrency", MAX_BATCH_CONCURRENCY)
+    if not isinstance(concurrency, int) or concurrency < 1:
+        return jsonify({"error": "concurrency must be a positive integer"}), 400
+
+    # Validate everything up front; invalid operations are reported, valid ones still run
+    results = []
+    commands = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            results.append({"index": index, "status": 400, "error": "operation must be an object"})
+            continue
+        result = {"index": index, "op": operation.get("op"), "task_id": operation.get("task_id")}
+        try:
+            cmd = build_command(operation, index)
+        except ValueError as e:
+            result.update({"status": 400, "error": str(e)})
+        else:
+            result["uuid"] = cmd["uuid"]
+            commands.append(cmd)
+        results.append(result)
+
+    with ratelimit.bulk():
+        sync_status, temp_id_mapping = run_commands(commands, mode, concurrency)
+
+    for result, cmd in zip((r for r in results if "uuid" in r), commands):
+        status = sync_status.get(result.pop("uuid"), "unknown")
+        result["status"] = todoist_client.command_result(status)
+        result["sync_status"] = status
+        if cmd.get("temp_id") in temp_id_mapping:
+            result["task_id"] = temp_id_mapping[cmd["temp_id"]]
+
+    failed = sum(1 for r in results if r["status"] != 200)
+    return jsonify({
+        "results": results,
+        "succeeded": len(results) - failed,
+        "failed": failed,
+    }), 200 if not failed else 207
@@ -0,0 +1,316 @@
+"""
+Local stand-in for the Todoist API, for benchmarks that must not touch the real one.
+
+Serves REST v2 tasks/projects/sections/labels/comments and Sync v9 `sync` (reads with
+sync_token deltas, and item/label commands) plus `completed/get_all`, over a generated
+account. Latency, account size and 429 injection are configurable.
+
+    python bench/fake_todoist.py --port 8900 --tasks 10000 --latency 0.05 --rate-429 0.01
+
+GET /__stats returns upstream call counts by route; POST /__reset clears them.
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_ID = re.compile(r"/\d+")
+
+class Account:
+    """A generated Todoist account plus a change log for sync_token deltas."""
+    def __init__(self, tasks=1000, projects=None, labels=20, completed=500, content_size=40, seed=1):
+        rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.version = 0
+        self.changes = []            # (version, resource, object)
+        self.next_id = 10 ** 9
+        self.user = {"id": str(1000 + seed), "full_name": "Bench User", "tz_info": {"timezone": "UTC"}}
+        today = date.today()
+        projects = projects or max(1, tasks // 100)
+
+        self.projects = {}
+        for n in range(projects):
+            self._put("projects", {"id": self._new_id(), "name": f"Project {n}", "color": "grey", "parent_id": None,
+                                   "child_order": n, "is_deleted": False, "is_archived": False})
+        project_ids = list(self.projects)
+        self.sections = {}
+        for n, project_id in enumerate(project_ids):
+            for k in range(3):
+                self._put("sections", {"id": self._new_id(), "project_id": project_id, "name": f"Section {k}",
+                                       "section_order": k, "is_deleted": False, "is_archived": False})
+        section_ids = list(self.sections)
+        self.labels = {}
+        for n in range(labels):
+            self._put("labels", {"id": self._new_id(), "name": "blocked" if n == 0 else f"label-{n}",
+                                 "color": "grey", "item_order": n, "is_favorite": False, "is_deleted": False})
+        label_names = [label["name"] for label in self.labels.values()]
+
+        self.items = {}
+        for n in range(tasks):
+            section_id = rng.choice(section_ids) if rng.random() < 0.5 else None
+            project_id = self.sections[section_id]["project_id"] if section_id else rng.choice(project_ids)
+            due = None
+            if rng.random() < 0.6:
+                day = today + timedelta(days=rng.randint(-30, 30))
+                due = {"date": day.isoformat(), "string": day.isoformat(), "lang": "en",
+                       "is_recurring": False, "timezone": None}
+            self._put("items", {
+                "id": self._new_id(), "content": f"Task {n} " + "x" * content_size, "description": "",
+                "project_id": project_id, "section_id": section_id, "parent_id": None,
+                "child_order": n, "priority": rng.randint(1, 4), "labels": rng.sample(label_names, rng.randint(0, 2)),
+                "due": due, "checked": False, "is_deleted": False, "added_at": "2024-01-01T00:00:00Z",
+            })
+        self.comments = {}
+        now = datetime.now(timezone.utc)
+        self.completed = sorted(({
+            "id": str(n + 1), "task_id": self._new_id(), "content": f"Done {n}", "project_id": rng.choice(project_ids),
+            "completed_at": (now - timedelta(hours=rng.randint(0, 24 * 30))).strftime("%Y-%m-%dT%H:%M:%S.000000Z"),
+            "labels": rng.sample(label_names, rng.randint(0, 2)),
+        } for n in range(completed)), key=lambda c: c["completed_at"], reverse=True)
+
+    def _new_id(self):
+        self.next_id += 1
+        return str(self.next_id)
+
+    def _put(self, resource, obj):
+        self.version += 1
+        getattr(self, resource)[obj["id"]] = obj
+        self.changes.append((self.version, resource, dict(obj)))
+
+    def sync_read(self, token, resource_types):
+        wanted = lambda r: "all" in resource_types or r in resource_types
+        if token == "*":
+            data = {r: [o for o in getattr(self, r).values() if not o.get("is_deleted") and not o.get("checked")]
+                    for r in ("items", "labels", "projects", "sections") if wanted(r)}
+            if wanted("user"):
+                data["user"] = self.user
+            return {"full_sync": True, "sync_token": str(self.version), **data}
+        data = {}
+        for version, resource, obj in self.changes:
+            if version > int(token) and wanted(resource):
+                data.setdefault(resource, []).append(obj)
+        return {"full_sync": False, "sync_token": str(self.version), **data}
+
+    def sync_commands(self, commands):
+        status, temp_ids = {}, {}
+        for cmd in commands:
+            args, kind = dict(cmd.get("args") or {}), cmd.get("type")
+            for key in ("id", "parent_id", "project_id", "section_id"):
+                if args.get(key) in temp_ids:
+                    args[key] = temp_ids[args[key]]
+            if kind == "item_add":
+                item = {"id": self._new_id(), "content": args.get("content"), "description": args.get("description", ""),
+                        "project_id": args.get("project_id") or next(iter(self.projects)), "section_id": args.get("section_id"),
+                        "parent_id": args.get("parent_id"), "child_order": 0, "priority": args.get("priority", 1),
+                        "labels": args.get("labels", []), "due": _due(args.get("due")), "checked": False, "is_deleted": False}
+                self._put("items", item)
+                if cmd.get("temp_id"):
+                    temp_ids[cmd["temp_id"]] = item["id"]
+                status[cmd["uuid"]] = "ok"
+            elif kind and kind.startswith("item_") and args.get("id") in self.items:
+                item = dict(self.items[args["id"]])
+                if kind == "item_update":
+                    item.update({k: (_due(v) if k == "due" else v) for k, v in args.items() if k not in ("id", "label_ids")})
+                elif kind == "item_close":
+                    item["checked"] = True
+                elif kind == "item_delete":
+                    item["is_deleted"] = True
+                elif kind == "item_move":
+                    item.update({k: args[k] for k in ("project_id", "section_id", "parent_id") if k in args})
+                self._put("items", item)
+                status[cmd["uuid"]] = "ok"
+            else:
+                status[cmd["uuid"]] = {"error_code": 22, "error": "Item not found", "http_code": 404}
+        return {"sync_status": status, "temp_id_mapping": temp_ids, "sync_token": str(self.version), "full_sync": False}
+
+def _due(value):
+    if not value:
+        return None
+    if isinstance(value, dict) and value.get("date"):
+        return value
+    return {"date": date.today().isoformat(), "string": (value or {}).get("string") if isinstance(value, dict) else value,
+            "lang": "en", "is_recurring": False, "timezone": None}
+
+def rest_task(item):
+    return {"id": item["id"], "content": item["content"], "description": item.get("description", ""),
+            "project_id": item["project_id"], "section_id": item.get("section_id"), "parent_id": item.get("parent_id"),
+            "order": item.get("child_order"), "priority": item.get("priority", 1), "labels": item.get("labels", []),
+            "due": item.get("due"), "is_completed": item.get("checked", False), "comment_count": 0,
+            "url": f"https://todoist.com/showTask?id={item['id']}"}
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    account = None
+    latency = 0.0
+    rate_429 = 0.0
+    retry_after = "1"
+    stats = {}
+    stats_lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, obj=None, headers=()):
+        body = b"" if obj is None else json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not raw:
+            return {}
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return {k: v[0] for k, v in parse_qs(raw.decode()).items()}
+
+    def _handle(self, method):
+        url = urlparse(self.path)
+        body = self._body() if method in ("POST", "PUT") else {}
+        if url.path == "/__stats":
+            with self.stats_lock:
+                return self._send(200, dict(self.stats))
+        if url.path == "/__reset":
+            with self.stats_lock:
+                self.stats.clear()
+            return self._send(204)
+
+        with self.stats_lock:
+            key = f"{method} {_ID.sub('/{id}', url.path)}"
+            self.stats[key] = self.stats.get(key, 0) + 1
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.8, 1.2))
+        if self.rate_429 and random.random() < self.rate_429:
+            return self._send(429, {"error": "Too many requests"}, [("Retry-After", self.retry_after)])
+        with self.account.lock:
+            code, obj = self.route(method, url.path, parse_qs(url.query), body)
+        self._send(code, obj)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def route(self, method, path, query, body):
+        a = self.account
+        arg = lambda name: (query.get(name) or [None])[0]
+        if path == "/sync/v9/sync":
+            if "commands" in body:
+                commands = body["commands"]
+                return 200, a.sync_commands(json.loads(commands) if isinstance(commands, str) else commands)
+            types = body.get("resource_types", ["all"])
+            return 200, a.sync_read(body.get("sync_token", "*"), json.loads(types) if isinstance(types, str) else types)
+        if path == "/sync/v9/completed/get_all":
+            # Newest first, like Todoist; labels only come back inside item_object
+            since, until, offset = arg("since"), arg("until"), int(arg("offset") or 0)
+            items = [{k: v for k, v in c.items() if k != "labels"} | (
+                {"item_object": {"labels": c["labels"]}} if arg("annotate_items") == "true" else {})
+                for c in a.completed if (not since or c["completed_at"] >= since) and (not until or c["completed_at"][:19] <= until)]
+            return 200, {"items": items[offset:offset + int(arg("limit") or 30)], "projects": {}}
+
+        parts = path.strip("/").split("/")
+        if parts[:2] != ["rest", "v2"] or len(parts) < 3:
+            return 404, {"error": "Not found"}
+        resource, object_id, action = parts[2], (parts[3] if len(parts) > 3 else None), (parts[4] if len(parts) > 4 else None)
+
+        if resource == "tasks":
+            if object_id is None:
+                if method == "POST":
+                    result = a.sync_commands([{"type": "item_add", "uuid": "rest", "temp_id": "rest", "args": {
+                        "content": body.get("content"), "project_id": body.get("project_id"),
+                        "section_id": body.get("section_id"), "priority": body.get("priority", 1),
+                        "labels": body.get("labels", []), "due": {"string": body["due_string"]} if body.get("due_string") else None}}])
+                    return 200, rest_task(a.items[result["temp_id_mapping"]["rest"]])
+                items = [i for i in a.items.values() if not i["checked"] and not i["is_deleted"]]
+                for field in ("project_id", "section_id", "label"):
+                    if arg(field):
+                        items = [i for i in items if (arg(field) in i["labels"] if field == "label" else i.get(field) == arg(field))]
+                return 200, [rest_task(i) for i in items]
+            item = a.items.get(object_id)
+            if item is None or item["is_deleted"]:
+                return 404, None
+            if method == "DELETE":
+                a.sync_commands([{"type": "item_delete", "uuid": "rest", "args": {"id": object_id}}])
+                return 204, None
+            if method == "POST" and action in ("close", "reopen"):
+                a._put("items", {**item, "checked": action == "close"})
+                return 204, None
+            if method == "POST":
+                update = {k: v for k, v in body.items() if k in ("content", "description", "priority", "labels")}
+                if body.get("due_string"):
+                    update["due"] = {"string": body["due_string"]}
+                a.sync_commands([{"type": "item_update", "uuid": "rest", "args": {"id": object_id, **update}}])
+                return 200, rest_task(a.items[object_id])
+            return 200, rest_task(item)
+
+        if resource in ("projects", "sections", "labels"):
+            store = getattr(a, resource)
+            if object_id is None and method == "GET":
+                objs = [o for o in store.values() if not o.get("is_deleted")]
+                if resource == "sections" and arg("project_id"):
+                    objs = [o for o in objs if o["project_id"] == arg("project_id")]
+                return 200, objs
+            if object_id is None and method == "POST":
+                obj = {"id": a._new_id(), "is_deleted": False, **body}
+                a._put(resource, obj)
+                return 200, obj
+            if object_id not in store:
+                return 404, None
+            if method == "DELETE":
+                a._put(resource, {**store[object_id], "is_deleted": True})
+                return 204, None
+            a._put(resource, {**store[object_id], **body})
+            return 200, store[object_id]
+
+        if resource == "comments":
+            if method == "POST":
+                comment = {"id": a._new_id(), "task_id": body.get("task_id"), "content": body.get("content"),
+                           "posted_at": datetime.now(timezone.utc).isoformat()}
+                a.comments[comment["id"]] = comment
+                return 200, comment
+            return 200, [c for c in a.comments.values() if c["task_id"] == arg("task_id")]
+        return 404, {"error": "Not found"}
+
+def start(port=0, tasks=1000, latency=0.0, rate_429=0.0, retry_after="1", **account_kwargs):
+    """Start the stand-in on a daemon thread; returns (server, base URL)."""
+    handler = type("BoundHandler", (Handler,), {
+        "account": Account(tasks=tasks, **account_kwargs), "latency": latency,
+        "rate_429": rate_429, "retry_after": retry_after, "stats": {},
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-todoist", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--tasks", type=int, default=1000, help="active tasks in the account (1k-100k)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", default="1", help="Retry-After header sent with injected 429s")
+    args = parser.parse_args()
+    server, url = start(args.port, args.tasks, args.latency, args.rate_429, args.retry_after)
+    print(f"Fake Todoist with {args.tasks} tasks at {url}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
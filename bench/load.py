@@ -0,0 +1,292 @@
+"""
+Load benchmark: runs the app against bench/fake_todoist.py and drives every route
+under concurrent load, then reports per-route p50/p95/p99 latency, overall RPS,
+Todoist calls per request and the app's peak RSS.
+
+    python bench/load.py --tasks 10000 --latency 0.05 --concurrency 32 --duration 30
+    python bench/load.py --mix read --server flask --json bench_output.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_until_up(url, proc, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{proc.args[0]} exited with {proc.returncode}")
+        try:
+            if requests.get(url, timeout=1).status_code < 500:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+def start_fake(args):
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "bench", "fake_todoist.py"), "--port", str(port),
+                             "--tasks", str(args.tasks), "--latency", str(args.latency),
+                             "--rate-429", str(args.rate_429), "--retry-after", args.retry_after],
+                            stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    wait_until_up(url + "/__stats", proc)
+    return proc, url
+
+def start_app(args, fake_url):
+    port = free_port()
+    scratch = tempfile.mkdtemp(prefix="flexbot-bench-")
+    env = {
+        **os.environ,
+        "TODOIST_API_URL": fake_url,
+        "TODOIST_API_KEY": "bench-token",
+        "PORT": str(port),
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+        "CACHE_PATH": os.path.join(scratch, "cache.db"),
+        "SNAPSHOT_PATH": os.path.join(scratch, "snapshot.db"),
+        "JOBS_PATH": os.path.join(scratch, "jobs.db"),
+        "ARCHIVE_PATH": os.path.join(scratch, "archive.db"),
+        "METRICS_PATH": os.path.join(scratch, "metrics.db"),
+        "TODOIST_RATE_LIMIT": str(args.rate_limit),
+    }
+    if args.server == "gunicorn":
+        env["WEB_CONCURRENCY"] = str(args.workers)
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"]
+    else:
+        cmd = [sys.executable, "-c", f"import app; app.app.run(port={port}, threaded=True, load_dotenv=False)"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    url = f"http://127.0.0.1:{port}"
+    wait_until_up(url + "/", proc)
+    return proc, url
+
+def process_tree(pid):
+    """pid and all its descendants (Linux /proc)."""
+    pids, queue = [], [pid]
+    while queue:
+        current = queue.pop()
+        pids.append(current)
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                queue.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+def peak_rss_kb(pid):
+    """Peak resident set size (VmHWM) per process in the tree, or {} where /proc is unavailable."""
+    peaks = {}
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peaks[p] = int(line.split()[1])
+        except OSError:
+            pass
+    return peaks
+
+class Context:
+    """IDs from the fake account that scenarios pick from."""
+    def __init__(self, app_url, fake_url):
+        self.tasks = [t["id"] for t in requests.get(app_url + "/list-tasks", timeout=120).json()]
+        self.projects = [p["id"] for p in requests.get(app_url + "/list-projects", timeout=60).json()]
+        self.sections = [s["id"] for s in requests.get(app_url + "/get-sections", timeout=60).json()]
+        self.labels = [label["name"] for label in requests.get(app_url + "/list-labels", timeout=60).json()]
+        self.label_ids = [label["id"] for label in requests.get(app_url + "/list-labels", timeout=60).json()]
+        # Webhooks are routed to the account by the Todoist user ID the deliveries carry
+        self.user_id = requests.post(fake_url + "/sync/v9/sync", json={"sync_token": "*", "resource_types": ["user"]},
+                                     timeout=60).json()["user"]["id"]
+        self._lock = threading.Lock()
+
+    def task(self):
+        return random.choice(self.tasks)
+
+    def take_task(self):
+        """A task no other scenario will pick again (for deletes and completions)."""
+        with self._lock:
+            return self.tasks.pop() if len(self.tasks) > 1 else self.tasks[0]
+
+def scenarios(ctx):
+    """(name, weight, read-only, request builder) for every route in app.py."""
+    r = random.choice
+    return [
+        # tasks
+        ("GET /list-tasks", 10, True, lambda: ("GET", "/list-tasks", None)),
+        ("GET /list-tasks?project_id", 10, True, lambda: ("GET", f"/list-tasks?project_id={r(ctx.projects)}", None)),
+        ("GET /list-tasks?label", 5, True, lambda: ("GET", f"/list-tasks?label={r(ctx.labels)}", None)),
+        ("GET /list-tasks?due_date=today", 5, True, lambda: ("GET", "/list-tasks?due_date=today&tz=Europe/Berlin", None)),
+        ("GET /list-tasks?limit", 5, True, lambda: ("GET", "/list-tasks?limit=100&format=ndjson", None)),
+        ("POST /create-task", 1, False, lambda: ("POST", "/create-task", {"title": "bench task", "project_id": r(ctx.projects)})),
+        ("POST /create-recurring-task", 1, False, lambda: ("POST", "/create-recurring-task", {"title": "bench", "due_string": "every day"})),
+        ("POST /complete-task", 1, False, lambda: ("POST", "/complete-task", {"task_id": ctx.take_task()})),
+        ("POST /delete-task", 1, False, lambda: ("POST", "/delete-task", {"task_id": ctx.take_task()})),
+        ("POST /move-task", 1, False, lambda: ("POST", "/move-task", {"task_id": ctx.task(), "project_id": r(ctx.projects)})),
+        ("POST /duplicate-task", 1, False, lambda: ("POST", "/duplicate-task", {"task_id": ctx.task()})),
+        ("PATCH /tasks/edit-task", 1, False, lambda: ("PATCH", "/tasks/edit-task", {"task_id": ctx.task(), "priority": 2})),
+        # projects, sections, labels
+        ("GET /list-projects", 5, True, lambda: ("GET", "/list-projects", None)),
+        ("POST /create-project", 1, False, lambda: ("POST", "/create-project", {"name": "bench"})),
+        ("POST /edit-project", 1, False, lambda: ("POST", "/edit-project", {"project_id": r(ctx.projects), "name": "renamed"})),
+        ("GET /get-sections", 5, True, lambda: ("GET", f"/get-sections?project_id={r(ctx.projects)}", None)),
+        ("POST /create-section", 1, False, lambda: ("POST", "/create-section", {"name": "bench", "project_id": r(ctx.projects)})),
+        ("POST /edit-section", 1, False, lambda: ("POST", "/edit-section", {"section_id": r(ctx.sections), "name": "renamed"})),
+        ("GET /list-labels", 5, True, lambda: ("GET", "/list-labels", None)),
+        ("POST /create-label", 1, False, lambda: ("POST", "/create-label", {"name": f"bench-{random.randint(0, 10 ** 6)}"})),
+        ("POST /edit-label", 1, False, lambda: ("POST", "/edit-label", {"label_id": r(ctx.label_ids), "color": "red"})),
+        ("POST /assign-labels", 1, False, lambda: ("POST", "/assign-labels", {"task_id": ctx.task(), "label_ids": [r(ctx.label_ids)]})),
+        # filters, ai, collab
+        ("POST /get-tasks-by-filter today", 5, True, lambda: ("POST", "/get-tasks-by-filter", {"filter": "today"})),
+        ("POST /get-tasks-by-filter label", 5, True, lambda: ("POST", "/get-tasks-by-filter", {"filter": r(ctx.labels)})),
+        ("POST /reschedule-by-label", 1, False, lambda: ("POST", "/reschedule-by-label", {"label": r(ctx.labels), "due_string": "tomorrow", "async": True})),
+        ("POST /rollover-overdue", 1, False, lambda: ("POST", "/rollover-overdue", {"async": True})),
+        ("GET /weekly-summary", 2, True, lambda: ("GET", "/weekly-summary", None)),
+        ("GET /completed-summary", 2, True, lambda: ("GET", "/completed-summary?window=month", None)),
+        ("POST /archive-completed", 1, True, lambda: ("POST", "/archive-completed", {})),
+        ("GET /cache-stats", 1, True, lambda: ("GET", "/cache-stats", None)),
+        ("POST /summarize-project", 3, True, lambda: ("POST", "/summarize-project", {"project_id": r(ctx.projects)})),
+        ("GET /get-blocked-tasks", 3, True, lambda: ("GET", "/get-blocked-tasks", None)),
+        ("POST /auto-prioritize", 1, True, lambda: ("POST", "/auto-prioritize", {"title": "urgent report"})),
+        ("POST /smart-sort", 1, True, lambda: ("POST", "/smart-sort", {"title": "soon"})),
+        ("POST /assign-due-date-by-context", 1, True, lambda: ("POST", "/assign-due-date-by-context", {"context": "tomorrow"})),
+        ("POST /suggest-labels-or-sections", 1, True, lambda: ("POST", "/suggest-labels-or-sections", {"title": "meeting"})),
+        ("POST /assign-tasks-to-role", 1, False, lambda: ("POST", "/assign-tasks-to-role", {"task_ids": [ctx.task() for _ in range(10)], "role": "dev", "assignee_id": "1"})),
+        ("POST /mention-alerts", 1, False, lambda: ("POST", "/mention-alerts", {"task_id": ctx.task(), "user_id": "1"})),
+        ("POST /batch", 1, False, lambda: ("POST", "/batch", {"operations": [{"op": "update", "task_id": ctx.task(), "args": {"priority": 3}} for _ in range(20)]})),
+        ("POST /todoist-webhook", 2, False, lambda: ("POST", "/todoist-webhook", {"event_name": "item:updated", "user_id": ctx.user_id, "triggered_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "event_data": {"id": ctx.task(), "content": "hooked", "project_id": r(ctx.projects)}})),
+        ("GET /metrics", 1, True, lambda: ("GET", "/metrics", None)),
+    ]
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+def run_load(app_url, plan, concurrency, duration, requests_total):
+    weights = [weight for _, weight, _, _ in plan]
+    latencies = {name: [] for name, _, _, _ in plan}
+    errors = {name: 0 for name, _, _, _ in plan}
+    lock = threading.Lock()
+    deadline = time.time() + duration
+    sent = [0]
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                if (requests_total and sent[0] >= requests_total) or (not requests_total and time.time() >= deadline):
+                    return
+                sent[0] += 1
+            name, _, _, build = random.choices(plan, weights)[0]
+            method, path, body = build()
+            started = time.perf_counter()
+            try:
+                resp = session.request(method, app_url + path, json=body, timeout=60)
+                failed = resp.status_code >= 500 or resp.status_code == 429
+                resp.content
+            except requests.RequestException:
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies[name].append(elapsed)
+                errors[name] += failed
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    return latencies, errors, time.time() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1000, help="active tasks in the fake account (1k-100k)")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the fake Todoist adds per call")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of Todoist calls answered with 429")
+    parser.add_argument("--retry-after", default="1")
+    parser.add_argument("--rate-limit", type=float, default=1e6,
+                        help="app's Todoist budget per 15 minutes (1000 reproduces the real limit)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load (ignored with --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests")
+    parser.add_argument("--mix", choices=("all", "read"), default="all", help="read = only routes that don't write")
+    parser.add_argument("--server", choices=("gunicorn", "flask"), default="gunicorn")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    fake, fake_url = start_fake(args)
+    app = None
+    try:
+        app, app_url = start_app(args, fake_url)
+        ctx = Context(app_url, fake_url)
+        plan = [s for s in scenarios(ctx) if args.mix == "all" or s[2]]
+        requests.post(fake_url + "/__reset")
+
+        latencies, errors, elapsed = run_load(app_url, plan, args.concurrency, args.duration, args.requests)
+        upstream = requests.get(fake_url + "/__stats").json()
+        rss = peak_rss_kb(app.pid)
+    finally:
+        for proc in (app, fake):
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=10)
+
+    total = sum(len(v) for v in latencies.values())
+    upstream_total = sum(upstream.values())
+    routes = {}
+    print(f"{'route':<38} {'count':>7} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, values in latencies.items():
+        if not values:
+            continue
+        values.sort()
+        routes[name] = {
+            "count": len(values), "errors": errors[name],
+            "p50_ms": percentile(values, 50) * 1000, "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+        stats = routes[name]
+        print(f"{name:<38} {stats['count']:>7} {stats['errors']:>7} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+    everything = sorted(v for values in latencies.values() for v in values)
+    summary = {
+        "requests": total,
+        "errors": sum(errors.values()),
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(everything, 50) * 1000,
+        "p95_ms": percentile(everything, 95) * 1000,
+        "p99_ms": percentile(everything, 99) * 1000,
+        "upstream_calls": upstream_total,
+        "upstream_per_request": upstream_total / total if total else 0.0,
+        "upstream_by_route": upstream,
+        "peak_rss_kb": rss,
+        "peak_rss_total_kb": sum(rss.values()),
+    }
+    print(f"\n{total} requests in {elapsed:.1f}s = {summary['rps']:.1f} req/s, {summary['errors']} errors")
+    print(f"latency p50 {summary['p50_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms")
+    print(f"Todoist calls: {upstream_total} ({summary['upstream_per_request']:.2f} per request)")
+    for route, count in sorted(upstream.items(), key=lambda kv: -kv[1]):
+        print(f"  {count:>7}  {route}")
+    if rss:
+        print(f"peak RSS: {summary['peak_rss_total_kb'] / 1024:.1f} MiB total, "
+              + ", ".join(f"pid {pid} {kb / 1024:.1f} MiB" for pid, kb in rss.items()))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "summary": summary, "routes": routes}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Cold-start benchmark: imports the app in fresh interpreters and reports how long the
+import and the first request take.
+
+    python bench/startup.py [--runs 10]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter per sample so nothing is already imported
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.app.test_client().get("/")
+served = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "first_request_ms": (served - imported) * 1000}))
+"""
+
+def sample():
+    env = {**os.environ, "TODOIST_API_KEY": os.getenv("TODOIST_API_KEY", "benchmark"), "LOG_LEVEL": "WARNING"}
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    samples = [sample() for _ in range(args.runs)]
+    for key in ("import_ms", "first_request_ms"):
+        values = [s[key] for s in samples]
+        print(f"{key:>18}: median {statistics.median(values):7.1f}  min {min(values):7.1f}  max {max(values):7.1f}")
+
+if __name__ == "__main__":
+    main()
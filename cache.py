@@ -1,27 +1,64 @@
-import time
+import os
 from threading import Lock
+from cache_backends import create_backend
+import tenants
 
-_cache = {}
-_cache_lock = Lock()
+# Which backend holds the cache: "memory" (per worker), "sqlite" (shared file) or "redis"
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+# Bounds for the cache; the least recently used entries are evicted first
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Share of the cache one tenant may hold; its own least recently used entries go first beyond it
+CACHE_TENANT_MAX_BYTES = int(os.getenv("CACHE_TENANT_MAX_BYTES", str(CACHE_MAX_BYTES // 4)))
+# How often (in seconds) the background sweeper drops expired entries
+CACHE_SWEEP_INTERVAL = float(os.getenv("CACHE_SWEEP_INTERVAL", "30"))
 
-def cache_set(key, value, ttl=60):
-    """Set a cache entry with a time-to-live (in seconds)."""
-    with _cache_lock:
-        _cache[key] = (value, time.time() + ttl)
+_backend = create_backend(CACHE_BACKEND, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_SWEEP_INTERVAL,
+                          CACHE_TENANT_MAX_BYTES)
+_stats_lock = Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+def _count(stat, n=1):
+    with _stats_lock:
+        _stats[stat] += n
+
+def set_backend(backend):
+    """Swap the cache backend (any cache_backends.CacheBackend), closing the old one."""
+    global _backend
+    old, _backend = _backend, backend
+    if old is not backend:
+        old.close()
+
+def _namespaced(name):
+    """Prefix a key or tag with the current tenant's key, so accounts never see each other's entries."""
+    return f"{tenants.current_key()}:{name}"
+
+def cache_set(key, value, ttl=60, tags=()):
+    """
+    Set a cache entry with a time-to-live (in seconds).
+    Tags let related entries be invalidated together (see cache_invalidate).
+    Keys and tags are scoped to the current tenant.
+    """
+    namespace = tenants.current_key()
+    tags = [f"{namespace}:{tag}" for tag in tags] + [f"{namespace}:*"]
+    _backend.set(f"{namespace}:{key}", value, ttl, tuple(tags))
 
 def cache_get(key):
     """Retrieve a cache entry if it hasn't expired; else return None."""
-    with _cache_lock:
-        entry = _cache.get(key)
-        if not entry:
-            return None
-        value, expires = entry
-        if time.time() > expires:
-            _cache.pop(key, None)
-            return None
-        return value
+    value = _backend.get(_namespaced(key))
+    _count("misses" if value is None else "hits")
+    return value
+
+def cache_invalidate(*tags):
+    """Drop every entry of the current tenant carrying any of the given tags."""
+    _count("invalidations", _backend.invalidate(tuple(map(_namespaced, tags))))
 
 def cache_clear():
-    """Clear all cached entries."""
-    with _cache_lock:
-        _cache.clear()
+    """Clear the current tenant's cached entries."""
+    cache_invalidate("*")
+
+def cache_stats():
+    """Return this worker's hit/miss counters plus the backend's size and eviction stats."""
+    with _stats_lock:
+        stats = dict(_stats)
+    return {"backend": _backend.name, "tenant": tenants.current_key(), **stats, **_backend.stats()}
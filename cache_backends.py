@@ -0,0 +1,422 @@
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import threading
+from collections import OrderedDict
+from threading import Lock, Thread
+from urllib.parse import urlparse
+from sqlite_db import Database, transaction
+
+def _estimate_size(value):
+    """Approximate the memory cost of a value by its JSON length."""
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+
+def _namespace(key):
+    """Keys are "<tenant key>:<key>" (see cache.cache_set); entries without one share the "" namespace."""
+    return key.partition(":")[0] if ":" in key else ""
+
+class CacheBackend:
+    """
+    Interface behind cache_get/cache_set/cache_invalidate/cache_clear.
+    get() returns None on a miss; values must be JSON-serializable for shared backends.
+    Bounded backends also cap each namespace (tenant) at namespace_max_bytes.
+    """
+    name = "base"
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl, tags):
+        raise NotImplementedError
+
+    def invalidate(self, tags):
+        """Drop every entry carrying any of the tags; return how many were dropped."""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        """Release connections held for this backend."""
+
+class _Sweeper:
+    """Runs a backend's expiry sweep on a daemon thread, started lazily once per process."""
+    def __init__(self, interval, sweep):
+        self.interval = interval
+        self.sweep = sweep
+        self.pid = None
+
+    def ensure_running(self):
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            Thread(target=self._run, name="cache-sweeper", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.sweep()
+
+class MemoryBackend(CacheBackend):
+    """Per-process LRU bounded by entry count and approximate bytes, overall and per namespace."""
+    name = "memory"
+
+    def __init__(self, max_entries, max_bytes, sweep_interval, namespace_max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.namespace_max_bytes = namespace_max_bytes or max_bytes
+        self._cache = OrderedDict()  # key -> (value, expires, size, tags)
+        self._tags = {}              # tag -> set of keys
+        self._lock = Lock()
+        self._bytes = 0
+        self._namespace_bytes = {}   # namespace -> bytes held
+        self._evictions = 0
+        self._expirations = 0
+        self._sweeper = _Sweeper(sweep_interval, self._sweep_expired)
+
+    def _drop(self, key):
+        """Remove one entry and its tag memberships. Caller holds the lock."""
+        value, expires, size, tags = self._cache.pop(key)
+        self._bytes -= size
+        namespace = _namespace(key)
+        self._namespace_bytes[namespace] -= size
+        if not self._namespace_bytes[namespace]:
+            del self._namespace_bytes[namespace]
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _sweep_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [key for key, entry in self._cache.items() if entry[1] < now]
+            for key in expired:
+                self._drop(key)
+            self._expirations += len(expired)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if not entry:
+                return None
+            if time.time() > entry[1]:
+                self._drop(key)
+                self._expirations += 1
+                return None
+            self._cache.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl, tags):
+        size = _estimate_size(value)
+        if size > min(self.max_bytes, self.namespace_max_bytes):
+            return
+        self._sweeper.ensure_running()
+        namespace = _namespace(key)
+        with self._lock:
+            if key in self._cache:
+                self._drop(key)
+            self._cache[key] = (value, time.time() + ttl, size, frozenset(tags))
+            self._bytes += size
+            self._namespace_bytes[namespace] = self._namespace_bytes.get(namespace, 0) + size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            if self._namespace_bytes[namespace] > self.namespace_max_bytes:
+                # Over its quota a namespace evicts its own entries, oldest first
+                for victim in [k for k in self._cache if _namespace(k) == namespace]:
+                    if self._namespace_bytes[namespace] <= self.namespace_max_bytes:
+                        break
+                    self._drop(victim)
+                    self._evictions += 1
+            while len(self._cache) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._cache)))
+                self._evictions += 1
+
+    def invalidate(self, tags):
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys |= self._tags.get(tag, set())
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._tags.clear()
+            self._bytes = 0
+            self._namespace_bytes.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._cache), "bytes": self._bytes,
+                    "evictions": self._evictions, "expirations": self._expirations,
+                    "max_entries": self.max_entries, "max_bytes": self.max_bytes,
+                    "namespaces": len(self._namespace_bytes), "namespace_max_bytes": self.namespace_max_bytes}
+
+class SQLiteBackend(CacheBackend):
+    """
+    Cache shared by every worker on the host through one SQLite file (WAL mode,
+    reads served from an mmap'd page cache). Invalidation reaches all workers.
+    """
+    name = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL,
+            size INTEGER NOT NULL, accessed REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed);
+        CREATE TABLE IF NOT EXISTS cache_tags (tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key));
+        CREATE INDEX IF NOT EXISTS cache_tags_key ON cache_tags(key);
+    """
+
+    def __init__(self, path, max_entries, max_bytes, sweep_interval, namespace_max_bytes=None,
+                 mmap_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.namespace_max_bytes = namespace_max_bytes or max_bytes
+        self._db = Database(path, self.SCHEMA, timeout=5, synchronous="OFF", pragmas=(f"mmap_size={int(mmap_bytes)}",))
+        self._sweeper = _Sweeper(sweep_interval, self._sweep_expired)
+
+    def close(self):
+        self._db.close()
+
+    def _delete_keys(self, conn, keys):
+        conn.executemany("DELETE FROM cache WHERE key = ?", [(k,) for k in keys])
+        conn.executemany("DELETE FROM cache_tags WHERE key = ?", [(k,) for k in keys])
+
+    def _sweep_expired(self):
+        with self._db.connect() as conn, transaction(conn):
+            conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+            conn.execute("DELETE FROM cache_tags WHERE key NOT IN (SELECT key FROM cache)")
+
+    def get(self, key):
+        with self._db.connect() as conn:
+            row = conn.execute("SELECT value, expires, accessed FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now > row[1]:
+                self._delete_keys(conn, [key])
+                return None
+            if now - row[2] > 1:  # coarse LRU clock keeps reads from writing every time
+                conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl, tags):
+        blob = json.dumps(value, default=str)
+        if len(blob) > min(self.max_bytes, self.namespace_max_bytes):
+            return
+        self._sweeper.ensure_running()
+        now = time.time()
+        with self._db.connect() as conn, transaction(conn):
+            conn.execute("DELETE FROM cache_tags WHERE key = ?", (key,))
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires, size, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, now + ttl, len(blob), now),
+            )
+            conn.executemany("INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)", [(t, key) for t in tags])
+            # The namespace's keys are a primary-key range: "<ns>:" up to "<ns>;"
+            namespace = (_namespace(key) + ":", _namespace(key) + ";")
+            (used,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache WHERE key >= ? AND key < ?",
+                                   namespace).fetchone()
+            if used > self.namespace_max_bytes:
+                victims = []
+                for victim, size in conn.execute(
+                        "SELECT key, size FROM cache WHERE key >= ? AND key < ? ORDER BY accessed", namespace):
+                    if used <= self.namespace_max_bytes:
+                        break
+                    victims.append(victim)
+                    used -= size
+                self._delete_keys(conn, victims)
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+            if count > self.max_entries or total > self.max_bytes:
+                victims = []
+                for victim, size in conn.execute("SELECT key, size FROM cache ORDER BY accessed"):
+                    if count <= self.max_entries and total <= self.max_bytes:
+                        break
+                    victims.append(victim)
+                    count, total = count - 1, total - size
+                self._delete_keys(conn, victims)
+
+    def invalidate(self, tags):
+        if not tags:
+            return 0
+        marks = ",".join("?" * len(tags))
+        with self._db.connect() as conn, transaction(conn):
+            keys = [r[0] for r in conn.execute(f"SELECT DISTINCT key FROM cache_tags WHERE tag IN ({marks})", list(tags))]
+            self._delete_keys(conn, keys)
+        return len(keys)
+
+    def clear(self):
+        with self._db.connect() as conn, transaction(conn):
+            conn.execute("DELETE FROM cache")
+            conn.execute("DELETE FROM cache_tags")
+
+    def stats(self):
+        with self._db.connect() as conn:
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        return {"entries": count, "bytes": total, "path": self.path,
+                "max_entries": self.max_entries, "max_bytes": self.max_bytes,
+                "namespace_max_bytes": self.namespace_max_bytes}
+
+class _RespClient:
+    """Just enough of the Redis protocol (RESP2) for the cache commands we use."""
+    def __init__(self, host, port, db=0, password=None, timeout=2.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.reader = self.sock.makefile("rb")
+        if password:
+            self.command("AUTH", password)
+        if db:
+            self.command("SELECT", db)
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+    def command(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self.sock.sendall(b"".join(parts))
+        return self._read()
+
+    def _read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RuntimeError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise RuntimeError(f"Unexpected Redis reply: {line!r}")
+
+class RedisBackend(CacheBackend):
+    """
+    Cache shared through any Redis-protocol server (Redis, KeyDB, a local stand-in).
+    Size bounds and LRU eviction (including per-tenant quotas) are left to the server's
+    maxmemory policy.
+    """
+    name = "redis"
+
+    def __init__(self, url, prefix="flexbot:", pool_size=8):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int((parsed.path or "/0").lstrip("/") or 0)
+        self.password = parsed.password
+        self.prefix = prefix
+        self.pool_size = pool_size
+        self._idle = []            # this process's open connections nobody is using
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _checkout(self):
+        """
+        An idle connection, or a new one. The pool is per process rather than per thread,
+        since under gevent each request is its own greenlet and would otherwise reconnect.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # A socket shared with the parent would interleave both processes' replies
+                self._idle, self._pid = [], os.getpid()
+            if self._idle:
+                return self._idle.pop()
+        return _RespClient(self.host, self.port, self.db, self.password)
+
+    def _command(self, *args):
+        client = self._checkout()
+        try:
+            try:
+                reply = client.command(*args)
+            except (OSError, ConnectionError):
+                client.close()  # reconnect once on a dropped connection
+                client = _RespClient(self.host, self.port, self.db, self.password)
+                reply = client.command(*args)
+        except BaseException:
+            client.close()     # a reply may be half read
+            raise
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.pool_size:
+                self._idle.append(client)
+                return reply
+        client.close()
+        return reply
+
+    def get(self, key):
+        data = self._command("GET", self.prefix + key)
+        return None if data is None else json.loads(data)
+
+    def set(self, key, value, ttl, tags):
+        self._command("SET", self.prefix + key, json.dumps(value, default=str), "EX", max(1, int(ttl)))
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            self._command("SADD", tag_key, key)
+            self._command("EXPIRE", tag_key, max(1, int(ttl)) * 2)
+
+    def invalidate(self, tags):
+        keys = set()
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            keys.update(k.decode() for k in self._command("SMEMBERS", tag_key) or [])
+            self._command("DEL", tag_key)
+        if keys:
+            self._command("DEL", *(self.prefix + k for k in keys))
+        return len(keys)
+
+    def clear(self):
+        cursor = "0"
+        while True:
+            cursor, keys = self._command("SCAN", cursor, "MATCH", self.prefix + "*", "COUNT", 500)
+            cursor = cursor.decode() if isinstance(cursor, bytes) else cursor
+            if keys:
+                self._command("DEL", *keys)
+            if cursor == "0":
+                break
+
+    def stats(self):
+        return {"url": f"redis://{self.host}:{self.port}/{self.db}", "prefix": self.prefix}
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = (self._idle, []) if self._pid == os.getpid() else ([], self._idle)
+            self.pool_size = 0
+        for client in idle:
+            client.close()
+
+def create_backend(name, max_entries, max_bytes, sweep_interval, namespace_max_bytes=None):
+    """Build the backend selected by CACHE_BACKEND (memory, sqlite or redis)."""
+    if name == "memory":
+        return MemoryBackend(max_entries, max_bytes, sweep_interval, namespace_max_bytes)
+    if name == "sqlite":
+        path = os.getenv("CACHE_PATH", os.path.join(tempfile.gettempdir(), "flexbot-cache.db"))
+        return SQLiteBackend(path, max_entries, max_bytes, sweep_interval, namespace_max_bytes)
+    if name == "redis":
+        return RedisBackend(os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+    raise ValueError(f"Unknown CACHE_BACKEND: {name}")
@@ -1,8 +1,24 @@
 from flask import Blueprint, request, jsonify
-from utils import get_headers
-import requests
+from store import get_store, refresh_after_write
+import todoist_client
+import ratelimit
+import jobs
 
 collab_bp = Blueprint('collab', __name__)
+collab_bp.after_request(refresh_after_write)
+
+def send_assignments(items):
+    """Send {"task_id", "command"} items as chunked Sync commands in the bulk lane; one result per item."""
+    with ratelimit.bulk():
+        sync_status, _ = todoist_client.sync_commands([item["command"] for item in items])
+    get_store().mark_stale()
+    results = []
+    for item in items:
+        status = sync_status.get(item["command"]["uuid"], "unknown")
+        results.append({"task_id": item["task_id"], "status": todoist_client.command_result(status), "result": status})
+    return results
+
+jobs.register("assign_role", send_assignments)
 
 @collab_bp.route("/assign-tasks-to-role", methods=["POST"])
 def assign_tasks_to_role():
@@ -12,19 +28,12 @@ def assign_tasks_to_role():
     assignee_id = data.get("assignee_id")
     if not task_ids or not role or not assignee_id:
         return jsonify({"error": "task_ids, role, and assignee_id required"}), 400
-    results = []
-    for task_id in task_ids:
-        resp = requests.post(
-            f"https://api.todoist.com/rest/v2/tasks/{task_id}",
-            json={"responsible_uid": assignee_id},
-            headers=get_headers()  # <-- No api_key argument, always uses ENV
-        )
-        try:
-            result = resp.json()
-        except Exception:
-            result = {"message": resp.text}
-        results.append({"task_id": task_id, "status": resp.status_code, "result": result})
-    return jsonify(results)
+    # One item_update per task, sent as chunked Sync batches now or as a background job
+    items = [{"task_id": task_id, "command": todoist_client.command("item_update", {"id": task_id, "responsible_uid": assignee_id})}
+             for task_id in task_ids]
+    if jobs.wants_background(data):
+        return jobs.accepted(jobs.submit("assign_role", items))
+    return jsonify(send_assignments(items))
 
 @collab_bp.route("/mention-alerts", methods=["POST"])
 def mention_alerts():
@@ -37,10 +46,9 @@ def mention_alerts():
         "task_id": task_id,
         "content": f"<@{user_id}> You were mentioned in this task."
     }
-    resp = requests.post(
-        "https://api.todoist.com/rest/v2/comments",
-        json=comment_data,
-        headers=get_headers()
+    resp = todoist_client.post(
+        "/rest/v2/comments",
+        json=comment_data
     )
     try:
         result = resp.json()
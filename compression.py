@@ -0,0 +1,60 @@
+import os
+import zlib
+from flask import request
+
+try:
+    import brotli  # optional: pip install brotli to offer "br"
+except ImportError:
+    brotli = None
+
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+# zlib level for gzip (1 fastest .. 9 smallest) and brotli quality (0 .. 11)
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE = ("application/json", "application/x-ndjson", "text/plain", "text/html")
+
+def _encodings():
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+def _compressor(encoding):
+    """Return (process(chunk) -> bytes, finish() -> bytes) for the encoding."""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return compressor.process, compressor.finish
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    return compressor.compress, compressor.flush
+
+def _stream(chunks, encoding):
+    process, finish = _compressor(encoding)
+    for chunk in chunks:
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+def _compress(response):
+    if (response.status_code != 200 or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE or response.direct_passthrough):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = request.accept_encodings.best_match(_encodings())
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        # format=stream / ndjson: compress chunk by chunk as the body is generated
+        response.response = _stream(response.iter_encoded(), encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_SIZE:
+            return response
+        process, finish = _compressor(encoding)
+        response.set_data(process(body) + finish())
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+def init_compression(app):
+    """Compress JSON and text responses with brotli or gzip, as the client's Accept-Encoding allows."""
+    app.after_request(_compress)
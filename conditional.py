@@ -0,0 +1,30 @@
+import hashlib
+from flask import Response, make_response, request
+import tenants
+
+def etag_for(*parts):
+    """
+    Weak ETag for the current tenant, URL (path and query string) and the given parts,
+    e.g. the store's state_tag() and anything else the response depends on.
+    Weak, because gzip and brotli variants of one response share it.
+    """
+    key = "\x1f".join(map(str, (tenants.current().key, request.full_path, *parts)))
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+def conditional(etag, build):
+    """
+    Answer 304 Not Modified if the client's If-None-Match already has `etag`; otherwise
+    call build() (anything a view may return) and tag its 200 response with the ETag.
+    Checking first means an unchanged poll skips serialization entirely.
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag, weak=True)
+    # Clients may keep the body but must revalidate each time; it is per account
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.update(("Authorization", "X-Tenant-ID"))
+    return response
@@ -0,0 +1,44 @@
+import os
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Timezone used for "today" when a request doesn't pass ?tz= (IANA name, e.g. Europe/Berlin)
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "UTC")
+
+WINDOWS = ("today", "this_week", "overdue")
+
+def resolve_timezone(name=None):
+    """ZoneInfo for an IANA name, or DEFAULT_TIMEZONE. Raises ValueError for unknown names."""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {name}")
+
+def _parse_day(value, name):
+    try:
+        return date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name} format. Use 'YYYY-MM-DD'.")
+
+def due_window(when=None, due_from=None, due_to=None, tz=None):
+    """
+    Inclusive (due_from, due_to) local dates for a named window (today, this_week,
+    overdue), a single YYYY-MM-DD day, or explicit from/to dates. Either bound may be
+    None. "today" is evaluated in tz. Raises ValueError for malformed input.
+    """
+    today = datetime.now(tz or resolve_timezone()).date()
+    if when:
+        when = when.lower()
+        if when == "today":
+            return today.isoformat(), today.isoformat()
+        if when == "this_week":
+            return today.isoformat(), (today + timedelta(days=6)).isoformat()
+        if when == "overdue":
+            return None, (today - timedelta(days=1)).isoformat()
+        day = _parse_day(when, "due_date")
+        return day, day
+    start = _parse_day(due_from, "from") if due_from else None
+    end = _parse_day(due_to, "to") if due_to else None
+    if start and end and start > end:
+        raise ValueError("from must not be after to")
+    return start, end
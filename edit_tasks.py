@@ -1,19 +1,27 @@
 from flask import Blueprint, request, jsonify
-from todoist_api_python.api import TodoistAPI
-from dotenv import load_dotenv
-import os
+from store import refresh_after_write
+import todoist_client
+import tenants
+import logging
 
-# Load environment variables from .env file
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+def _build_api():
+    from todoist_api_python.api import TodoistAPI
+    # Share the tenant's pooled keep-alive session with the rest of the app
+    return TodoistAPI(todoist_client.api_token(), session=todoist_client.get_session())
+
+def get_api():
+    """The current tenant's todoist_api_python client, built on first use since the SDK is slow to import."""
+    return tenants.current().resource("sdk", _build_api)
 
-api = TodoistAPI(os.getenv("TODOIST_API_KEY"))
 edit_tasks_bp = Blueprint('edit_tasks', __name__)
+edit_tasks_bp.after_request(refresh_after_write)
 
 @edit_tasks_bp.route("/edit-task", methods=["PATCH"])
 def edit_task():
-    print("Received PATCH request to /edit-task")
     data = request.get_json()
-    print(f"Raw request.get_json(): {data}")
+    logger.debug("edit-task payload: %s", data)
 
     if not data:
         return jsonify({"error": "No data provided"}), 400
@@ -77,29 +85,25 @@ def edit_task():
         if deadline_lang is not None:
             kwargs['deadline_lang'] = deadline_lang
 
-        print(f"Calling api.update_task with: {kwargs}")
-        task = api.update_task(**kwargs)
-        print(f"api.update_task returned: {task}")
-
-        responses = {"task": task if isinstance(task, dict) else task.to_dict() if hasattr(task, 'to_dict') else vars(task)}
-
-        # Add a comment if requested
+        # The comment and reminder follow only a successful update (a failure raises below),
+        # and don't depend on each other, so those two go out concurrently
+        api = get_api()
+        logger.debug("Calling api.update_task with: %s", kwargs)
+        results = {"task": api.update_task(**kwargs)}
+        calls = {}
         if comment:
-            print(f"Adding comment: {comment}")
-            comment_obj = api.add_comment(task_id=task_id, content=comment)
-            responses["comment"] = comment_obj.to_dict() if hasattr(comment_obj, 'to_dict') else vars(comment_obj)
-
-        # Add a reminder if requested
+            calls["comment"] = lambda: api.add_comment(task_id=task_id, content=comment)
         if reminder_time:
-            print(f"Adding reminder at: {reminder_time}")
-            reminder_obj = api.add_reminder(task_id=task_id, due_datetime=reminder_time)
-            responses["reminder"] = reminder_obj.to_dict() if hasattr(reminder_obj, 'to_dict') else vars(reminder_obj)
+            calls["reminder"] = lambda: api.add_reminder(task_id=task_id, due_datetime=reminder_time)
+        results.update(zip(calls, todoist_client.gather(*calls.values())))
+
+        responses = {
+            name: obj if isinstance(obj, dict) else obj.to_dict() if hasattr(obj, 'to_dict') else vars(obj)
+            for name, obj in results.items()
+        }
 
-        print("Task updated successfully.")
         return jsonify({"message": "Task updated successfully", **responses}), 200
 
     except Exception as error:
-        print("Exception occurred during task update.")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Exception occurred during task update.")
         return jsonify({"error": str(error)}), 500
@@ -1,8 +1,13 @@
 from flask import Blueprint, request, jsonify
-from utils import get_headers
-from cache import cache_get, cache_set, cache_clear
-import requests
-from datetime import datetime, timedelta
+from cache import cache_get, cache_set, cache_clear, cache_stats
+from store import get_store, query_cache_tags, SyncError
+from streaming import list_response
+from models import Task
+from due_dates import WINDOWS, due_window, resolve_timezone
+from archive import ArchiveError, get_archive, summary_window
+import todoist_client
+import ratelimit
+import jobs
 
 filters_bp = Blueprint('filters', __name__)
 
@@ -11,46 +16,68 @@ def get_tasks_by_filter():
     data = request.get_json()
     filter_type = data.get("filter")
 
-    # Use just the filter as cache key for single-user
+    # today/this_week/overdue are range scans over the due index in the caller's timezone;
+    # anything else is a label and hits the label index
+    try:
+        tz = resolve_timezone(data.get("tz"))
+        if not filter_type:
+            filters = None
+        elif filter_type.lower() in WINDOWS:
+            due_from, due_to = due_window(filter_type, tz=tz)
+            filters = {"due_from": due_from, "due_to": due_to, "tz": tz}
+        else:
+            filters = {"label": filter_type}
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Key on the resolved window, so "today" rolls over at local midnight
     cache_key = f"filtered_tasks_{filter_type}"
+    if filters and "tz" in filters:
+        cache_key += f"_{filters['due_from']}_{filters['due_to']}_{tz.key}"
+    store = get_store()
+    try:
+        store.ensure_fresh()
+    except SyncError as e:
+        return jsonify({"error": "Failed to fetch tasks"}), e.status_code
+    # Keyed on the mirror's state, since other workers' mirrors may be at another sync token
+    cache_key += f"@{store.state_tag()}"
     cached = cache_get(cache_key)
     if cached:
-        return jsonify(cached)
+        return list_response(store.get_many(cached), Task.to_dict)
 
-    resp = requests.get("https://api.todoist.com/rest/v2/tasks", headers=get_headers())
     try:
-        all_tasks = resp.json()
-    except Exception:
-        return jsonify({"error": "Failed to fetch tasks"}), resp.status_code
-
-    filtered = []
-
-    # If the filter is a label, filter tasks by label
-    if filter_type and filter_type.lower() != "today" and filter_type.lower() != "this_week":
-        for task in all_tasks:
-            labels = [lbl.lower() for lbl in task.get("labels", [])]  # Normalize label case
-            if filter_type.lower() in labels:
-                filtered.append(task)
-
-    # Otherwise, use the existing logic for date-based filters
-    else:
-        today = datetime.utcnow().date()
-        for task in all_tasks:
-            due = task.get("due", {}).get("date")
-            try:
-                due_date = datetime.fromisoformat(due).date() if due else None
-            except Exception:
-                continue
-
-            # Filter by date (today or this week)
-            if filter_type == "today" and due_date == today:
-                filtered.append(task)
-            elif filter_type == "this_week" and due_date and (0 <= (due_date - today).days < 7):
-                filtered.append(task)
-
-    # Cache the filtered results for 60 seconds
-    cache_set(cache_key, filtered, ttl=60)
-    return jsonify(filtered)
+        filtered = store.query(**filters) if filters else []
+    except SyncError as e:
+        return jsonify({"error": "Failed to fetch tasks"}), e.status_code
+
+    # Cache the filtered IDs for 60 seconds; the tasks themselves live in the store
+    cache_set(cache_key, [task.id for task in filtered], ttl=60, tags=query_cache_tags(**filters) if filters else ())
+    return list_response(filtered, Task.to_dict)
+
+def reschedule_items(tasks, due_string):
+    """One {"task_id", "command"} item per task; the command's uuid makes resending it safe."""
+    return [{"task_id": task.id, "command": todoist_client.command("item_update", {"id": task.id, "due": {"string": due_string}})}
+            for task in tasks]
+
+def send_reschedules(items):
+    """Send reschedule items as chunked item_update Sync commands in the bulk lane; one result per item."""
+    with ratelimit.bulk():
+        sync_status, _ = todoist_client.sync_commands([item["command"] for item in items])
+    get_store().mark_stale()
+    results = []
+    for item in items:
+        status = sync_status.get(item["command"]["uuid"], "unknown")
+        results.append({"task_id": item["task_id"], "status": todoist_client.command_result(status), "sync_status": status})
+    return results
+
+jobs.register("reschedule", send_reschedules)
+
+def reschedule(tasks, due_string, data):
+    """Reschedule now, or as a background job if the request asked for one."""
+    items = reschedule_items(tasks, due_string)
+    if jobs.wants_background(data):
+        return jobs.accepted(jobs.submit("reschedule", items))
+    return jsonify(send_reschedules(items))
 
 @filters_bp.route("/reschedule-by-label", methods=["POST"])
 def reschedule_by_label():
@@ -59,58 +86,69 @@ def reschedule_by_label():
     new_due = data.get("due_string")
     if not label or not new_due:
         return jsonify({"error": "label and due_string required"}), 400
-    resp = requests.get("https://api.todoist.com/rest/v2/tasks", headers=get_headers())
     try:
-        tasks = resp.json()
-    except Exception:
-        return jsonify({"error": "Failed to fetch tasks"}), resp.status_code
-    updated = []
-    for task in tasks:
-        labels = [lbl.lower() for lbl in task.get("labels", [])]
-        if label.lower() in labels:
-            task_id = task["id"]
-            patch_data = {"due_string": new_due}
-            edit_resp = requests.post(f"https://api.todoist.com/rest/v2/tasks/{task_id}", json=patch_data, headers=get_headers())
-            updated.append({"task_id": task_id, "status": edit_resp.status_code})
-    return jsonify(updated)
+        tasks = get_store().query(label=label)
+    except SyncError as e:
+        return jsonify({"error": "Failed to fetch tasks"}), e.status_code
+    return reschedule(tasks, new_due, data)
 
 @filters_bp.route("/rollover-overdue", methods=["POST"])
 def rollover_overdue():
-    resp = requests.get("https://api.todoist.com/rest/v2/tasks", headers=get_headers())
+    data = request.get_json(silent=True) or {}
+    try:
+        tz = resolve_timezone(data.get("tz"))
+        _, yesterday = due_window("overdue", tz=tz)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     try:
-        tasks = resp.json()
-    except Exception:
-        return jsonify({"error": "Failed to fetch tasks"}), resp.status_code
-    today = datetime.utcnow().date()
-    updated = []
-    for task in tasks:
-        due = task.get("due", {}).get("date")
-        try:
-            due_date = datetime.fromisoformat(due).date() if due else None
-        except Exception:
-            continue
-        if due_date and due_date < today:
-            patch_data = {"due_string": "today"}
-            edit_resp = requests.post(f"https://api.todoist.com/rest/v2/tasks/{task['id']}", json=patch_data, headers=get_headers())
-            updated.append({"task_id": task["id"], "status": edit_resp.status_code})
-    return jsonify(updated)
+        tasks = get_store().query(due_to=yesterday, tz=tz)
+    except SyncError as e:
+        return jsonify({"error": "Failed to fetch tasks"}), e.status_code
+    return reschedule(tasks, "today", data)
 
 @filters_bp.route("/archive-completed", methods=["POST"])
 def archive_completed():
-    return jsonify({"status": "Todoist handles archiving completed tasks automatically. No action required."})
+    # Todoist archives completed tasks itself; this pulls the newly completed ones into the local archive now
+    try:
+        added = get_archive().refresh(force=True)
+    except ArchiveError as e:
+        return jsonify({"error": str(e)}), e.status_code
+    return jsonify({"status": "archived", "added": added})
+
+def _archive_window():
+    """Refresh the archive if due and resolve ?window= / ?since= / ?until=; returns (archive, since, until)."""
+    archive = get_archive()
+    since, until = summary_window(request.args.get("window"), request.args.get("since"), request.args.get("until"))
+    archive.refresh()
+    return archive, since, until
 
 @filters_bp.route("/weekly-summary", methods=["GET"])
 def weekly_summary():
-    week_ago = (datetime.utcnow() - timedelta(days=7)).date().isoformat()
-    resp = requests.get("https://api.todoist.com/sync/v9/completed/get_all", headers=get_headers())
+    # Completed items of the last week (or ?window=month, ?since=/?until=) from the local archive
     try:
-        completed = resp.json()
-    except Exception:
-        return jsonify({"error": "Failed to fetch completed tasks"}), resp.status_code
-    summary = [t for t in completed.get("items", []) if t.get("completed_date", "").split("T")[0] >= week_ago]
-    return jsonify(summary)
+        archive, since, until = _archive_window()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ArchiveError as e:
+        return jsonify({"error": str(e)}), e.status_code
+    return list_response(archive.items(since, until))
+
+@filters_bp.route("/completed-summary", methods=["GET"])
+def completed_summary():
+    # Counts per day, project and label, read from the archive's daily buckets
+    try:
+        archive, since, until = _archive_window()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ArchiveError as e:
+        return jsonify({"error": str(e)}), e.status_code
+    return jsonify(archive.summary(since, until))
 
 @filters_bp.route("/flush-cache", methods=["GET"])
 def flush_cache():
     cache_clear()
     return jsonify({"status": "cache flushed"})
+
+@filters_bp.route("/cache-stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify(cache_stats())
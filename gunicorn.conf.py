@@ -0,0 +1,28 @@
+import os
+
+# Async serving mode: gevent workers patch sockets so a blocked Todoist call yields
+# to other requests. One worker process then holds hundreds of in-flight upstream
+# calls instead of one. Set GUNICORN_WORKER_CLASS=sync to go back to sync workers.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "500"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+
+# Import the app once in the master and fork workers from it, so each (re)started
+# worker shares the already-imported code instead of importing everything again.
+# Sockets, threads and SQLite handles are all created lazily per process.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+if worker_class == "gevent":
+    # Many concurrent requests per worker need a bigger keep-alive pool to Todoist
+    os.environ.setdefault("TODOIST_POOL_SIZE", "100")
+    if preload_app:
+        # The app (and ssl, via requests) is imported before workers patch, so patch here
+        from gevent import monkey
+        monkey.patch_all()
+
+def on_starting(server):
+    # Workers publish their metrics to a shared file (see metrics.py); a new server starts it from zero
+    import metrics
+    metrics.reset()
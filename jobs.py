@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
+from flask import Blueprint, jsonify, request
+import ratelimit
+import tenants
+from sqlite_db import Database, transaction
+
+logger = logging.getLogger(__name__)
+
+# SQLite file holding jobs and their per-item results, shared by every worker on the host
+JOBS_PATH = os.getenv("JOBS_PATH", os.path.join(tempfile.gettempdir(), "flexbot-jobs.db"))
+# Jobs run concurrently per worker process
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Items handed to a job handler at a time; progress is saved after each chunk
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", "100"))
+# Seconds a worker holds a running job without renewing; after that another worker resumes it
+JOB_LEASE = float(os.getenv("JOB_LEASE", "60"))
+# Finished jobs are kept this many seconds
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", str(7 * 24 * 3600)))
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL,
+        total INTEGER NOT NULL, completed INTEGER NOT NULL DEFAULT 0, error TEXT,
+        owner TEXT, lease_until REAL, created_at REAL NOT NULL, updated_at REAL NOT NULL,
+        tenant TEXT
+    );
+    CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status);
+    CREATE TABLE IF NOT EXISTS job_items (
+        job_id TEXT NOT NULL, seq INTEGER NOT NULL, payload TEXT NOT NULL, result TEXT,
+        PRIMARY KEY (job_id, seq)
+    );
+"""
+
+jobs_bp = Blueprint('jobs', __name__)
+
+_handlers = {}
+_start_lock = Lock()
+_started_pid = None
+_pool = None
+_owner = None
+_running = set()     # job IDs this process is working on
+_running_lock = Lock()
+
+def register(kind, handler):
+    """
+    Register the handler for a job kind: handler(payloads) returns one JSON-serializable
+    result per payload. It is called with chunks of up to JOB_CHUNK_SIZE payloads and may
+    see a chunk again after a restart, so it must be safe to repeat (e.g. Sync commands
+    with fixed uuids).
+    """
+    _handlers[kind] = handler
+
+def _migrate(conn):
+    if "tenant" not in [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]:
+        conn.execute("ALTER TABLE jobs ADD COLUMN tenant TEXT")  # files from before multi-tenant mode
+
+_db = Database(JOBS_PATH, SCHEMA, migrate=_migrate)
+
+def _ensure_started():
+    """Start this process's job pool and maintenance thread, once per process."""
+    global _started_pid, _pool, _owner
+    if _started_pid == os.getpid():
+        return
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        _owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        _pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+        _running.clear()
+        _started_pid = os.getpid()
+        Thread(target=_maintain, name="job-maintainer", daemon=True).start()
+
+def _maintain():
+    """Resume orphaned jobs, keep our leases alive and prune old jobs."""
+    while True:
+        try:
+            now = time.time()
+            with _running_lock:
+                running = list(_running)
+            with _db.connect() as conn:
+                conn.executemany("UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ?",
+                                 [(now + JOB_LEASE, job_id, _owner) for job_id in running])
+                orphans = conn.execute(
+                    "SELECT id, tenant FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)", (now,)
+                ).fetchall()
+            for job_id, key in orphans:
+                # Jobs store the tenant key, not the token; a worker that doesn't know the
+                # token leaves the job for one that does
+                tenant = tenants.by_key(key)
+                if tenant is not None:
+                    _claim(job_id, tenant)
+            with _db.connect() as conn, transaction(conn):
+                conn.execute("DELETE FROM job_items WHERE job_id IN "
+                             "(SELECT id FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?)",
+                             (now - JOB_RETENTION,))
+                conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                             (now - JOB_RETENTION,))
+        except Exception:
+            logger.exception("Job maintenance failed")
+        time.sleep(JOB_LEASE / 3)
+
+def _claim(job_id, tenant):
+    """Take a queued job, or a running one whose owner stopped renewing, and run it here."""
+    now = time.time()
+    with _db.connect() as conn:
+        claimed = conn.execute(
+            "UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, updated_at = ? "
+            "WHERE id = ? AND (status = 'queued' OR (status = 'running' AND lease_until < ?))",
+            (_owner, now + JOB_LEASE, now, job_id, now),
+        ).rowcount
+    if claimed:
+        with _running_lock:
+            _running.add(job_id)
+        _pool.submit(_run, job_id, tenant)
+
+def _run(job_id, tenant):
+    try:
+        with _db.connect() as conn:
+            (kind,) = conn.execute("SELECT kind FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        handler = _handlers.get(kind)
+        if handler is None:
+            raise ValueError(f"No handler registered for job kind {kind!r}")
+        with tenants.use(tenant), ratelimit.bulk():
+            while True:
+                with _db.connect() as conn:
+                    rows = conn.execute(
+                        "SELECT seq, payload FROM job_items WHERE job_id = ? AND result IS NULL ORDER BY seq LIMIT ?",
+                        (job_id, JOB_CHUNK_SIZE),
+                    ).fetchall()
+                if not rows:
+                    break
+                # No connection is held while the handler calls Todoist
+                results = handler([json.loads(payload) for _, payload in rows])
+                with _db.connect() as conn, transaction(conn):
+                    now = time.time()
+                    owned = conn.execute(
+                        "UPDATE jobs SET completed = completed + ?, updated_at = ?, lease_until = ? "
+                        "WHERE id = ? AND owner = ?",
+                        (len(rows), now, now + JOB_LEASE, job_id, _owner),
+                    ).rowcount
+                    if owned:
+                        conn.executemany(
+                            "UPDATE job_items SET result = ? WHERE job_id = ? AND seq = ?",
+                            [(json.dumps(result), job_id, seq) for (seq, _), result in zip(rows, results)],
+                        )
+                if not owned:
+                    logger.warning(f"Job {job_id} was taken over by another worker")
+                    return
+        _finish(job_id, "done")
+    except Exception as e:
+        logger.exception(f"Job {job_id} failed")
+        _finish(job_id, "failed", str(e))
+    finally:
+        with _running_lock:
+            _running.discard(job_id)
+
+def _finish(job_id, status, error=None):
+    with _db.connect() as conn:
+        conn.execute("UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ? AND owner = ?",
+                     (status, error, time.time(), job_id, _owner))
+
+def submit(kind, payloads):
+    """
+    Queue a job over JSON-serializable payloads for the current tenant and start it on
+    this worker. Returns the job ID.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"No handler registered for job kind {kind!r}")
+    _ensure_started()
+    tenant = tenants.current()
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _db.connect() as conn, transaction(conn):
+        conn.execute("INSERT INTO jobs (id, kind, status, total, created_at, updated_at, tenant) "
+                     "VALUES (?, ?, 'queued', ?, ?, ?, ?)", (job_id, kind, len(payloads), now, now, tenant.key))
+        conn.executemany("INSERT INTO job_items (job_id, seq, payload) VALUES (?, ?, ?)",
+                         [(job_id, seq, json.dumps(payload)) for seq, payload in enumerate(payloads)])
+    _claim(job_id, tenant)
+    return job_id
+
+def get_job(job_id, with_results=True):
+    """Job status, progress and (optionally) per-item results, or None if the current tenant has no such job."""
+    # Jobs from before multi-tenant mode belong to the default account
+    default = tenants.tenant_key(tenants.default_token()) if tenants.default_token() else ""
+    with _db.connect() as conn:
+        row = conn.execute(
+            "SELECT id, kind, status, total, completed, error, created_at, updated_at FROM jobs "
+            "WHERE id = ? AND COALESCE(tenant, ?) = ?", (job_id, default, tenants.current().key)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(("id", "kind", "status", "total", "completed", "error", "created_at", "updated_at"), row))
+        if with_results:
+            job["results"] = [json.loads(result) for (result,) in conn.execute(
+                "SELECT result FROM job_items WHERE job_id = ? AND result IS NOT NULL ORDER BY seq", (job_id,))]
+    return job
+
+def wants_background(data=None):
+    """True if the request asked to run as a job (?async=1 or "async": true in the body)."""
+    flag = request.args.get("async")
+    if flag is None and isinstance(data, dict):
+        flag = data.get("async")
+    return str(flag).lower() in ("1", "true", "yes")
+
+def accepted(job_id):
+    """202 response pointing at the job's status endpoint."""
+    return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}), 202
+
+# Resume jobs left behind by a previous worker as soon as this one serves a request
+jobs_bp.before_app_request(_ensure_started)
+
+@jobs_bp.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    with_results = request.args.get("results", "1").lower() not in ("0", "false", "no")
+    job = get_job(job_id, with_results)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
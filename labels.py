@@ -1,9 +1,10 @@
 from flask import Blueprint, request, jsonify
-from utils import get_headers
-import requests
+from store import get_store, refresh_after_write, SyncError
+import todoist_client
 import uuid
 
 labels_bp = Blueprint('labels', __name__)
+labels_bp.after_request(refresh_after_write)
 
 def safe_json_response(response):
     if response.content:
@@ -16,8 +17,10 @@ def safe_json_response(response):
 
 @labels_bp.route("/list-labels", methods=["GET"])
 def list_labels():
-    resp = requests.get("https://api.todoist.com/rest/v2/labels", headers=get_headers())
-    return safe_json_response(resp)
+    try:
+        return jsonify(get_store().get_labels()), 200
+    except SyncError as e:
+        return jsonify({"error": "Failed to fetch labels"}), e.status_code
 
 @labels_bp.route("/create-label", methods=["POST"])
 def create_label():
@@ -28,7 +31,7 @@ def create_label():
         "favorite": data.get("favorite", False)
     }
     label_data = {k: v for k, v in label_data.items() if v is not None}
-    resp = requests.post("https://api.todoist.com/rest/v2/labels", json=label_data, headers=get_headers())
+    resp = todoist_client.post("/rest/v2/labels", json=label_data)
     return safe_json_response(resp)
 
 @labels_bp.route("/edit-label", methods=["POST"])
@@ -43,7 +46,7 @@ def edit_label():
         "favorite": data.get("favorite")
     }
     update_data = {k: v for k, v in update_data.items() if v is not None}
-    resp = requests.post(f"https://api.todoist.com/rest/v2/labels/{label_id}", json=update_data, headers=get_headers())
+    resp = todoist_client.post(f"/rest/v2/labels/{label_id}", json=update_data)
     return safe_json_response(resp)
 
 @labels_bp.route("/delete-label", methods=["POST"])
@@ -52,7 +55,7 @@ def delete_label():
     label_id = data.get("label_id")
     if not label_id:
         return jsonify({"error": "label_id required"}), 400
-    resp = requests.delete(f"https://api.todoist.com/rest/v2/labels/{label_id}", headers=get_headers())
+    resp = todoist_client.delete(f"/rest/v2/labels/{label_id}")
     if resp.status_code == 204:
         return jsonify({"status": "deleted"}), 204
     else:
@@ -80,7 +83,7 @@ def assign_labels():
         ]
     }
 
-    resp = requests.post("https://api.todoist.com/sync/v9/sync", json=payload, headers=get_headers())
+    resp = todoist_client.post("/sync/v9/sync", json=payload)
     try:
         response_json = resp.json()
     except Exception:
@@ -0,0 +1,304 @@
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import sqlite3
+import tempfile
+from threading import Lock
+from flask import g, request, has_request_context
+from flask.json.provider import DefaultJSONProvider
+from cache import cache_stats
+from sqlite_db import Database, transaction
+
+logger = logging.getLogger(__name__)
+
+# SQLite file where every worker on the host publishes its metrics, so a scrape of any
+# worker reports them all; "off" makes /metrics report only the worker that answers
+METRICS_PATH = os.getenv("METRICS_PATH", os.path.join(tempfile.gettempdir(), "flexbot-metrics.db"))
+# Seconds between a worker's publishes; the worker answering a scrape publishes first
+METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", "5"))
+# Seconds between merges of exited workers' rows into one accumulated row
+METRICS_FOLD_INTERVAL = float(os.getenv("METRICS_FOLD_INTERVAL", "60"))
+
+# Latency buckets in seconds, from a cache hit to a slow Todoist call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS samples (
+        worker TEXT NOT NULL, metric TEXT NOT NULL, labels TEXT NOT NULL, value TEXT NOT NULL, pid INTEGER,
+        PRIMARY KEY (worker, metric, labels)
+    );
+"""
+# Worker name of the row that holds the totals of every worker that has exited
+EXITED = "exited"
+# Series that describe a worker's current state rather than count events; they leave with it
+_GAUGES = {("cache", json.dumps(["entries"])), ("cache", json.dumps(["bytes"]))}
+
+_ID_SEGMENT = re.compile(r"(/(?:tasks|projects|sections|labels|comments)/)[^/]+")
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        """Label values -> value, for publishing."""
+        with self._lock:
+            return dict(self._values)
+
+    def render(self, values=None):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted((self.snapshot() if values is None else values).items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        """Label values -> [bucket counts..., sum, count], for publishing."""
+        with self._lock:
+            return {key: list(series) for key, series in self._series.items()}
+
+    def render(self, values=None):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted((self.snapshot() if values is None else values).items()):
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+_registry = []
+
+REQUEST_DURATION = Histogram(
+    "flexbot_http_request_duration_seconds", "Time to handle a request, by route.", ("method", "route", "status"))
+REQUEST_UPSTREAM = Histogram(
+    "flexbot_http_request_upstream_seconds", "Time a request spent waiting on Todoist, by route.", ("route",))
+JSON_ENCODE = Histogram(
+    "flexbot_json_encode_seconds", "Time spent serializing JSON responses.")
+UPSTREAM_DURATION = Histogram(
+    "flexbot_upstream_request_duration_seconds", "Todoist call latency.", ("method", "path", "status"))
+UPSTREAM_BYTES = Counter(
+    "flexbot_upstream_response_bytes_total", "Bytes received from Todoist.", ("method", "path"))
+UPSTREAM_QUEUE_WAIT = Histogram(
+    "flexbot_upstream_queue_wait_seconds", "Time a Todoist call waited for a rate-limit token, by lane.", ("lane",))
+UPSTREAM_THROTTLED = Counter(
+    "flexbot_upstream_throttled_total", "Todoist 429 responses, by lane.", ("lane",))
+
+def path_template(path):
+    """Collapse IDs in a Todoist path so metrics have bounded cardinality."""
+    return _ID_SEGMENT.sub(r"\1{id}", path.split("?", 1)[0])
+
+def observe_upstream(method, path, status, seconds, size):
+    """Record one Todoist call, and add its time to the current request's upstream total."""
+    template = path_template(path)
+    UPSTREAM_DURATION.observe(seconds, method=method, path=template, status=status)
+    UPSTREAM_BYTES.inc(size, method=method, path=template)
+    if has_request_context():
+        g.upstream_seconds = g.get("upstream_seconds", 0.0) + seconds
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, timing every jsonify() serialization."""
+    def response(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().response(*args, **kwargs)
+        finally:
+            JSON_ENCODE.observe(time.perf_counter() - started)
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+def _observe_request(response):
+    started = g.get("metrics_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_DURATION.observe(time.perf_counter() - started,
+                                 method=request.method, route=route, status=response.status_code)
+        REQUEST_UPSTREAM.observe(g.get("upstream_seconds", 0.0), route=route)
+    return response
+
+def _worker_cache_stats():
+    """This worker's own cache counters; a shared backend's size is the same seen from any worker."""
+    stats = cache_stats()
+    own = ("hits", "misses", "invalidations")
+    if stats["backend"] == "memory":
+        own += ("evictions", "expirations", "entries", "bytes")
+    return stats, {stat: stats[stat] for stat in own if stat in stats}
+
+def _render_cache_stats(stats):
+    lines = []
+    for stat in ("hits", "misses", "invalidations", "evictions", "expirations"):
+        if stat in stats:
+            name = f"flexbot_cache_{stat}_total"
+            lines += [f"# TYPE {name} counter", f'{name}{{backend="{stats["backend"]}"}} {stats[stat]}']
+    for stat in ("entries", "bytes"):
+        if stat in stats:
+            name = f"flexbot_cache_{stat}"
+            lines += [f"# TYPE {name} gauge", f'{name}{{backend="{stats["backend"]}"}} {stats[stat]}']
+    return lines
+
+def _migrate(conn):
+    if "pid" not in [row[1] for row in conn.execute("PRAGMA table_info(samples)")]:
+        conn.execute("ALTER TABLE samples ADD COLUMN pid INTEGER")  # rows without one count as exited
+
+_db = Database(METRICS_PATH, SCHEMA, timeout=5, migrate=_migrate) if METRICS_PATH.lower() not in ("", "off", "none") else None
+_worker = None, None     # (pid, ID) of this process's rows; a fresh ID after a fork
+_published_at = 0.0
+_folded_at = 0.0
+
+def _worker_id():
+    global _worker
+    if _worker[0] != os.getpid():
+        _worker = os.getpid(), uuid.uuid4().hex
+    return _worker[1]
+
+def publish():
+    """Write this worker's current metrics to METRICS_PATH, replacing what it wrote before."""
+    global _published_at
+    _published_at = time.time()
+    worker = _worker_id()
+    pid = os.getpid()
+    rows = [(worker, metric.name, json.dumps(key), json.dumps(value), pid)
+            for metric in _registry for key, value in metric.snapshot().items()]
+    rows += [(worker, "cache", json.dumps([stat]), json.dumps(value), pid)
+             for stat, value in _worker_cache_stats()[1].items()]
+    with _db.connect() as conn, transaction(conn):
+        conn.execute("DELETE FROM samples WHERE worker = ?", (worker,))
+        conn.executemany("INSERT INTO samples (worker, metric, labels, value, pid) VALUES (?, ?, ?, ?, ?)", rows)
+        _fold_exited(conn)
+
+def _alive(pid):
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # running, as another user
+    return True
+
+def _fold_exited(conn):
+    """
+    Every METRICS_FOLD_INTERVAL, merge the rows of workers that have exited into the EXITED
+    row, so the table holds one row per series for each live worker and no more. A worker
+    has exited if its pid is gone or now belongs to another worker (pids get reused).
+    """
+    global _folded_at
+    if time.time() - _folded_at < METRICS_FOLD_INTERVAL:
+        return
+    _folded_at = time.time()
+    worker, pid = _worker_id(), os.getpid()
+    exited = [w for w, p in conn.execute("SELECT DISTINCT worker, pid FROM samples WHERE worker != ?", (EXITED,))
+              if not _alive(p) or (p == pid and w != worker)]
+    if not exited:
+        return
+    workers = [EXITED, *exited]
+    marks = ",".join("?" * len(workers))
+    totals = {}
+    for metric, labels, value in conn.execute(
+            f"SELECT metric, labels, value FROM samples WHERE worker IN ({marks})", workers):
+        if (metric, labels) not in _GAUGES:
+            totals[metric, labels] = _add(totals.get((metric, labels)), json.loads(value))
+    conn.execute(f"DELETE FROM samples WHERE worker IN ({marks})", workers)
+    conn.executemany("INSERT INTO samples (worker, metric, labels, value) VALUES (?, ?, ?, ?)",
+                     [(EXITED, metric, labels, json.dumps(value)) for (metric, labels), value in totals.items()])
+
+def reset():
+    """Forget every worker's published metrics (when the server starts, like a single process would)."""
+    if _db is not None:
+        with _db.connect() as conn:
+            conn.execute("DELETE FROM samples")
+
+def _add(total, value):
+    if total is None:
+        return value
+    if isinstance(value, list):
+        return [a + b for a, b in zip(total, value)]
+    return total + value
+
+def _aggregate():
+    """metric name -> label values -> the sum over every worker that has published, exited ones included."""
+    totals = {}
+    with _db.connect() as conn:
+        for name, labels, value in conn.execute("SELECT metric, labels, value FROM samples"):
+            series = totals.setdefault(name, {})
+            key = tuple(json.loads(labels))
+            series[key] = _add(series.get(key), json.loads(value))
+    return totals
+
+def render():
+    """
+    Prometheus text exposition of every worker's metrics on this host (see METRICS_PATH),
+    or of this worker's alone if there is no shared file or it can't be read.
+    """
+    stats = _worker_cache_stats()[0]
+    totals = None
+    if _db is not None:
+        try:
+            publish()
+            totals = _aggregate()
+        except sqlite3.Error:
+            logger.exception("Reading the shared metrics failed; reporting this worker only")
+    lines = []
+    for metric in _registry:
+        lines += metric.render(None if totals is None else totals.get(metric.name, {}))
+    if totals is not None:
+        stats.update({key[0]: value for key, value in totals.get("cache", {}).items()})
+    lines += _render_cache_stats(stats)
+    return "\n".join(lines) + "\n"
+
+def _publish_periodically(response):
+    if _db is not None and time.time() - _published_at >= METRICS_PUBLISH_INTERVAL:
+        try:
+            publish()
+        except sqlite3.Error:
+            logger.exception("Publishing metrics failed")
+    return response
+
+def init_metrics(app):
+    """Time every request and JSON response on the app, and publish this worker's metrics for /metrics."""
+    app.json = TimedJSONProvider(app)
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
+    app.after_request(_publish_periodically)
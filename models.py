@@ -0,0 +1,113 @@
+from sys import intern
+from datetime import datetime
+
+def _intern(value):
+    """Intern IDs and other repeated strings so every task shares one copy."""
+    return intern(value) if isinstance(value, str) else value
+
+def _parse_instant(raw):
+    """Epoch seconds for a fixed-timezone due datetime ("...Z"), None for all-day/floating ones."""
+    if not raw.endswith("Z"):
+        return None
+    try:
+        return datetime.fromisoformat(raw[:-1] + "+00:00").timestamp()
+    except ValueError:
+        return None
+
+class Task:
+    """
+    Compact internal representation of an active Todoist task.
+    Repeated IDs and label names are interned, and the due date is parsed once at ingest:
+    due_date is the calendar date, and due_at the UTC instant for tasks due at a fixed time.
+    Views and caches share Task objects by reference; to_dict() builds the REST v2 shape.
+    """
+    __slots__ = (
+        "id", "content", "description", "project_id", "section_id", "parent_id",
+        "order", "priority", "labels", "due", "due_date", "due_at", "duration",
+        "assignee_id", "assigner_id", "creator_id", "created_at",
+    )
+
+    # Fields of the `due` tuple, in order
+    DUE_FIELDS = ("date", "datetime", "string", "lang", "is_recurring", "timezone")
+
+    @classmethod
+    def from_sync_item(cls, item):
+        """Build a Task from a Sync API item."""
+        task = cls()
+        task.id = _intern(item["id"])
+        task.content = item.get("content")
+        task.description = item.get("description") or ""
+        task.project_id = _intern(item.get("project_id"))
+        task.section_id = _intern(item.get("section_id"))
+        task.parent_id = _intern(item.get("parent_id"))
+        task.order = item.get("child_order")
+        task.priority = item.get("priority", 1)
+        task.labels = tuple(_intern(name) for name in item.get("labels") or ())
+        task.duration = item.get("duration")
+        task.assignee_id = _intern(item.get("responsible_uid"))
+        task.assigner_id = _intern(item.get("assigned_by_uid"))
+        task.creator_id = _intern(item.get("added_by_uid"))
+        task.created_at = item.get("added_at")
+
+        due = item.get("due")
+        if due:
+            raw = due.get("date") or ""
+            task.due_date = _intern(raw[:10])
+            task.due_at = _parse_instant(raw)
+            task.due = (
+                task.due_date,
+                raw if "T" in raw else None,
+                due.get("string"),
+                _intern(due.get("lang")),
+                due.get("is_recurring", False),
+                _intern(due.get("timezone")),
+            )
+        else:
+            task.due_date = None
+            task.due_at = None
+            task.due = None
+        return task
+
+    def to_dict(self):
+        """The REST v2 task shape our endpoints return."""
+        return {
+            "id": self.id,
+            "content": self.content,
+            "description": self.description,
+            "project_id": self.project_id,
+            "section_id": self.section_id,
+            "parent_id": self.parent_id,
+            "order": self.order,
+            "priority": self.priority,
+            "labels": list(self.labels),
+            "due": dict(zip(self.DUE_FIELDS, self.due)) if self.due else None,
+            "duration": self.duration,
+            "assignee_id": self.assignee_id,
+            "assigner_id": self.assigner_id,
+            "creator_id": self.creator_id,
+            "created_at": self.created_at,
+            "is_completed": False,
+            "url": f"https://todoist.com/showTask?id={self.id}",
+        }
+
+    def sync_due(self):
+        """The due date as a Sync API due object (e.g. to copy it onto another task), or None."""
+        if not self.due:
+            return None
+        day, at, string, lang, is_recurring, tz = self.due
+        return {"date": at or day, "timezone": tz, "string": string, "lang": lang, "is_recurring": is_recurring}
+
+    def to_row(self):
+        """Slot values as a JSON-friendly list, for the on-disk snapshot."""
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_row(cls, row):
+        """Rebuild a Task from to_row() output."""
+        task = cls()
+        for name, value in zip(cls.__slots__, row):
+            setattr(task, name, _intern(value) if name.endswith("id") else value)
+        task.labels = tuple(_intern(name) for name in task.labels)
+        task.due_date = _intern(task.due_date)
+        task.due = tuple(task.due) if task.due else None
+        return task
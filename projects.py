@@ -1,9 +1,10 @@
 from flask import Blueprint, request, jsonify
-from utils import get_headers
-from cache import cache_get, cache_set
-import requests
+from store import get_store, refresh_after_write, SyncError
+from conditional import conditional, etag_for
+import todoist_client
 
 projects_bp = Blueprint('projects', __name__)
+projects_bp.after_request(refresh_after_write)
 
 def safe_json_response(response):
     if response.content:
@@ -16,14 +17,13 @@ def safe_json_response(response):
 
 @projects_bp.route("/list-projects", methods=["GET"])
 def list_projects():
-    cache_key = "projects"
-    cached = cache_get(cache_key)
-    if cached:
-        return jsonify(cached)
-    resp = requests.get("https://api.todoist.com/rest/v2/projects", headers=get_headers())
-    data = resp.json()
-    cache_set(cache_key, data, ttl=60)  # Cache for 60 seconds
-    return jsonify(data), resp.status_code
+    # Served from the store's mirror, which pulls a Sync delta when it is stale
+    store = get_store()
+    try:
+        store.ensure_fresh()
+    except SyncError as e:
+        return jsonify({"error": "Failed to fetch projects"}), e.status_code
+    return conditional(etag_for(store.state_tag()), lambda: jsonify(store.get_projects()))
 
 @projects_bp.route("/create-project", methods=["POST"])
 def create_project():
@@ -34,7 +34,7 @@ def create_project():
         "color": data.get("color")
     }
     project_data = {k: v for k, v in project_data.items() if v is not None}
-    resp = requests.post("https://api.todoist.com/rest/v2/projects", json=project_data, headers=get_headers())
+    resp = todoist_client.post("/rest/v2/projects", json=project_data)
     return safe_json_response(resp)
 
 @projects_bp.route("/edit-project", methods=["POST"])
@@ -48,7 +48,7 @@ def edit_project():
         "color": data.get("color")
     }
     update_data = {k: v for k, v in update_data.items() if v is not None}
-    resp = requests.post(f"https://api.todoist.com/rest/v2/projects/{project_id}", json=update_data, headers=get_headers())
+    resp = todoist_client.post(f"/rest/v2/projects/{project_id}", json=update_data)
     return safe_json_response(resp)
 
 @projects_bp.route("/delete-project", methods=["POST"])
@@ -57,7 +57,7 @@ def delete_project():
     project_id = data.get("project_id")
     if not project_id:
         return jsonify({"error": "project_id required"}), 400
-    resp = requests.delete(f"https://api.todoist.com/rest/v2/projects/{project_id}", headers=get_headers())
+    resp = todoist_client.delete(f"/rest/v2/projects/{project_id}")
     if resp.status_code == 204:
         return jsonify({"status": "deleted"}), 204
     else:
@@ -0,0 +1,158 @@
+import os
+import time
+import random
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from email.utils import parsedate_to_datetime
+from threading import Condition
+import requests
+from metrics import UPSTREAM_QUEUE_WAIT, UPSTREAM_THROTTLED
+
+logger = logging.getLogger(__name__)
+
+# Todoist allows about 1000 requests per user per 15 minutes. Buckets are per worker
+# process, so with several workers give each its share (e.g. 500 with WEB_CONCURRENCY=2).
+RATE_LIMIT = float(os.getenv("TODOIST_RATE_LIMIT", "1000"))
+RATE_WINDOW = float(os.getenv("TODOIST_RATE_WINDOW", "900"))
+# Requests that may go out back to back before the steady rate applies
+RATE_BURST = float(os.getenv("TODOIST_RATE_BURST", "50"))
+# Tokens bulk work must leave in the bucket, so interactive calls can still get through
+BULK_RESERVE = float(os.getenv("TODOIST_BULK_RESERVE", "10"))
+# Longest an interactive / bulk call may queue for a token before giving up
+INTERACTIVE_MAX_WAIT = float(os.getenv("TODOIST_INTERACTIVE_MAX_WAIT", "10"))
+BULK_MAX_WAIT = float(os.getenv("TODOIST_BULK_MAX_WAIT", "300"))
+# Retries after a 429 for calls that are safe to repeat
+RATE_LIMIT_RETRIES = int(os.getenv("TODOIST_429_RETRIES", "3"))
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+_lane = ContextVar("upstream_lane", default=INTERACTIVE)
+
+class RateLimited(Exception):
+    """Raised when a call would have to queue longer than its lane allows."""
+    def __init__(self, retry_after):
+        super().__init__(f"Todoist rate limit reached; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+@contextmanager
+def bulk():
+    """Send the upstream calls made inside this block in the bulk lane."""
+    token = _lane.set(BULK)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+def current_lane():
+    return _lane.get()
+
+def bind(fn):
+    """Wrap fn so it runs in the caller's lane when called from a worker thread."""
+    context = copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+class TokenBucket:
+    """
+    Token bucket for one API token. Interactive callers take any token; bulk callers
+    leave `reserve` tokens in the bucket and yield while an interactive caller is waiting.
+    A 429 pauses the whole bucket until Retry-After has passed.
+    """
+    def __init__(self, rate=RATE_LIMIT / RATE_WINDOW, capacity=RATE_BURST, reserve=BULK_RESERVE):
+        self.rate = rate
+        self.capacity = capacity
+        self.reserve = min(reserve, capacity - 1)
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.interactive_waiting = 0
+        self._cond = Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, lane=INTERACTIVE, max_wait=None):
+        """Take one token, waiting up to max_wait seconds. Raises RateLimited if that isn't enough."""
+        interactive = lane == INTERACTIVE
+        floor = 1 if interactive else 1 + self.reserve
+        deadline = time.monotonic() + (max_wait if max_wait is not None else INTERACTIVE_MAX_WAIT)
+        with self._cond:
+            if interactive:
+                self.interactive_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    blocked = not interactive and self.interactive_waiting
+                    if now >= self.paused_until and self.tokens >= floor and not blocked:
+                        self.tokens -= 1
+                        return
+                    wait = max(self.paused_until - now, (floor - self.tokens) / self.rate, 0.01)
+                    if now + wait > deadline:
+                        raise RateLimited(wait)
+                    self._cond.wait(wait)
+            finally:
+                if interactive:
+                    self.interactive_waiting -= 1
+                    self._cond.notify_all()
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (Todoist answered 429)."""
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+def retry_after(resp, attempt):
+    """Seconds to wait after a 429: Retry-After (seconds or HTTP date), else jittered exponential backoff."""
+    value = resp.headers.get("Retry-After")
+    if value:
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                seconds = None
+        if seconds is not None:
+            # A little jitter so queued callers don't all retry in the same instant
+            return max(seconds, 0.0) * random.uniform(1.0, 1.1)
+    return random.uniform(0.5, 1.0) * min(2 ** attempt, 60)
+
+def _retryable(method, url, headers):
+    # Sync commands carry uuids and POSTs with X-Request-Id are deduplicated by Todoist
+    return (method.upper() in ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+            or url.endswith("/sync/v9/sync") or "X-Request-Id" in headers)
+
+class RateLimitedSession(requests.Session):
+    """
+    requests.Session that schedules every call through its token bucket. Each tenant
+    has one session (see todoist_client.get_session), so REST, Sync and todoist_api_python
+    calls share one budget per account, and it is dropped with the tenant.
+    """
+    def __init__(self, bucket=None):
+        super().__init__()
+        self.bucket = bucket or TokenBucket()
+
+    def request(self, method, url, *args, **kwargs):
+        headers = kwargs.get("headers") or {}
+        bucket = self.bucket
+        lane = current_lane()
+        max_wait = INTERACTIVE_MAX_WAIT if lane == INTERACTIVE else BULK_MAX_WAIT
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            bucket.acquire(lane, max_wait)
+            UPSTREAM_QUEUE_WAIT.observe(time.perf_counter() - started, lane=lane)
+            resp = super().request(method, url, *args, **kwargs)
+            if resp.status_code != 429:
+                return resp
+            UPSTREAM_THROTTLED.inc(lane=lane)
+            delay = retry_after(resp, attempt)
+            bucket.pause(delay)
+            if attempt >= RATE_LIMIT_RETRIES or delay > max_wait or not _retryable(method, url, headers):
+                return resp
+            attempt += 1
+            logger.warning(f"Todoist returned 429 for {method} {url}; retry {attempt} in {delay:.1f}s ({lane})")
+            resp.close()
@@ -1,8 +1,10 @@
 from flask import Blueprint, request, jsonify
-from utils import get_headers  # <-- Uses env var inside
-import requests
+from store import get_store, refresh_after_write, SyncError
+from conditional import conditional, etag_for
+import todoist_client
 
 sections_bp = Blueprint('sections', __name__)
+sections_bp.after_request(refresh_after_write)
 
 def safe_json_response(response):
     if response.content:
@@ -22,7 +24,7 @@ def create_section():
     }
     if not section_data["name"] or not section_data["project_id"]:
         return jsonify({"error": "Both name and project_id are required"}), 400
-    resp = requests.post("https://api.todoist.com/rest/v2/sections", json=section_data, headers=get_headers())
+    resp = todoist_client.post("/rest/v2/sections", json=section_data)
     return safe_json_response(resp)
 
 @sections_bp.route("/edit-section", methods=["POST"])
@@ -32,10 +34,9 @@ def edit_section():
     new_name = data.get("name")
     if not section_id or not new_name:
         return jsonify({"error": "section_id and name required"}), 400
-    resp = requests.post(
-        f"https://api.todoist.com/rest/v2/sections/{section_id}",
-        json={"name": new_name},
-        headers=get_headers()
+    resp = todoist_client.post(
+        f"/rest/v2/sections/{section_id}",
+        json={"name": new_name}
     )
     if resp.status_code == 200:
         return jsonify({"status": "updated"}), 200
@@ -48,9 +49,8 @@ def delete_section():
     section_id = data.get("section_id")
     if not section_id:
         return jsonify({"error": "section_id required"}), 400
-    resp = requests.delete(
-        f"https://api.todoist.com/rest/v2/sections/{section_id}",
-        headers=get_headers()
+    resp = todoist_client.delete(
+        f"/rest/v2/sections/{section_id}"
     )
     if resp.status_code == 204:
         return jsonify({"status": "deleted"}), 200
@@ -60,19 +60,10 @@ def delete_section():
 @sections_bp.route("/get-sections", methods=["GET"])
 def get_sections():
     project_id = request.args.get("project_id")
-    params = {}
-    if project_id:
-        params["project_id"] = project_id
-    resp = requests.get(
-        "https://api.todoist.com/rest/v2/sections",
-        headers=get_headers(),
-        params=params
-    )
-    if resp.status_code == 200:
-        return jsonify(resp.json()), 200
-    else:
-        return jsonify({
-            "error": "Failed to fetch sections",
-            "details": resp.text
-        }), resp.status_code
-
+    # Served from the store's mirror, which pulls a Sync delta when it is stale
+    store = get_store()
+    try:
+        store.ensure_fresh()
+    except SyncError as e:
+        return jsonify({"error": "Failed to fetch sections"}), e.status_code
+    return conditional(etag_for(store.state_tag()), lambda: jsonify(store.get_sections(project_id)))
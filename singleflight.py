@@ -0,0 +1,37 @@
+from threading import Event, Lock
+
+class _Call:
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+_calls = {}
+_lock = Lock()
+
+def do(key, fn):
+    """
+    Run fn() once for all concurrent callers with the same key.
+    Callers that arrive while it is in flight wait and get the same result (or exception).
+    """
+    with _lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = fn()
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            del _calls[key]
+        call.done.set()
+    return call.result
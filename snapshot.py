@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import tempfile
+from sqlite_db import Database, transaction
+from models import Task
+from tenants import tenant_key
+
+logger = logging.getLogger(__name__)
+
+# SQLite file with the last synced state, one per account (the account's tenant key is
+# added to the name); set to "off" to always start with a full sync
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", os.path.join(tempfile.gettempdir(), "flexbot-snapshot.db"))
+# A worker whose sync history doesn't match the snapshot rewrites it once it is this old (seconds)
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", "60"))
+
+# Bumped whenever Task's slots or the stored shapes change; older snapshots are ignored
+FORMAT = f"1:{','.join(Task.__slots__)}"
+
+KINDS = ("tasks", "labels", "projects", "sections")
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS objects (
+        kind TEXT NOT NULL, id TEXT NOT NULL, row TEXT NOT NULL, PRIMARY KEY (kind, id)
+    );
+"""
+
+def _encode(kind, obj):
+    return json.dumps(obj.to_row() if kind == "tasks" else obj, separators=(",", ":"))
+
+class Snapshot:
+    """
+    On-disk copy of a TaskStore's synced state (tasks, labels, projects, sections and
+    the sync_token), so a restarted worker can serve at once and only pull a delta.
+    Deltas are written as row upserts/deletes in one transaction with the new token.
+    """
+    def __init__(self, path=SNAPSHOT_PATH, api_token=None):
+        self.path = path
+        self.account = tenant_key(api_token or "")
+        self._db = Database(path, SCHEMA, timeout=5)
+
+    def close(self):
+        self._db.close()
+
+    def _meta(self, conn):
+        return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+
+    def load(self):
+        """
+        Return {"sync_token", "user_id", "tasks": [Task], "labels"/"projects"/"sections": {id: obj}},
+        or None if there is no usable snapshot for this account and format.
+        """
+        try:
+            with self._db.connect() as conn:
+                meta = self._meta(conn)
+                if meta.get("format") != FORMAT or meta.get("account") != self.account or not meta.get("sync_token"):
+                    return None
+                state = {"sync_token": meta["sync_token"], "user_id": meta.get("user_id") or None, "tasks": [], "labels": {}, "projects": {}, "sections": {}}
+                for kind, obj_id, row in conn.execute("SELECT kind, id, row FROM objects"):
+                    if kind == "tasks":
+                        state["tasks"].append(Task.from_row(json.loads(row)))
+                    elif kind in state:
+                        state[kind][obj_id] = json.loads(row)
+                return state
+        except (sqlite3.Error, ValueError, TypeError):
+            logger.exception("Ignoring unreadable snapshot")
+            return None
+
+    def save(self, from_token, sync_token, changes, full_state, user_id=None):
+        """
+        Persist a sync. `changes` maps kind -> (upserted {id: obj}, removed ids), or is None
+        after a full sync. If the snapshot isn't at `from_token` (another worker is writing
+        it) the delta would not line up, so it is skipped, or replaced by full_state() once
+        the snapshot is older than SNAPSHOT_MAX_AGE.
+        """
+        try:
+            with self._db.connect() as conn, transaction(conn):
+                meta = self._meta(conn)
+                lined_up = (meta.get("sync_token") == from_token and meta.get("format") == FORMAT
+                            and meta.get("account") == self.account)
+                if changes is not None and not lined_up:
+                    if time.time() - float(meta.get("saved_at", 0)) < SNAPSHOT_MAX_AGE:
+                        return
+                    changes = None
+                if changes is None:
+                    conn.execute("DELETE FROM objects")
+                    changes = {kind: (objects, ()) for kind, objects in full_state().items()}
+                for kind, (upserts, removed) in changes.items():
+                    conn.executemany("DELETE FROM objects WHERE kind = ? AND id = ?", [(kind, i) for i in removed])
+                    conn.executemany("INSERT OR REPLACE INTO objects (kind, id, row) VALUES (?, ?, ?)",
+                                     [(kind, obj_id, _encode(kind, obj)) for obj_id, obj in upserts.items()])
+                conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+                    ("format", FORMAT), ("account", self.account),
+                    ("sync_token", sync_token), ("saved_at", str(time.time())), ("user_id", user_id or ""),
+                ])
+        except sqlite3.Error:
+            logger.exception("Failed to write snapshot")
+
+def open_snapshot(api_token):
+    """The snapshot for this API token, or None if SNAPSHOT_PATH is "off"."""
+    if SNAPSHOT_PATH.lower() in ("", "off", "none"):
+        return None
+    root, ext = os.path.splitext(SNAPSHOT_PATH)
+    return Snapshot(f"{root}-{tenant_key(api_token)}{ext}", api_token)
@@ -0,0 +1,78 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+class Database:
+    """
+    A SQLite file shared by the workers on a host (cache, snapshots, jobs, archive).
+    Lends out autocommit connections, in WAL mode and with `schema` applied;
+    `migrate(conn)`, if given, runs after it to upgrade older files.
+    """
+    def __init__(self, path, schema, timeout=10, synchronous="NORMAL", pragmas=(), migrate=None, pool_size=4):
+        self.path = path
+        self.schema = schema
+        self.timeout = timeout
+        self.synchronous = synchronous
+        self.pragmas = tuple(pragmas)
+        self.migrate = migrate
+        self.pool_size = pool_size
+        self._idle = []            # this process's open connections nobody is using
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connect(self):
+        """
+        Borrow a connection for the block. The pool is per process, not per thread: under
+        gevent every request is its own greenlet, and a thread-local would open (and set
+        up) a fresh connection for each one.
+        """
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            self._checkin(conn)
+
+    def _checkout(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # SQLite handles must not cross a fork; leave the parent's to the parent
+                self._idle, self._pid = [], os.getpid()
+            if self._idle:
+                return self._idle.pop()
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        for pragma in self.pragmas:
+            conn.execute(f"PRAGMA {pragma}")
+        conn.executescript(self.schema)
+        if self.migrate is not None:
+            self.migrate(conn)
+        return conn
+
+    def _checkin(self, conn):
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.pool_size and not conn.in_transaction:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """Close this process's idle connections; borrowed ones close when they come back."""
+        with self._lock:
+            idle, self._idle = (self._idle, []) if self._pid == os.getpid() else ([], self._idle)
+            self.pool_size = 0
+        for conn in idle:
+            conn.close()
+
+@contextmanager
+def transaction(conn):
+    """Explicit write transaction on an autocommit SQLite connection."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
@@ -0,0 +1,439 @@
+import os
+import json
+import time
+import hashlib
+from datetime import date, datetime, timedelta
+import logging
+from contextvars import copy_context
+from threading import Lock, Thread
+from flask import request
+import todoist_client
+import tenants
+from task_index import TaskIndex, normalize_label
+from models import Task
+from cache import cache_invalidate
+from snapshot import open_snapshot
+
+logger = logging.getLogger(__name__)
+
+# How old (in seconds) the mirror may get before a read triggers an incremental sync
+SYNC_INTERVAL = float(os.getenv("STORE_SYNC_INTERVAL", "5"))
+# Seconds before a label name that was still unknown after a refresh may trigger another one
+LABEL_MISS_TTL = float(os.getenv("LABEL_MISS_TTL", "60"))
+# Seconds Todoist's clock may run apart from ours; events this close to a sync aren't patched in
+EVENT_CLOCK_SKEW = float(os.getenv("WEBHOOK_CLOCK_SKEW", "2"))
+
+RESOURCE_TYPES = ["items", "labels", "projects", "sections", "user"]
+
+class SyncError(Exception):
+    """Raised when the store has no data and the Sync API call fails."""
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.status_code = status_code
+
+def task_cache_tags(task):
+    """Cache tags that a change to this task must invalidate."""
+    if not task:
+        return set()
+    tags = {"tasks"}
+    if task.project_id:
+        tags.add(f"project:{task.project_id}")
+    if task.section_id:
+        tags.add(f"section:{task.section_id}")
+    for name in task.labels:
+        tags.add(f"label:{normalize_label(name)}")
+    if task.due_date:
+        tags.add(f"due:{task.due_date}")
+    return tags
+
+def query_cache_tags(project_id=None, section_id=None, label=None, due_from=None, due_to=None, tz=None):
+    """
+    Tags for a cached TaskStore.query result. Every task the result could contain
+    carries at least one of them, so task_cache_tags() invalidation is exact enough.
+    Due tags use UTC dates, so date ranges are widened by a day for timed tasks in other timezones.
+    """
+    tags = set()
+    if project_id:
+        tags.add(f"project:{project_id}")
+    if section_id:
+        tags.add(f"section:{section_id}")
+    if label:
+        tags.add(f"label:{normalize_label(label)}")
+    if due_from and due_to:
+        start = date.fromisoformat(due_from) - timedelta(days=1)
+        end = date.fromisoformat(due_to) + timedelta(days=1)
+        if (end - start).days <= 33:
+            tags.update(f"due:{(start + timedelta(days=n)).isoformat()}" for n in range((end - start).days + 1))
+    # "task_views" lets a full resync drop every task-derived entry at once
+    return (tags or {"tasks"}) | {"task_views"}
+
+def sync_label_to_label(label):
+    """Convert a Sync API label into the REST v2 label shape."""
+    return {
+        "id": label["id"],
+        "name": label.get("name"),
+        "color": label.get("color"),
+        "order": label.get("item_order"),
+        "is_favorite": bool(label.get("is_favorite")),
+    }
+
+def sync_project_to_project(project):
+    """Convert a Sync API project into the REST v2 project shape."""
+    return {
+        "id": project["id"],
+        "name": project.get("name"),
+        "color": project.get("color"),
+        "parent_id": project.get("parent_id"),
+        "order": project.get("child_order"),
+        "is_shared": bool(project.get("shared")),
+        "is_favorite": bool(project.get("is_favorite")),
+        "is_inbox_project": bool(project.get("inbox_project")),
+        "is_team_inbox": bool(project.get("team_inbox")),
+        "view_style": project.get("view_style"),
+        "url": f"https://todoist.com/showProject?id={project['id']}",
+    }
+
+def sync_section_to_section(section):
+    """Convert a Sync API section into the REST v2 section shape."""
+    return {
+        "id": section["id"],
+        "project_id": section.get("project_id"),
+        "order": section.get("section_order"),
+        "name": section.get("name"),
+    }
+
+def _event_time(stamp):
+    """Epoch seconds for a webhook's triggered_at ("2024-05-01T10:13:00.000000Z"), or None."""
+    try:
+        return datetime.fromisoformat(stamp.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+def _by_order(objects):
+    return sorted(objects, key=lambda obj: obj.get("order") or 0)
+
+class TaskStore:
+    """
+    In-process mirror of the account's active tasks, personal labels, projects and sections.
+    Does one full sync (or loads the on-disk snapshot), then keeps itself current with
+    Sync API deltas (sync_token), writing each one back to the snapshot.
+    Tasks are held as models.Task; call to_dict() on them to get the REST shape.
+    """
+    def __init__(self, sync_interval=SYNC_INTERVAL):
+        self.sync_interval = sync_interval
+        self.sync_token = "*"
+        self.last_sync = 0.0
+        self.synced_from = 0.0     # when the last successful sync was requested; it holds every earlier change
+        self.user_id = None        # the account's Todoist user ID, which webhooks are addressed by
+        self._patches = ""         # digest of the webhook patches applied since sync_token last changed
+        self._tasks = TaskIndex()
+        self._labels = {}          # label id -> label
+        self._projects = {}        # project id -> project
+        self._sections = {}        # section id -> section
+        self._snapshot = None
+        self._snapshot_loaded = False
+        self._label_ids = {}       # label name -> label id
+        self._label_misses = {}    # unknown name -> when a refresh last failed to find it
+        self._sync_lock = Lock()   # one upstream sync at a time
+        self._data_lock = Lock()   # guards the index while deltas are applied
+        self._refreshing = False   # a background sync is running
+        self._refresh_lock = Lock()
+
+    def is_stale(self):
+        return time.time() - self.last_sync > self.sync_interval
+
+    def state_tag(self):
+        """
+        Names the mirror's current contents: the sync_token plus a digest of the webhook
+        patches applied since. Workers at the same sync_token that applied the same events
+        hold the same data and share the tag; a worker patched differently gets another one.
+        """
+        with self._data_lock:
+            return f"{self.sync_token}.{self._patches[:16] or 0}"
+
+    def close(self):
+        """Release the snapshot's connections (the tenant was evicted)."""
+        if self._snapshot:
+            self._snapshot.close()
+
+    def mark_stale(self):
+        """Force the next read to pull a delta (e.g. after a write or a webhook)."""
+        self.last_sync = 0.0
+
+    def apply_event(self, resource, obj, removed=False, triggered_at=None):
+        """
+        Patch the mirror with one changed Sync API object (e.g. from a webhook) and drop
+        only the cached views it belonged to before or belongs to now. Returns whether it patched.
+        `resource` is "items", "labels", "projects" or "sections"; `triggered_at` is when
+        Todoist recorded the change (ISO 8601). A delta only carries changes made after the
+        token it starts from, so an event the last sync may already include (a late delivery
+        or a retry, or one without a time) is never applied over it: the mirror pulls a delta
+        on the next read instead.
+        """
+        if not obj.get("id"):
+            return False
+        changed_at = _event_time(triggered_at)
+        if changed_at is None or changed_at <= self.synced_from + EVENT_CLOCK_SKEW:
+            self.mark_stale()
+            return False
+        touched = set()
+        with self._data_lock:
+            if resource == "items":
+                touched |= task_cache_tags(self._tasks.get(obj["id"]))
+                if removed or obj.get("is_deleted") or obj.get("checked"):
+                    self._tasks.remove(obj["id"])
+                else:
+                    task = Task.from_sync_item(obj)
+                    self._tasks.add(task)
+                    touched |= task_cache_tags(task)
+            else:
+                mapping, convert = {
+                    "labels": (self._labels, sync_label_to_label),
+                    "projects": (self._projects, sync_project_to_project),
+                    "sections": (self._sections, sync_section_to_section),
+                }[resource]
+                self._apply(mapping, [{**obj, "is_deleted": True} if removed else obj], convert, False)
+                if resource == "labels":
+                    self._label_ids = {label["name"]: label_id for label_id, label in self._labels.items()}
+            patch = json.dumps([resource, removed, obj], sort_keys=True, default=str)
+            self._patches = hashlib.sha256(f"{self._patches}:{patch}".encode()).hexdigest()
+        if touched:
+            cache_invalidate(*touched)
+        return True
+
+    def sync(self):
+        """Pull changes since the last sync_token and apply them to the mirror."""
+        with self._sync_lock:
+            self._sync()
+
+    def _load_snapshot(self):
+        """Seed an empty mirror from the on-disk snapshot, so the first sync is only a delta."""
+        self._snapshot_loaded = True
+        self._snapshot = open_snapshot(todoist_client.api_token())
+        state = self._snapshot.load() if self._snapshot else None
+        if not state:
+            return
+        with self._data_lock:
+            self._tasks = TaskIndex.build(state["tasks"])
+            self._labels, self._projects, self._sections = state["labels"], state["projects"], state["sections"]
+            self._label_ids = {label["name"]: label_id for label_id, label in self._labels.items()}
+            self.sync_token = state["sync_token"]
+        self._set_user(state["user_id"])
+        logger.info(f"Task store loaded from snapshot: {len(self._tasks)} tasks, {len(self._projects)} projects")
+
+    def _set_user(self, user_id):
+        if user_id and user_id != self.user_id:
+            self.user_id = user_id
+            tenants.register_user(user_id, tenants.current())
+
+    def _full_state(self):
+        with self._data_lock:
+            return {
+                "tasks": dict(self._tasks.tasks),
+                "labels": dict(self._labels),
+                "projects": dict(self._projects),
+                "sections": dict(self._sections),
+            }
+
+    @staticmethod
+    def _apply(mapping, objects, convert, full):
+        """Apply Sync API objects to an id -> object map; returns (upserts, removed IDs)."""
+        if full:
+            mapping.clear()
+        upserts, removed = {}, []
+        for obj in objects:
+            if obj.get("is_deleted") or obj.get("is_archived"):
+                mapping.pop(obj["id"], None)
+                removed.append(obj["id"])
+            else:
+                upserts[obj["id"]] = mapping[obj["id"]] = convert(obj)
+        return upserts, removed
+
+    def _sync(self):
+        if not self._snapshot_loaded:
+            self._load_snapshot()
+        from_token = self.sync_token
+        requested_at = time.time()
+        resp = todoist_client.sync(sync_token=from_token, resource_types=RESOURCE_TYPES)
+        try:
+            data = resp.json()
+        except Exception:
+            data = None
+        if resp.status_code != 200 or not isinstance(data, dict):
+            raise SyncError("Failed to sync tasks", resp.status_code)
+
+        full = bool(data.get("full_sync"))
+        with self._data_lock:
+            items = data.get("items", [])
+            task_changes = ({}, [])
+            if full:
+                self._tasks = TaskIndex.build(
+                    Task.from_sync_item(item) for item in items
+                    if not (item.get("is_deleted") or item.get("checked"))
+                )
+                touched = {"task_views"}
+            else:
+                touched = set()
+                for item in items:
+                    touched |= task_cache_tags(self._tasks.get(item["id"]))
+                    if item.get("is_deleted") or item.get("checked"):
+                        self._tasks.remove(item["id"])
+                        task_changes[1].append(item["id"])
+                    else:
+                        task = Task.from_sync_item(item)
+                        self._tasks.add(task)
+                        task_changes[0][task.id] = task
+                        touched |= task_cache_tags(task)
+            changes = {
+                "tasks": task_changes,
+                "labels": self._apply(self._labels, data.get("labels", []), sync_label_to_label, full),
+                "projects": self._apply(self._projects, data.get("projects", []), sync_project_to_project, full),
+                "sections": self._apply(self._sections, data.get("sections", []), sync_section_to_section, full),
+            }
+            if full or data.get("labels"):
+                self._label_ids = {label["name"]: label_id for label_id, label in self._labels.items()}
+            if data.get("sync_token", self.sync_token) != self.sync_token:
+                self.sync_token = data["sync_token"]
+                self._patches = ""
+            self.last_sync = time.time()
+            self.synced_from = requested_at
+        self._set_user((data.get("user") or {}).get("id"))
+        if touched:
+            cache_invalidate(*touched)
+        if self._snapshot and (full or any(upserts or removed for upserts, removed in changes.values())
+                               or self.sync_token != from_token):
+            self._snapshot.save(from_token, self.sync_token, None if full else changes, self._full_state,
+                                user_id=self.user_id)
+        logger.debug(f"Task store synced ({'full' if full else 'delta'}): {len(items)} items, {len(data.get('labels', []))} labels")
+
+    def ensure_fresh(self):
+        """
+        Sync if the mirror is stale. Once it holds data, a mirror that only outlived
+        sync_interval is served as is while one background thread pulls the delta; one
+        marked stale (after a write) syncs first, so callers see their own changes.
+        Either way it serves the current data while another thread syncs.
+        """
+        if not self.is_stale():
+            return
+        if self.sync_token != "*" and self.last_sync:
+            self._refresh_in_background()
+            return
+        if self.sync_token != "*" and self._sync_lock.locked():
+            return
+        with self._sync_lock:
+            if not self.is_stale():
+                return  # another thread synced while we waited
+            try:
+                self._sync()
+            except SyncError:
+                if self.sync_token == "*":
+                    raise
+                logger.exception("Incremental sync failed; serving the last known tasks")
+
+    def _refresh_in_background(self):
+        with self._refresh_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        # The copied context keeps the caller's tenant (and rate-limit lane) for the sync
+        Thread(target=copy_context().run, args=(self._background_sync,), name="store-refresh", daemon=True).start()
+
+    def _background_sync(self):
+        try:
+            with self._sync_lock:
+                if self.is_stale():
+                    self._sync()
+        except Exception:
+            logger.exception("Background sync failed; serving the last known tasks")
+        finally:
+            self._refreshing = False
+
+    def get_tasks(self):
+        """Return all active tasks."""
+        self.ensure_fresh()
+        with self._data_lock:
+            return self._tasks.values()
+
+    def query(self, **filters):
+        """Return active tasks matching the TaskIndex.query filters."""
+        self.ensure_fresh()
+        with self._data_lock:
+            return self._tasks.query(**filters)
+
+    def get_many(self, task_ids):
+        """Resolve cached task IDs to the tasks still active, keeping their order."""
+        with self._data_lock:
+            return [task for task in map(self._tasks.get, task_ids) if task is not None]
+
+    def get_task(self, task_id):
+        """Return one active task by ID, or None."""
+        self.ensure_fresh()
+        with self._data_lock:
+            return self._tasks.get(str(task_id))
+
+    def get_subtree(self, task_id):
+        """Return [task, *its subtasks at every depth], parents before children; [] if the task isn't active."""
+        self.ensure_fresh()
+        with self._data_lock:
+            task = self._tasks.get(str(task_id))
+            return [task, *self._tasks.descendants(task.id)] if task else []
+
+    def get_labels(self):
+        """Return all personal labels."""
+        self.ensure_fresh()
+        with self._data_lock:
+            return list(self._labels.values())
+
+    def get_projects(self):
+        """Return all active projects."""
+        self.ensure_fresh()
+        with self._data_lock:
+            return _by_order(self._projects.values())
+
+    def get_sections(self, project_id=None):
+        """Return all active sections, or those of one project."""
+        self.ensure_fresh()
+        with self._data_lock:
+            sections = self._sections.values()
+            if project_id:
+                sections = [s for s in sections if str(s.get("project_id")) == str(project_id)]
+            return _by_order(sections)
+
+    def label_ids(self, names):
+        """
+        Resolve label names to IDs from the local label map.
+        Unknown names trigger at most one delta sync per call, and a name that is still
+        unknown afterwards won't trigger another for LABEL_MISS_TTL seconds.
+        """
+        now = time.time()
+        self.ensure_fresh()
+        with self._data_lock:
+            missing = [n for n in names if n not in self._label_ids
+                       and now - self._label_misses.get(n, 0) > LABEL_MISS_TTL]
+        if missing:
+            # Wait for the lock rather than skip like ensure_fresh: a miss only counts
+            # after a sync that finished since this call started
+            try:
+                with self._sync_lock:
+                    if self.last_sync < now:
+                        self._sync()
+            except SyncError:
+                logger.exception("Sync for unknown labels failed")
+                missing = []
+        with self._data_lock:
+            for name in missing:
+                if name not in self._label_ids:
+                    self._label_misses[name] = now
+                else:
+                    self._label_misses.pop(name, None)
+            return [self._label_ids[n] for n in names if n in self._label_ids]
+
+def get_store():
+    """Return the current tenant's task store."""
+    return tenants.current().resource("store", TaskStore)
+
+def refresh_after_write(response):
+    """after_request hook for blueprints that change tasks upstream: pull a delta on the next read."""
+    if request.method != "GET" and response.status_code < 400:
+        get_store().mark_stale()
+    return response
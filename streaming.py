@@ -0,0 +1,92 @@
+import base64
+from itertools import islice
+from flask import Response, current_app, jsonify, request
+
+# Largest page a client may ask for with ?limit=
+MAX_PAGE_SIZE = 10000
+
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(f"o:{offset}".encode()).decode()
+
+def decode_cursor(cursor):
+    """Turn an opaque cursor back into an offset. Raises ValueError if it is malformed."""
+    try:
+        kind, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split(":", 1)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if kind != "o" or not offset.isdigit():
+        raise ValueError("Invalid cursor")
+    return int(offset)
+
+def _page_args():
+    """Read format/limit/cursor from the query string, falling back to a JSON body."""
+    body = request.get_json(silent=True) if request.is_json else None
+    body = body if isinstance(body, dict) else {}
+    def arg(name):
+        value = request.args.get(name)
+        return value if value is not None else body.get(name)
+
+    fmt = arg("format") or "json"
+    if fmt not in ("json", "stream", "ndjson"):
+        raise ValueError("format must be json, stream or ndjson")
+    limit = arg("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise ValueError("limit must be an integer")
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    cursor = arg("cursor")
+    offset = decode_cursor(cursor) if cursor else 0
+    return fmt, limit, offset
+
+def _json_array(items, dumps):
+    yield "["
+    first = True
+    for item in items:
+        if not first:
+            yield ","
+        first = False
+        yield dumps(item)
+    yield "]"
+
+def _ndjson(items, dumps):
+    for item in items:
+        yield dumps(item) + "\n"
+
+def list_response(items, serialize=None):
+    """
+    Respond with a list, honoring ?format= and ?limit=/?cursor=.
+    format=json (default) returns one JSON array as before; format=stream sends the same
+    array with chunked encoding, and format=ndjson one object per line, both encoded item
+    by item from the iterable. With a limit, the next page's cursor is in X-Next-Cursor.
+    `serialize` (e.g. Task.to_dict) is applied to the page only, as it is encoded.
+    """
+    try:
+        fmt, limit, offset = _page_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    next_cursor = None
+    if limit is not None or offset:
+        end = None if limit is None else offset + limit + 1
+        page = items[offset:end] if isinstance(items, list) else list(islice(items, offset, end))
+        if limit is not None and len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor(offset + limit)
+        items = page
+    if serialize is not None:
+        items = map(serialize, items)
+
+    if fmt == "json":
+        response = jsonify(items if isinstance(items, list) else list(items))
+    else:
+        dumps = current_app.json.dumps
+        if fmt == "ndjson":
+            response = Response(_ndjson(items, dumps), mimetype="application/x-ndjson")
+        else:
+            response = Response(_json_array(items, dumps), mimetype="application/json")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
@@ -0,0 +1,168 @@
+import bisect
+from datetime import date, datetime, time, timedelta, timezone
+from itertools import count
+
+# Upper bound for task IDs in the due index, so (date, _MAX_ID) sorts after every (date, id)
+_MAX_ID = "\U0010ffff"
+
+def normalize_label(name):
+    """Labels are matched case-insensitively everywhere."""
+    return name.lower()
+
+def _add_to(index, key, task_id):
+    if key is None:
+        return
+    index.setdefault(str(key), set()).add(task_id)
+
+def _remove_from(index, key, task_id):
+    if key is None:
+        return
+    ids = index.get(str(key))
+    if ids is not None:
+        ids.discard(task_id)
+        if not ids:
+            del index[str(key)]
+
+def _sorted_remove(keys, key):
+    i = bisect.bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        del keys[i]
+
+def _day_start(day, tz):
+    """Epoch seconds at local midnight starting `day` (YYYY-MM-DD) in tz."""
+    return datetime.combine(date.fromisoformat(day), time.min, tzinfo=tz).timestamp()
+
+class TaskIndex:
+    """
+    Task collection with secondary indexes.
+    Hash indexes on project_id, section_id and normalized label, plus two sorted
+    due indexes for range scans: (due date, task_id) for all-day and floating tasks,
+    which are due on that calendar date in any timezone, and (UTC timestamp, task_id)
+    for tasks due at a fixed time, whose local date depends on the viewer's timezone.
+    Filters intersect indexes instead of scanning every task.
+    """
+    def __init__(self):
+        self.tasks = {}
+        self.by_project = {}
+        self.by_section = {}
+        self.by_label = {}
+        self.by_parent = {}
+        self.due_keys = []
+        self.due_instants = []
+        self._seq = {}
+        self._counter = count()
+
+    @classmethod
+    def build(cls, tasks):
+        """Bulk-load tasks, sorting the due index once instead of per insert."""
+        index = cls()
+        for task in tasks:
+            index._seq[task.id] = next(index._counter)
+            index.tasks[task.id] = task
+            index._index(task, keep_sorted=False)
+        index.due_keys.sort()
+        index.due_instants.sort()
+        return index
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def get(self, task_id):
+        return self.tasks.get(str(task_id))
+
+    def values(self):
+        return list(self.tasks.values())
+
+    def add(self, task):
+        """Insert or replace a task and update every index."""
+        task_id = task.id
+        old = self.tasks.get(task_id)
+        if old is not None:
+            self._unindex(old)
+        else:
+            self._seq[task_id] = next(self._counter)
+        self.tasks[task_id] = task
+        self._index(task)
+
+    def remove(self, task_id):
+        """Drop a task from the collection and every index. Unknown IDs are ignored."""
+        task = self.tasks.pop(task_id, None)
+        if task is None:
+            return
+        del self._seq[task_id]
+        self._unindex(task)
+
+    def _index(self, task, keep_sorted=True):
+        task_id = task.id
+        _add_to(self.by_project, task.project_id, task_id)
+        _add_to(self.by_section, task.section_id, task_id)
+        _add_to(self.by_parent, task.parent_id, task_id)
+        for name in task.labels:
+            _add_to(self.by_label, normalize_label(name), task_id)
+        if task.due_at is not None:
+            keys, key = self.due_instants, (task.due_at, task_id)
+        elif task.due_date:
+            keys, key = self.due_keys, (task.due_date, task_id)
+        else:
+            return
+        if keep_sorted:
+            bisect.insort(keys, key)
+        else:
+            keys.append(key)
+
+    def _unindex(self, task):
+        task_id = task.id
+        _remove_from(self.by_project, task.project_id, task_id)
+        _remove_from(self.by_section, task.section_id, task_id)
+        _remove_from(self.by_parent, task.parent_id, task_id)
+        for name in task.labels:
+            _remove_from(self.by_label, normalize_label(name), task_id)
+        if task.due_at is not None:
+            _sorted_remove(self.due_instants, (task.due_at, task_id))
+        elif task.due_date:
+            _sorted_remove(self.due_keys, (task.due_date, task_id))
+
+    def descendants(self, task_id):
+        """Every subtask below task_id, each listed after its parent and siblings in sync order."""
+        found, parents = [], [str(task_id)]
+        while parents:
+            children = set().union(*(self.by_parent.get(parent, ()) for parent in parents))
+            parents = sorted(children, key=self._seq.__getitem__)
+            found.extend(self.tasks[child] for child in parents)
+        return found
+
+    def ids_due_between(self, start=None, end=None, tz=timezone.utc):
+        """
+        Task IDs due on local days [start, end] in tz (YYYY-MM-DD strings, either may be None).
+        Two binary searches per index, so O(log n) plus the size of the result.
+        """
+        lo = bisect.bisect_left(self.due_keys, (start, "")) if start else 0
+        hi = bisect.bisect_right(self.due_keys, (end, _MAX_ID)) if end else len(self.due_keys)
+        ids = {task_id for _, task_id in self.due_keys[lo:hi]}
+
+        lo = bisect.bisect_left(self.due_instants, (_day_start(start, tz), "")) if start else 0
+        if end:
+            next_day = (date.fromisoformat(end) + timedelta(days=1)).isoformat()
+            hi = bisect.bisect_left(self.due_instants, (_day_start(next_day, tz), ""))
+        else:
+            hi = len(self.due_instants)
+        ids.update(task_id for _, task_id in self.due_instants[lo:hi])
+        return ids
+
+    def query(self, project_id=None, section_id=None, label=None, due_from=None, due_to=None, tz=timezone.utc):
+        """Return tasks matching every given filter, in the order they were synced."""
+        candidates = []
+        if project_id:
+            candidates.append(self.by_project.get(str(project_id), set()))
+        if section_id:
+            candidates.append(self.by_section.get(str(section_id), set()))
+        if label:
+            candidates.append(self.by_label.get(normalize_label(label), set()))
+        if due_from or due_to:
+            candidates.append(self.ids_due_between(due_from, due_to, tz))
+        if not candidates:
+            return self.values()
+
+        candidates.sort(key=len)
+        ids = candidates[0].intersection(*candidates[1:])
+        return [self.tasks[task_id] for task_id in sorted(ids, key=self._seq.__getitem__)]
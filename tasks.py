@@ -1,9 +1,18 @@
 from flask import Blueprint, request, jsonify
-from utils import get_headers
 from cache import cache_get, cache_set
-import requests
+from store import get_store, query_cache_tags, refresh_after_write, SyncError
+from streaming import list_response
+from conditional import conditional, etag_for
+from models import Task
+from due_dates import due_window, resolve_timezone
+import uuid
+import todoist_client
+import logging
+
+logger = logging.getLogger(__name__)
 
 tasks_bp = Blueprint('tasks', __name__)
+tasks_bp.after_request(refresh_after_write)
 
 def safe_json_response(response):
     """Safely handle empty or invalid JSON responses."""
@@ -16,12 +25,11 @@ def safe_json_response(response):
         return jsonify({"message": "No response content", "status_code": response.status_code}), response.status_code
 
 def get_label_ids(label_names):
-    resp = requests.get("https://api.todoist.com/rest/v2/labels", headers=get_headers())
-    if resp.status_code != 200:
+    """Resolve label names through the store's label map (no upstream call when all are known)."""
+    try:
+        return get_store().label_ids(label_names), None
+    except SyncError:
         return None, "Failed to fetch labels"
-    all_labels = resp.json()
-    name_to_id = {l["name"]: l["id"] for l in all_labels}
-    return [name_to_id[name] for name in label_names if name in name_to_id], None
 
 @tasks_bp.route("/create-task", methods=["POST"])
 def create_task():
@@ -58,10 +66,9 @@ def create_task():
     # Remove keys with None or empty string
     task_data = {k: v for k, v in task_data.items() if v is not None and v != ""}
 
-    response = requests.post(
-        "https://api.todoist.com/rest/v2/tasks",
+    response = todoist_client.post(
+        "/rest/v2/tasks",
         json=task_data,
-        headers=get_headers(),
     )
     return safe_json_response(response)
 
@@ -71,7 +78,7 @@ def complete_task():
     task_id = data.get("task_id")
     if not task_id:
         return jsonify({"error": "task_id required"}), 400
-    response = requests.post(f"https://api.todoist.com/rest/v2/tasks/{task_id}/close", headers=get_headers())
+    response = todoist_client.post(f"/rest/v2/tasks/{task_id}/close")
     return safe_json_response(response)
 
 @tasks_bp.route("/delete-task", methods=["POST"])
@@ -80,59 +87,66 @@ def delete_task():
     task_id = data.get("task_id")
     if not task_id:
         return jsonify({"error": "task_id required"}), 400
-    response = requests.delete(f"https://api.todoist.com/rest/v2/tasks/{task_id}", headers=get_headers())
+    response = todoist_client.delete(f"/rest/v2/tasks/{task_id}")
     return safe_json_response(response)
 
-from datetime import datetime
-
 @tasks_bp.route("/list-tasks", methods=["GET"])
 def list_tasks():
-    # Get section_id, label, due_date, and project_id from query parameters
+    # Get section_id, label, due filters, and project_id from query parameters
     section_id = request.args.get('section_id')   # e.g., ?section_id=196256877
     label = request.args.get('label')             # e.g., ?label=infoboard-element
-    due_date = request.args.get('due_date')       # e.g., ?due_date=today, ?due_date=2025-07-14
+    due_date = request.args.get('due_date')       # e.g., ?due_date=today, this_week, overdue, 2025-07-14
+    due_from = request.args.get('from')           # e.g., ?from=2025-07-14&to=2025-07-20
+    due_to = request.args.get('to')
     project_id = request.args.get('project_id')   # e.g., ?project_id=2356696331
 
-    # Set cache key based on filters
-    cache_key = f"tasks_{section_id}_{label}_{due_date}_{project_id}" if any([section_id, label, due_date, project_id]) else "tasks"
+    # Resolve the due window in the caller's timezone (?tz=Europe/Berlin) before touching the store
+    try:
+        tz = resolve_timezone(request.args.get('tz'))
+        due_from, due_to = due_window(due_date, due_from, due_to, tz)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    filters = {
+        "project_id": project_id,
+        "section_id": section_id,
+        "label": label,
+        "due_from": due_from,
+        "due_to": due_to,
+        "tz": tz,
+    }
+
+    # Set cache key based on the resolved filters, so "today" rolls over at local midnight
+    if any([section_id, label, due_from, due_to, project_id]):
+        cache_key = f"tasks_{section_id}_{label}_{due_from}_{due_to}_{tz.key}_{project_id}"
+    else:
+        cache_key = "tasks"
+
+    # The ETag names the mirror's state and the resolved window; an unchanged poll gets a 304
+    store = get_store()
+    try:
+        store.ensure_fresh()
+    except SyncError as e:
+        return jsonify({"error": "Failed to fetch tasks"}), e.status_code
+    # Workers' mirrors sit at different sync tokens, so shared cache entries are keyed on the
+    # state they were built from; a worker never serves (or tags) a list from another state
+    state = store.state_tag()
+    cache_key = f"{cache_key}@{state}"
+    return conditional(etag_for(state, cache_key), lambda: _list_tasks(store, cache_key, filters))
+
+def _list_tasks(store, cache_key, filters):
     cached = cache_get(cache_key)
     if cached:
-        return jsonify(cached)
+        return list_response(store.get_many(cached), Task.to_dict)
 
-    # Fetch tasks from Todoist
-    response = requests.get("https://api.todoist.com/rest/v2/tasks", headers=get_headers())
+    # Answer the filters from the store's indexes
     try:
-        data = response.json()
-    except Exception as e:
-        return jsonify({"error": "Failed to fetch tasks"}), response.status_code
-
-    # Filter by project_id if provided
-    if project_id:
-        data = [task for task in data if str(task.get("project_id")) == str(project_id)]
-
-    # Filter by section_id if provided
-    if section_id:
-        data = [task for task in data if str(task.get("section_id")) == str(section_id)]
-
-    # Filter by label if provided
-    if label:
-        data = [task for task in data if label.lower() in [lbl.lower() for lbl in task.get("labels", [])]]
-
-    # Filter by due date if provided
-    if due_date:
-        today = datetime.utcnow().date()
-        if due_date.lower() == "today":
-            data = [task for task in data if task.get("due", {}).get("date") == today.isoformat()]
-        else:
-            try:
-                due_date_parsed = datetime.strptime(due_date, "%Y-%m-%d").date()
-                data = [task for task in data if task.get("due", {}).get("date") == due_date_parsed.isoformat()]
-            except ValueError:
-                return jsonify({"error": "Invalid due_date format. Use 'YYYY-MM-DD'."}), 400
-
-    # Cache results for 60 seconds
-    cache_set(cache_key, data, ttl=60)
-    return jsonify(data), response.status_code
+        data = store.query(**filters)
+    except SyncError as e:
+        return jsonify({"error": "Failed to fetch tasks"}), e.status_code
+
+    # Cache the matching IDs for 60 seconds, tagged so task changes only drop the views they affect
+    cache_set(cache_key, [task.id for task in data], ttl=60, tags=query_cache_tags(**filters))
+    return list_response(data, Task.to_dict)
 
 @tasks_bp.route("/create-recurring-task", methods=["POST"])
 def create_recurring_task():
@@ -141,7 +155,7 @@ def create_recurring_task():
         "content": data.get("title"),
         "due_string": data.get("due_string"),
     }
-    response = requests.post("https://api.todoist.com/rest/v2/tasks", json=task_data, headers=get_headers())
+    response = todoist_client.post("/rest/v2/tasks", json=task_data)
     return safe_json_response(response)
 
 @tasks_bp.route("/move-task", methods=["POST"])
@@ -151,59 +165,63 @@ def move_task():
     if not task_id:
         return jsonify({"error": "task_id required"}), 400
 
-    update_data = {}
-    for field in ["project_id", "section_id", "parent_id"]:
-        if data.get(field) is not None:
-            update_data[field] = data[field]
-
-    if not update_data:
+    # item_move takes exactly one destination; a parent or section already implies the project
+    field = next((f for f in ("parent_id", "section_id", "project_id") if data.get(f) is not None), None)
+    if field is None:
         return jsonify({"error": "At least one of project_id, section_id, or parent_id must be provided"}), 400
 
-    # Attempt official move
-    move_resp = requests.post(
-        f"https://api.todoist.com/rest/v2/tasks/{task_id}/move",
-        json=update_data,
-        headers=get_headers()
-    )
+    # The source task comes from the store's mirror, so the move is one Sync round-trip.
+    # A task this worker's mirror hasn't seen yet (e.g. created through another worker)
+    # is moved anyway; Todoist itself answers 404 if it doesn't exist.
+    store = get_store()
+    try:
+        task = store.get_task(task_id)
+    except SyncError as e:
+        return jsonify({"error": "Failed to fetch tasks"}), e.status_code
 
-    if move_resp.status_code == 200:
-        return safe_json_response(move_resp)
-
-    elif move_resp.status_code == 404:
-        print("Move failed with 404 — attempting fallback (duplicate + delete)")
-
-        # Fallback: duplicate and delete
-        orig_resp = requests.get(f"https://api.todoist.com/rest/v2/tasks/{task_id}", headers=get_headers())
-        if orig_resp.status_code != 200:
-            return jsonify({"error": "Original task not found for duplication fallback"}), 404
-
-        orig_task = orig_resp.json()
-        print(f"Original task: {orig_task}")
-
-        due = orig_task.get("due") or {}
-
-        new_task = {
-            "content": orig_task.get("content"),
-            "priority": orig_task.get("priority"),
-            "due_string": due.get("string"),
-            "project_id": update_data.get("project_id", orig_task.get("project_id")),
-            "section_id": update_data.get("section_id", orig_task.get("section_id"))
-        }
-        new_task = {k: v for k, v in new_task.items() if v}
-        print(f"New task payload: {new_task}")
-
-        create_resp = requests.post("https://api.todoist.com/rest/v2/tasks", json=new_task, headers=get_headers())
-        if create_resp.status_code == 200:
-            delete_resp = requests.delete(f"https://api.todoist.com/rest/v2/tasks/{task_id}", headers=get_headers())
-            return jsonify({
-                "message": "Fallback move completed via duplicate + delete",
-                "new_task": create_resp.json()
-            }), 200
-        else:
-            return jsonify({"error": "Fallback duplication failed", "details": create_resp.text}), create_resp.status_code
+    cmd = todoist_client.command("item_move", {"id": str(task_id), field: data[field]})
+    sync_status, _ = todoist_client.sync_commands([cmd])
+    status = sync_status.get(cmd["uuid"])
+    if status != "ok":
+        return jsonify({"error": "Failed to move task", "details": status}), todoist_client.command_result(status)
 
-    else:
-        return safe_json_response(move_resp)
+    if task is None:
+        try:
+            store.sync()
+            task = store.get_task(task_id)
+        except SyncError:
+            logger.exception("Sync after moving an unmirrored task failed")
+    moved = task.to_dict() if task is not None else {"id": str(task_id)}
+    moved.update(_destination(store, field, str(data[field])))
+    return jsonify(moved), 200
+
+def _destination(store, field, target_id):
+    """project_id/section_id/parent_id of a task after item_move to `field` = target_id."""
+    if field == "parent_id":
+        parent = store.get_task(target_id)
+        return {"parent_id": target_id, "project_id": parent.project_id if parent else None,
+                "section_id": parent.section_id if parent else None}
+    if field == "section_id":
+        section = next((s for s in store.get_sections() if str(s["id"]) == target_id), None)
+        return {"parent_id": None, "section_id": target_id, "project_id": section["project_id"] if section else None}
+    return {"parent_id": None, "section_id": None, "project_id": target_id}
+
+def _copy_args(task, temp_ids):
+    """item_add args copying a task; parents that are being copied too are referred to by temp_id."""
+    args = {
+        "content": task.content,
+        "description": task.description,
+        "project_id": task.project_id,
+        "section_id": task.section_id,
+        "parent_id": temp_ids.get(task.parent_id, task.parent_id),
+        "child_order": task.order,
+        "priority": task.priority,
+        "labels": list(task.labels),
+        "due": task.sync_due(),
+        "duration": task.duration,
+        "responsible_uid": task.assignee_id,
+    }
+    return {k: v for k, v in args.items() if v not in (None, "", [])}
 
 @tasks_bp.route("/duplicate-task", methods=["POST"])
 def duplicate_task():
@@ -212,11 +230,37 @@ def duplicate_task():
     if not task_id:
         return jsonify({"error": "task_id required"}), 400
 
-    orig_task_resp = requests.get(f"https://api.todoist.com/rest/v2/tasks/{task_id}", headers=get_headers())
-    if orig_task_resp.status_code != 200:
+    # Read the task and its subtask tree from the mirror, then create every copy in one Sync batch
+    store = get_store()
+    try:
+        tree = store.get_subtree(task_id)
+        if not tree:
+            # This worker's mirror may predate the task; pull a delta and look again
+            store.sync()
+            tree = store.get_subtree(task_id)
+    except SyncError as e:
+        return jsonify({"error": "Failed to fetch tasks"}), e.status_code
+    if not tree:
         return jsonify({"error": "Original task not found"}), 404
-    orig_task = orig_task_resp.json()
-    new_task = {k: orig_task.get(k) for k in ["content", "priority", "due_string", "project_id", "section_id"] if orig_task.get(k)}
-    new_task["content"] = f"Copy of: {orig_task['content']}"
-    resp = requests.post("https://api.todoist.com/rest/v2/tasks", json=new_task, headers=get_headers())
-    return safe_json_response(resp)
+    if data.get("include_subtasks") is False:
+        tree = tree[:1]
+
+    temp_ids = {task.id: str(uuid.uuid4()) for task in tree}
+    commands = [todoist_client.command("item_add", _copy_args(task, temp_ids), temp_id=temp_ids[task.id])
+                for task in tree]
+    commands[0]["args"]["content"] = f"Copy of: {tree[0].content}"
+    sync_status, temp_id_mapping = todoist_client.sync_commands(commands)
+
+    root = commands[0]
+    if sync_status.get(root["uuid"]) != "ok":
+        status = sync_status.get(root["uuid"])
+        return jsonify({"error": "Failed to duplicate task", "details": status}), todoist_client.command_result(status)
+
+    copy = Task.from_sync_item({**root["args"], "id": temp_id_mapping.get(root["temp_id"])}).to_dict()
+    copy["subtask_ids"] = [temp_id_mapping.get(cmd["temp_id"]) for cmd in commands[1:]
+                           if sync_status.get(cmd["uuid"]) == "ok"]
+    failed = [{"task_id": task.id, "sync_status": sync_status.get(cmd["uuid"])}
+              for task, cmd in zip(tree[1:], commands[1:]) if sync_status.get(cmd["uuid"]) != "ok"]
+    if failed:
+        copy["failed_subtasks"] = failed
+    return jsonify(copy), 200 if not failed else 207
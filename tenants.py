@@ -0,0 +1,200 @@
+import os
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from threading import Lock
+from flask import g, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+# Tenant ID -> Todoist API token, as a JSON object inline or in a file; callers pick one with X-Tenant-ID
+TENANTS = os.getenv("TENANTS", "")
+TENANTS_FILE = os.getenv("TENANTS_FILE", "")
+# Accept a caller's own Todoist token in "Authorization: Bearer <token>"
+ALLOW_BEARER_TOKENS = os.getenv("ALLOW_BEARER_TOKENS", "true").lower() in ("1", "true", "yes")
+# Tenants whose mirror, sessions and clients stay loaded per worker; the least recently used are dropped
+TENANT_MAX_RESIDENT = int(os.getenv("TENANT_MAX_RESIDENT", "50"))
+
+class NoTenant(Exception):
+    """Raised when a request carries no usable token and there is no default account."""
+
+def tenant_key(api_token):
+    """Stable, non-secret name for an account: namespaces its cache, snapshot and jobs."""
+    return hashlib.sha256(api_token.encode()).hexdigest()[:16]
+
+class Tenant:
+    """
+    One Todoist account served by this worker. Holds its per-account objects (task
+    store, pooled session, SDK client) so they are built once and dropped together.
+    """
+    def __init__(self, api_token):
+        self.token = api_token
+        self.key = tenant_key(api_token)
+        self._resources = {}
+        self._lock = Lock()
+
+    def resource(self, name, factory):
+        """Return this tenant's `name` object, building it with factory() on first use."""
+        obj = self._resources.get(name)
+        if obj is None:
+            with self._lock:
+                obj = self._resources.get(name)
+                if obj is None:
+                    obj = self._resources[name] = factory()
+        return obj
+
+    def close(self):
+        with self._lock:
+            resources, self._resources = self._resources, {}
+        for obj in resources.values():
+            if hasattr(obj, "close"):
+                obj.close()
+
+@lru_cache(maxsize=1)
+def configured_tenants():
+    """Tenant ID -> token from TENANTS / TENANTS_FILE (read once per process)."""
+    tenants = {}
+    if TENANTS_FILE:
+        with open(TENANTS_FILE) as f:
+            tenants.update(json.load(f))
+    if TENANTS:
+        tenants.update(json.loads(TENANTS))
+    return {str(tenant_id): token for tenant_id, token in tenants.items() if token}
+
+@lru_cache(maxsize=1)
+def default_token():
+    """TODOIST_API_KEY, used when a request names no tenant (single-account deployments)."""
+    return os.getenv("TODOIST_API_KEY") or None
+
+_current = ContextVar("tenant", default=None)
+_resident = OrderedDict()   # tenant key -> Tenant, least recently used first
+_users = {}                 # Todoist user ID -> resident tenant key
+_resident_pid = None
+_lock = Lock()
+
+def get_tenant(api_token):
+    """The resident Tenant for this token, loading it (and dropping the least recently used) if needed."""
+    global _resident_pid
+    key = tenant_key(api_token)
+    with _lock:
+        if _resident_pid != os.getpid():
+            # Sessions and locks must not cross a fork
+            _resident.clear()
+            _users.clear()
+            _resident_pid = os.getpid()
+        tenant = _resident.get(key)
+        if tenant is not None:
+            _resident.move_to_end(key)
+            return tenant
+        tenant = _resident[key] = Tenant(api_token)
+        evicted = []
+        while len(_resident) > TENANT_MAX_RESIDENT:
+            evicted.append(_resident.popitem(last=False)[1])
+        if evicted:
+            # Nothing outlives a tenant's eviction: no token, user mapping or rate-limit bucket
+            gone = {old.key for old in evicted}
+            for user_id in [u for u, k in _users.items() if k in gone]:
+                del _users[user_id]
+    for old in evicted:
+        logger.info(f"Unloading tenant {old.key}")
+        old.close()
+    return tenant
+
+def by_key(key):
+    """
+    The Tenant for a tenant key, if it is resident or configured (TENANTS, TODOIST_API_KEY);
+    else None. A missing key means the default account.
+    """
+    if not key:
+        return get_tenant(default_token()) if default_token() else None
+    with _lock:
+        tenant = _resident.get(key) if _resident_pid == os.getpid() else None
+    token = tenant.token if tenant is not None else next(
+        (t for t in [default_token(), *configured_tenants().values()] if t and tenant_key(t) == key), None)
+    return get_tenant(token) if token else None
+
+def register_user(user_id, tenant):
+    """Remember which tenant a Todoist user ID belongs to (for webhook deliveries)."""
+    if user_id:
+        with _lock:
+            if _resident.get(tenant.key) is tenant:
+                _users[str(user_id)] = tenant.key
+
+def for_user(user_id):
+    """
+    The resident Tenant a webhook for this Todoist user should patch, or None.
+    Only deliveries without a user ID go to the default account; a user ID that no
+    loaded account has reported (the default one included) may belong to anyone.
+    """
+    if user_id:
+        with _lock:
+            key = _users.get(str(user_id))
+            return _resident.get(key) if key is not None else None
+    return get_tenant(default_token()) if default_token() else None
+
+def resolve():
+    """
+    Pick the tenant for the current request: X-Tenant-ID from TENANTS, else the
+    caller's own Bearer token, else TODOIST_API_KEY. Raises NoTenant if none applies.
+    """
+    tenant_id = request.headers.get("X-Tenant-ID")
+    if tenant_id:
+        token = configured_tenants().get(tenant_id)
+        if token is None:
+            raise NoTenant(f"Unknown tenant: {tenant_id}")
+        return get_tenant(token)
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if ALLOW_BEARER_TOKENS and scheme.lower() == "bearer" and token.strip():
+        return get_tenant(token.strip())
+    if default_token():
+        return get_tenant(default_token())
+    raise NoTenant("No Todoist account: send Authorization: Bearer <token> or X-Tenant-ID, or set TODOIST_API_KEY")
+
+def current():
+    """The tenant this request (or job) acts for; raises NoTenant if there is none."""
+    tenant = _current.get()
+    if tenant is not None:
+        return tenant
+    if has_request_context():
+        return resolve()
+    if default_token():
+        return get_tenant(default_token())
+    raise NoTenant("No tenant selected and TODOIST_API_KEY is not set")
+
+def current_key():
+    """Namespace for the current tenant, or "-" when there is no account at all."""
+    try:
+        return current().key
+    except NoTenant:
+        return "-"
+
+@contextmanager
+def use(tenant):
+    """Act for `tenant` inside this block (background jobs, webhook deliveries)."""
+    token = _current.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current.reset(token)
+
+def _select():
+    # A bad or missing token is reported by current() when a route actually needs one,
+    # so "/" and /metrics keep working without credentials
+    try:
+        g.tenant_reset = _current.set(resolve())
+    except NoTenant:
+        pass
+
+def _reset(exc=None):
+    token = g.pop("tenant_reset", None)
+    if token is not None:
+        _current.reset(token)
+
+def init_tenants(app):
+    """Select the tenant at the start of each request and forget it afterwards."""
+    app.before_request(_select)
+    app.teardown_request(_reset)
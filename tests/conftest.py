@@ -0,0 +1,63 @@
+import os
+import sys
+import uuid
+import tempfile
+import pytest
+
+# The app's modules sit at the repository root and read their settings when imported
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "bench")]
+_scratch = tempfile.mkdtemp(prefix="flexbot-tests-")
+os.environ.update({
+    "SNAPSHOT_PATH": "off",
+    "METRICS_PATH": "off",
+    "JOBS_PATH": os.path.join(_scratch, "jobs.db"),
+    "ARCHIVE_PATH": os.path.join(_scratch, "archive.db"),
+})
+os.environ.pop("TODOIST_API_KEY", None)
+
+from flask import Flask
+import fake_todoist
+import tenants
+import todoist_client
+
+class FakeResponse:
+    """Just enough of requests.Response for the code that reads Todoist replies."""
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+        self.text = ""
+
+    def json(self):
+        return self.data
+
+@pytest.fixture
+def tenant():
+    """Act for a throwaway account, as a request or job would."""
+    with tenants.use(tenants.get_tenant(f"test-{uuid.uuid4().hex}")) as current:
+        yield current
+
+@pytest.fixture
+def todoist(monkeypatch):
+    """
+    A fresh stand-in Todoist (bench/fake_todoist.py) behind todoist_client, and a fresh
+    default account token for it. Yields the handler class: .account, .stats.
+    """
+    server, url = fake_todoist.start(tasks=20, completed=0)
+    monkeypatch.setattr(todoist_client, "API_URL", url)
+    token = f"test-{uuid.uuid4().hex}"
+    monkeypatch.setattr(tenants, "default_token", lambda: token)
+    yield server.RequestHandlerClass
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def make_client():
+    """Test client for an app with tenant selection and the given blueprints (app.py needs python-dotenv)."""
+    def make(*blueprints):
+        app = Flask(__name__)
+        tenants.init_tenants(app)
+        for blueprint in blueprints:
+            app.register_blueprint(blueprint)
+        return app.test_client()
+    return make
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+import archive
+import todoist_client
+from archive import Archive
+from conftest import FakeResponse
+
+def completed(todoist, *specs):
+    """Set the stand-in's completed items: (project_id, labels, hours ago) each; the hours name the item."""
+    now = datetime.now(timezone.utc)
+    items = [{"id": f"{hours}", "task_id": f"t{hours}", "content": f"Done {n}", "project_id": project_id, "labels": labels,
+              "completed_at": (now - timedelta(hours=hours)).strftime("%Y-%m-%dT%H:%M:%S.000000Z")}
+             for n, (project_id, labels, hours) in enumerate(specs)]
+    todoist.account.completed = sorted(items, key=lambda c: c["completed_at"], reverse=True)
+    return todoist.account.completed
+
+@pytest.fixture
+def offsets(monkeypatch):
+    """Offsets of the completed/get_all pages requested; set .fail to fail that call (1-based)."""
+    calls = []
+    get = todoist_client.get
+    def recording_get(path, **kwargs):
+        calls.append(kwargs["params"]["offset"])
+        if len(calls) == getattr(offsets, "fail", None):
+            return FakeResponse(None, status_code=503)
+        return get(path, **kwargs)
+    monkeypatch.setattr(todoist_client, "get", recording_get)
+    offsets.calls = calls
+    return offsets
+
+@pytest.fixture
+def store(todoist, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_PAGE_SIZE", 2)
+    return Archive(str(tmp_path / "archive.db"), "tenant-a")
+
+def days(items):
+    return [item["completed_at"][:10] for item in items]
+
+def test_completed_items_are_counted_into_daily_buckets(store, todoist):
+    items = completed(todoist, ("p1", ["a"], 1), ("p1", ["a", "b"], 2), ("p2", [], 30), ("p2", ["b"], 50))
+    assert store.refresh(force=True) == 4
+    since, until = min(days(items)), max(days(items))
+    summary = store.summary(since, until)
+    assert summary["total"] == 4
+    assert summary["by_project"] == {"p1": 2, "p2": 2}
+    assert summary["by_label"] == {"a": 2, "b": 2}
+    assert sum(summary["by_day"].values()) == 4
+    assert [item["id"] for item in store.items(since, until)] == [item["id"] for item in items]
+
+def test_a_refresh_pulls_only_items_completed_since_the_last_one(store, todoist, offsets):
+    completed(todoist, ("p1", [], 5), ("p1", [], 6), ("p1", [], 7))
+    store.refresh(force=True)
+    assert store.refresh() == 0  # within ARCHIVE_REFRESH_INTERVAL
+    completed(todoist, ("p1", [], 0), ("p1", [], 5), ("p1", [], 6), ("p1", [], 7))
+    before = len(offsets.calls)
+    assert store.refresh(force=True) == 1
+    # since= is inclusive: the new item and the newest archived one fill a page, then an empty one
+    assert offsets.calls[before:] == [0, 2]
+
+def test_a_failed_backfill_resumes_after_the_last_stored_page(store, todoist, offsets):
+    items = completed(todoist, *[("p1", ["a"], hours) for hours in range(1, 6)])
+    offsets.fail = 2
+    assert store.refresh(force=True) == 0  # the first page was kept; the archive keeps serving it
+    since, until = min(days(items)), max(days(items))
+    assert store.summary(since, until)["total"] == 2
+    assert store.refresh() == 0  # waits out the interval after a failure
+    offsets.fail = None
+    assert store.refresh(force=True) == 3
+    assert offsets.calls == [0, 2, 2, 4]
+    summary = store.summary(since, until)
+    assert summary["total"] == 5 and summary["by_label"] == {"a": 5}
+
+def test_an_empty_archive_reports_the_failure(store, todoist, offsets):
+    completed(todoist, ("p1", [], 1))
+    offsets.fail = 1
+    with pytest.raises(archive.ArchiveError):
+        store.refresh(force=True)
@@ -0,0 +1,48 @@
+import pytest
+from batch import batch_bp
+
+@pytest.fixture
+def client(todoist, make_client):
+    return make_client(batch_bp)
+
+def test_batch_runs_valid_operations_and_reports_each_one(client, todoist):
+    first, second = list(todoist.account.items)[:2]
+    resp = client.post("/batch", json={"operations": [
+        {"op": "create", "args": {"title": "new", "project_id": todoist.account.items[first]["project_id"]}},
+        {"op": "close", "task_id": first},
+        {"op": "move", "task_id": second, "args": {"section_id": "s1", "project_id": "p1"}},
+        {"op": "bogus"},
+        {"op": "close"},
+        {"op": "delete", "task_id": "missing"},
+        "not an object",
+    ]})
+    assert resp.status_code == 207
+    body = resp.get_json()
+    results = body["results"]
+    assert [r["status"] for r in results] == [200, 200, 400, 400, 400, 404, 400]
+    assert results[0]["task_id"] in todoist.account.items
+    assert results[2]["error"].startswith("move needs exactly one")
+    assert results[3]["error"] == "Unknown op: bogus"
+    assert results[4]["error"] == "task_id required"
+    assert (body["succeeded"], body["failed"]) == (2, 5)
+    assert todoist.account.items[first]["checked"]
+
+def test_batch_sends_the_valid_operations_in_one_sync_request(client, todoist):
+    task_ids = list(todoist.account.items)[:5]
+    resp = client.post("/batch", json={"operations": [{"op": "close", "task_id": t} for t in task_ids]})
+    assert resp.status_code == 200
+    assert todoist.stats == {"POST /sync/v9/sync": 1}
+
+def test_batch_parallel_mode_sends_one_request_per_operation(client, todoist):
+    task_ids = list(todoist.account.items)[:3]
+    resp = client.post("/batch", json={"mode": "parallel", "concurrency": 2,
+                                       "operations": [{"op": "assign_labels", "task_id": t, "args": {"labels": ["x"]}}
+                                                      for t in task_ids]})
+    assert resp.status_code == 200 and resp.get_json()["succeeded"] == 3
+    assert todoist.stats == {"POST /sync/v9/sync": 3}
+    assert all(todoist.account.items[t]["labels"] == ["x"] for t in task_ids)
+
+@pytest.mark.parametrize("body", [[1, 2], {"operations": []}, {"operations": [{"op": "close", "task_id": "1"}], "mode": "x"},
+                                  {"operations": [{"op": "close", "task_id": "1"}], "concurrency": 0}])
+def test_batch_rejects_malformed_requests(client, body):
+    assert client.post("/batch", json=body).status_code == 400
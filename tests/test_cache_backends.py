@@ -0,0 +1,81 @@
+import time
+import pytest
+from cache_backends import MemoryBackend, SQLiteBackend
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_backend(request, tmp_path):
+    """Build a backend of each kind with the given bounds (sweeper effectively off)."""
+    def make(max_entries=100, max_bytes=10 ** 6, namespace_max_bytes=None):
+        if request.param == "memory":
+            return MemoryBackend(max_entries, max_bytes, 3600, namespace_max_bytes)
+        return SQLiteBackend(str(tmp_path / "cache.db"), max_entries, max_bytes, 3600, namespace_max_bytes)
+    return make
+
+def test_get_returns_what_was_set_until_it_expires(make_backend):
+    backend = make_backend()
+    backend.set("a:k", {"v": 1}, 60, ())
+    backend.set("a:short", [1], 0.05, ())
+    assert backend.get("a:k") == {"v": 1}
+    assert backend.get("a:missing") is None
+    time.sleep(0.1)
+    assert backend.get("a:short") is None
+    assert backend.stats()["entries"] == 1
+
+def test_invalidate_drops_entries_carrying_any_tag(make_backend):
+    backend = make_backend()
+    backend.set("a:one", 1, 60, ("a:project:p1", "a:*"))
+    backend.set("a:two", 2, 60, ("a:project:p2", "a:label:x", "a:*"))
+    backend.set("a:three", 3, 60, ("a:project:p3", "a:*"))
+    backend.set("b:one", 1, 60, ("b:project:p1", "b:*"))
+    assert backend.invalidate(("a:project:p1", "a:label:x")) == 2
+    assert backend.get("a:one") is None and backend.get("a:two") is None
+    assert backend.get("a:three") == 3 and backend.get("b:one") == 1
+    assert backend.invalidate(("a:project:p1",)) == 0
+    assert backend.invalidate(("a:*",)) == 1
+    assert backend.get("b:one") == 1
+
+def test_overwriting_an_entry_replaces_its_tags(make_backend):
+    backend = make_backend()
+    backend.set("a:k", 1, 60, ("a:old",))
+    backend.set("a:k", 2, 60, ("a:new",))
+    assert backend.invalidate(("a:old",)) == 0
+    assert backend.get("a:k") == 2
+    assert backend.invalidate(("a:new",)) == 1
+
+def test_entry_bound_evicts_least_recently_used_first(make_backend):
+    backend = make_backend(max_entries=3)
+    for n in range(3):
+        backend.set(f"a:{n}", n, 60, ())
+        time.sleep(0.01)  # distinct access times for the SQLite backend's LRU order
+    backend.set("a:3", 3, 60, ())
+    assert backend.get("a:0") is None
+    assert [backend.get(f"a:{n}") for n in (1, 2, 3)] == [1, 2, 3]
+    assert backend.stats()["entries"] == 3
+
+def test_byte_bound_and_oversized_values(make_backend):
+    backend = make_backend(max_bytes=100)
+    backend.set("a:big", "x" * 200, 60, ())
+    assert backend.get("a:big") is None
+    for n in range(4):
+        backend.set(f"a:{n}", "x" * 30, 60, ())
+        time.sleep(0.01)
+    assert backend.stats()["bytes"] <= 100
+    assert backend.get("a:0") is None and backend.get("a:3") == "x" * 30
+
+def test_namespace_quota_evicts_only_that_namespaces_entries(make_backend):
+    backend = make_backend(max_bytes=1000, namespace_max_bytes=100)
+    backend.set("b:keep", "y" * 30, 60, ())
+    for n in range(4):
+        backend.set(f"a:{n}", "x" * 30, 60, ())
+        time.sleep(0.01)
+    assert backend.get("b:keep") == "y" * 30
+    assert backend.get("a:0") is None
+    assert [backend.get(f"a:{n}") for n in (1, 2, 3)] == ["x" * 30] * 3
+
+def test_clear_empties_the_backend(make_backend):
+    backend = make_backend()
+    backend.set("a:k", 1, 60, ("a:t",))
+    backend.clear()
+    assert backend.get("a:k") is None
+    assert backend.invalidate(("a:t",)) == 0
+    assert backend.stats()["entries"] == 0
@@ -0,0 +1,60 @@
+import gzip
+import json
+import pytest
+import compression
+import tenants
+from projects import projects_bp
+from store import get_store
+from tasks import tasks_bp
+
+@pytest.fixture
+def client(todoist, make_client):
+    client = make_client(tasks_bp, projects_bp)
+    compression.init_compression(client.application)
+    return client
+
+def close(todoist, task_id):
+    todoist.account.sync_commands([{"type": "item_close", "uuid": task_id, "args": {"id": task_id}}])
+
+@pytest.mark.parametrize("path", ["/list-tasks", "/list-projects"])
+def test_an_unchanged_poll_gets_a_304_without_a_body(client, todoist, path):
+    first = client.get(path)
+    assert first.status_code == 200 and first.headers["ETag"].startswith('W/"')
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    again = client.get(path, headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304 and again.data == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+def test_the_etag_changes_with_the_mirror_and_the_query(client, todoist):
+    etag = client.get("/list-tasks").headers["ETag"]
+    assert client.get("/list-tasks", query_string={"limit": 5}).headers["ETag"] != etag
+    close(todoist, next(iter(todoist.account.items)))
+    with tenants.use(tenants.get_tenant(tenants.default_token())):
+        get_store().mark_stale()  # as a write or a webhook would
+    changed = client.get("/list-tasks", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+
+def test_each_account_gets_its_own_etag(client):
+    mine = client.get("/list-tasks").headers["ETag"]
+    theirs = client.get("/list-tasks", headers={"Authorization": "Bearer someone-else"}).headers["ETag"]
+    assert mine != theirs
+
+def test_large_responses_are_gzipped_and_small_ones_are_not(client):
+    plain = client.get("/list-tasks").get_json()
+    resp = client.get("/list-tasks", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip" and "Accept-Encoding" in resp.headers["Vary"]
+    assert json.loads(gzip.decompress(resp.data)) == plain
+    small = client.get("/list-tasks", query_string={"limit": 1}, headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+
+def test_streamed_responses_are_compressed_as_they_are_sent(client):
+    plain = client.get("/list-tasks").get_json()
+    resp = client.get("/list-tasks", query_string={"format": "ndjson"}, headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert [json.loads(line) for line in gzip.decompress(resp.data).splitlines()] == plain
+
+def test_brotli_is_preferred_when_installed(client):
+    brotli = pytest.importorskip("brotli")
+    resp = client.get("/list-tasks", headers={"Accept-Encoding": "gzip, br"})
+    assert resp.headers["Content-Encoding"] == "br"
+    assert json.loads(brotli.decompress(resp.data)) == client.get("/list-tasks").get_json()
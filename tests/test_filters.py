@@ -0,0 +1,29 @@
+import math
+import pytest
+import todoist_client
+from filters import filters_bp
+
+@pytest.fixture
+def client(todoist, make_client):
+    return make_client(filters_bp)
+
+def labelled(todoist, label):
+    return [i for i, item in todoist.account.items.items() if label in item["labels"]]
+
+def test_reschedule_by_label_sends_chunked_sync_batches(client, todoist, monkeypatch):
+    monkeypatch.setattr(todoist_client, "SYNC_COMMAND_LIMIT", 2)
+    label = max({l for item in todoist.account.items.values() for l in item["labels"]},
+                key=lambda name: len(labelled(todoist, name)))
+    task_ids = labelled(todoist, label)
+    assert len(task_ids) > 2
+    resp = client.post("/reschedule-by-label", json={"label": label, "due_string": "tomorrow"})
+    assert resp.status_code == 200
+    results = resp.get_json()
+    assert sorted(r["task_id"] for r in results) == sorted(task_ids)
+    assert {r["status"] for r in results} == {200}
+    # One sync to load the mirror, then one per chunk
+    assert todoist.stats["POST /sync/v9/sync"] == 1 + math.ceil(len(task_ids) / 2)
+    assert all(todoist.account.items[t]["due"] for t in task_ids)
+
+def test_reschedule_by_label_needs_a_label_and_a_due_string(client):
+    assert client.post("/reschedule-by-label", json={"label": "x"}).status_code == 400
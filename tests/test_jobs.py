@@ -0,0 +1,77 @@
+import json
+import time
+import uuid
+import pytest
+import jobs
+import ratelimit
+import tenants
+from sqlite_db import transaction
+
+seen = []   # (tenant key, lane, payloads) per handler call
+
+def record(payloads):
+    seen.append((tenants.current().key, ratelimit.current_lane(), payloads))
+    return [payload * 10 for payload in payloads]
+
+jobs.register("test-record", record)
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_CHUNK_SIZE", 2)
+    seen.clear()
+
+def finished(job_id):
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        job = jobs.get_job(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_a_job_runs_in_chunks_for_its_tenant_in_the_bulk_lane(tenant):
+    job_id = jobs.submit("test-record", [1, 2, 3, 4, 5])
+    job = finished(job_id)
+    assert (job["status"], job["total"], job["completed"]) == ("done", 5, 5)
+    assert job["results"] == [10, 20, 30, 40, 50]
+    assert [payloads for _, _, payloads in seen] == [[1, 2], [3, 4], [5]]
+    assert {(key, lane) for key, lane, _ in seen} == {(tenant.key, ratelimit.BULK)}
+    assert "results" not in jobs.get_job(job_id, with_results=False)
+
+def test_jobs_are_visible_to_their_tenant_only(tenant):
+    job_id = jobs.submit("test-record", [1])
+    finished(job_id)
+    with tenants.use(tenants.get_tenant(f"test-{uuid.uuid4().hex}")):
+        assert jobs.get_job(job_id) is None
+
+def orphan(tenant, owner, lease_until, payloads, done):
+    """A job left running by another worker, with its first `done` items finished."""
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with jobs._db.connect() as conn, transaction(conn):
+        conn.execute("INSERT INTO jobs (id, kind, status, total, completed, owner, lease_until, created_at, updated_at, tenant) "
+                     "VALUES (?, 'test-record', 'running', ?, ?, ?, ?, ?, ?, ?)",
+                     (job_id, len(payloads), done, owner, lease_until, now, now, tenant.key))
+        conn.executemany("INSERT INTO job_items (job_id, seq, payload, result) VALUES (?, ?, ?, ?)",
+                         [(job_id, seq, json.dumps(p), json.dumps(p * 10) if seq < done else None)
+                          for seq, p in enumerate(payloads)])
+    return job_id
+
+def test_a_job_whose_lease_ran_out_resumes_after_its_last_saved_chunk(tenant):
+    jobs._ensure_started()
+    job_id = orphan(tenant, "gone:1:x", time.time() - 1, [1, 2, 3, 4, 5], done=2)
+    jobs._claim(job_id, tenant)
+    job = finished(job_id)
+    assert (job["status"], job["completed"], job["results"]) == ("done", 5, [10, 20, 30, 40, 50])
+    assert [payloads for _, _, payloads in seen] == [[3, 4], [5]]
+
+def test_a_job_under_a_live_lease_is_left_to_its_owner(tenant):
+    jobs._ensure_started()
+    job_id = orphan(tenant, "busy:1:x", time.time() + 60, [1, 2], done=0)
+    jobs._claim(job_id, tenant)
+    time.sleep(0.1)
+    assert jobs.get_job(job_id)["status"] == "running" and seen == []
+
+def test_unknown_job_kinds_are_refused(tenant):
+    with pytest.raises(ValueError):
+        jobs.submit("no-such-kind", [1])
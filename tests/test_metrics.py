@@ -0,0 +1,76 @@
+import json
+import sqlite3
+import subprocess
+import sys
+import pytest
+import metrics
+from sqlite_db import Database
+
+THROTTLED = metrics.UPSTREAM_THROTTLED.name
+
+@pytest.fixture
+def shared(tmp_path, monkeypatch):
+    """A shared metrics file for this test, with nothing folded yet."""
+    path = str(tmp_path / "metrics.db")
+    monkeypatch.setattr(metrics, "_db", Database(path, metrics.SCHEMA, migrate=metrics._migrate))
+    monkeypatch.setattr(metrics, "_folded_at", 0.0)
+    return path
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def add_rows(worker, pid, rows):
+    with metrics._db.connect() as conn:
+        conn.executemany("INSERT INTO samples (worker, metric, labels, value, pid) VALUES (?, ?, ?, ?, ?)",
+                         [(worker, metric, json.dumps(labels), json.dumps(value), pid) for metric, labels, value in rows])
+
+def throttled():
+    return metrics._aggregate().get(THROTTLED, {}).get(("bulk",), 0)
+
+def workers():
+    with metrics._db.connect() as conn:
+        return {worker for (worker,) in conn.execute("SELECT DISTINCT worker FROM samples")}
+
+def test_every_workers_counts_are_summed(shared):
+    metrics.publish()
+    before = throttled()
+    add_rows("other", None, [(THROTTLED, ["bulk"], 3)])
+    metrics.UPSTREAM_THROTTLED.inc(lane="bulk")
+    metrics.publish()
+    assert throttled() == before + 4
+    assert f"{THROTTLED}{{lane=\"bulk\"}} {before + 4}" in metrics.render()
+
+def test_exited_workers_are_folded_into_one_row(shared, monkeypatch):
+    metrics.publish()
+    before = throttled()
+    pid = exited_pid()
+    add_rows("gone-1", pid, [(THROTTLED, ["bulk"], 2), ("cache", ["entries"], 50)])
+    add_rows("gone-2", pid, [(THROTTLED, ["bulk"], 5)])
+    add_rows("live", 1, [(THROTTLED, ["bulk"], 7)])
+    metrics.publish()
+    assert workers() == {metrics._worker_id()} | {"gone-1", "gone-2", "live"}  # not due yet
+    monkeypatch.setattr(metrics, "_folded_at", 0.0)
+    metrics.publish()
+    assert workers() == {metrics._worker_id(), "live", metrics.EXITED}
+    assert throttled() == before + 14
+    with metrics._db.connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM samples WHERE worker = ? AND metric = 'cache'",
+                            (metrics.EXITED,)).fetchone() == (0,)
+    add_rows("gone-3", pid, [(THROTTLED, ["bulk"], 1)])
+    monkeypatch.setattr(metrics, "_folded_at", 0.0)
+    metrics.publish()
+    assert workers() == {metrics._worker_id(), "live", metrics.EXITED}
+    assert throttled() == before + 15
+
+def test_files_from_before_pids_were_recorded_are_upgraded(shared):
+    conn = sqlite3.connect(shared)
+    conn.executescript("CREATE TABLE samples (worker TEXT NOT NULL, metric TEXT NOT NULL, "
+                       "labels TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (worker, metric, labels));")
+    conn.execute("INSERT INTO samples VALUES ('old', ?, '[\"bulk\"]', '9')", (THROTTLED,))
+    conn.commit()
+    conn.close()
+    metrics.publish()
+    assert workers() == {metrics._worker_id(), metrics.EXITED}
+    assert throttled() >= 9
@@ -0,0 +1,60 @@
+import time
+from email.utils import formatdate
+import pytest
+import ratelimit
+import todoist_client
+from conftest import FakeResponse
+from ratelimit import BULK, INTERACTIVE, RateLimited, TokenBucket
+
+def test_bulk_callers_leave_the_reserve_to_interactive_ones():
+    bucket = TokenBucket(rate=0.001, capacity=5, reserve=2)
+    for _ in range(3):
+        bucket.acquire(BULK, max_wait=0)
+    with pytest.raises(RateLimited):
+        bucket.acquire(BULK, max_wait=0)
+    bucket.acquire(INTERACTIVE, max_wait=0)
+    bucket.acquire(INTERACTIVE, max_wait=0)
+    with pytest.raises(RateLimited) as raised:
+        bucket.acquire(INTERACTIVE, max_wait=0)
+    assert raised.value.retry_after > 100
+
+def test_waiting_callers_get_tokens_as_they_refill():
+    bucket = TokenBucket(rate=50, capacity=1, reserve=0)
+    bucket.acquire(INTERACTIVE, max_wait=0)
+    started = time.monotonic()
+    bucket.acquire(INTERACTIVE, max_wait=1)
+    assert 0.01 <= time.monotonic() - started < 0.5
+
+def test_a_429_pauses_the_whole_bucket():
+    bucket = TokenBucket(rate=1000, capacity=10, reserve=0)
+    bucket.pause(30)
+    for lane in (INTERACTIVE, BULK):
+        with pytest.raises(RateLimited) as raised:
+            bucket.acquire(lane, max_wait=1)
+        assert raised.value.retry_after > 29
+
+def test_retry_after_reads_seconds_and_dates_else_backs_off():
+    def resp(value):
+        response = FakeResponse(None, status_code=429)
+        response.headers = {"Retry-After": value} if value is not None else {}
+        return response
+    assert 2 <= ratelimit.retry_after(resp("2"), 0) <= 2.2
+    assert 50 <= ratelimit.retry_after(resp(formatdate(time.time() + 60, usegmt=True)), 0) <= 66.1
+    assert 0.5 * 8 <= ratelimit.retry_after(resp(None), 3) <= 8
+    assert ratelimit.retry_after(resp("soon"), 0) <= 1
+
+def test_safe_calls_are_retried_after_a_429_and_others_are_not(todoist, monkeypatch):
+    monkeypatch.setattr(todoist, "rate_429", 1.0)
+    monkeypatch.setattr(todoist, "retry_after", "0")
+    session = todoist_client.get_session()
+    session.bucket.rate = 1000  # a 429 empties the bucket; refill it at once
+    retried = 1 + ratelimit.RATE_LIMIT_RETRIES
+    assert todoist_client.get("/rest/v2/tasks").status_code == 429
+    # REST POSTs carry an X-Request-Id, so Todoist drops a repeat
+    assert todoist_client.post("/rest/v2/tasks", json={"content": "x"}).status_code == 429
+    assert todoist.stats == {"GET /rest/v2/tasks": retried, "POST /rest/v2/tasks": retried}
+    todoist.stats.clear()
+    assert session.post(todoist_client.API_URL + "/rest/v2/tasks", json={"content": "x"}).status_code == 429
+    assert todoist.stats == {"POST /rest/v2/tasks": 1}
+    monkeypatch.setattr(todoist, "rate_429", 0.0)
+    assert todoist_client.get("/rest/v2/tasks").status_code == 200
@@ -0,0 +1,71 @@
+import pytest
+import snapshot
+import tenants
+import todoist_client
+from models import Task
+from snapshot import Snapshot
+from store import TaskStore
+
+def task(task_id, content="x"):
+    return Task.from_sync_item({"id": task_id, "content": content, "project_id": "p1", "labels": ["a"],
+                                "due": {"date": "2024-05-01"}})
+
+def state(*tasks):
+    return {"tasks": {t.id: t for t in tasks}, "labels": {"l1": {"id": "l1", "name": "a"}},
+            "projects": {"p1": {"id": "p1", "name": "Inbox"}}, "sections": {}}
+
+def rows(loaded):
+    return {t.id: t.to_dict() for t in loaded["tasks"]}
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "snapshot.db")
+
+def test_a_saved_sync_loads_back(path):
+    Snapshot(path, "token").save("*", "t1", None, lambda: state(task("1"), task("2")), user_id="u1")
+    loaded = Snapshot(path, "token").load()
+    assert (loaded["sync_token"], loaded["user_id"]) == ("t1", "u1")
+    assert rows(loaded) == {"1": task("1").to_dict(), "2": task("2").to_dict()}
+    assert loaded["labels"] == {"l1": {"id": "l1", "name": "a"}} and loaded["sections"] == {}
+
+def test_a_delta_is_written_only_on_top_of_the_token_it_starts_from(path):
+    snap = Snapshot(path, "token")
+    snap.save("*", "t1", None, lambda: state(task("1"), task("2")))
+    snap.save("t1", "t2", {"tasks": ({"3": task("3")}, ["1"])}, None)
+    assert rows(snap.load()).keys() == {"2", "3"}
+    # Another worker's delta from an older token is skipped while the snapshot is recent
+    snap.save("t1", "t9", {"tasks": ({"4": task("4")}, [])}, lambda: state(task("9")))
+    assert snap.load()["sync_token"] == "t2" and rows(snap.load()).keys() == {"2", "3"}
+
+def test_a_snapshot_that_fell_behind_is_rewritten_in_full(path, monkeypatch):
+    monkeypatch.setattr(snapshot, "SNAPSHOT_MAX_AGE", 0)
+    snap = Snapshot(path, "token")
+    snap.save("*", "t1", None, lambda: state(task("1")))
+    snap.save("t0", "t5", {"tasks": ({"4": task("4")}, [])}, lambda: state(task("9", "full")))
+    loaded = snap.load()
+    assert loaded["sync_token"] == "t5" and rows(loaded) == {"9": task("9", "full").to_dict()}
+
+def test_another_accounts_or_formats_snapshot_is_ignored(path, monkeypatch):
+    Snapshot(path, "token").save("*", "t1", None, lambda: state(task("1")))
+    assert Snapshot(path, "other-token").load() is None
+    monkeypatch.setattr(snapshot, "FORMAT", "0:old")
+    assert Snapshot(path, "token").load() is None
+
+def test_a_new_store_starts_from_the_snapshot_and_pulls_only_a_delta(todoist, tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "SNAPSHOT_PATH", str(tmp_path / "snapshot.db"))
+    tokens = []
+    sync = todoist_client.sync
+    def recording_sync(**data):
+        tokens.append(data.get("sync_token"))
+        return sync(**data)
+    monkeypatch.setattr(todoist_client, "sync", recording_sync)
+    with tenants.use(tenants.get_tenant(tenants.default_token())):
+        first = TaskStore()
+        first.sync()
+        task_id = next(iter(todoist.account.items))
+        todoist.account.sync_commands([{"type": "item_close", "uuid": "u", "args": {"id": task_id}}])
+        second = TaskStore()
+        second.sync()
+    assert tokens == ["*", first.sync_token]
+    assert second.get_task(task_id) is None
+    assert len(second.get_tasks()) == len(first.get_tasks()) - 1
@@ -0,0 +1,46 @@
+import sqlite3
+import threading
+import pytest
+from sqlite_db import Database, transaction
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(str(tmp_path / "test.db"), "CREATE TABLE IF NOT EXISTS t (v INTEGER);", pool_size=2)
+
+def test_connections_are_reused_across_threads(db):
+    with db.connect() as conn:
+        first = conn
+    seen = []
+    def borrow():
+        with db.connect() as conn:
+            seen.append(conn)
+    thread = threading.Thread(target=borrow)
+    thread.start()
+    thread.join()
+    assert seen == [first]
+
+def test_concurrent_borrowers_get_their_own_connection(db):
+    with db.connect() as outer, transaction(outer):
+        outer.execute("INSERT INTO t VALUES (1)")
+        with db.connect() as inner:
+            assert inner is not outer
+            assert inner.execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
+    with db.connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone() == (1,)
+
+def test_pool_keeps_at_most_pool_size_idle_connections(db):
+    with db.connect() as a, db.connect() as b, db.connect() as c:
+        pass
+    assert len(db._idle) == 2
+    with pytest.raises(sqlite3.ProgrammingError):
+        (set([a, b, c]) - set(db._idle)).pop().execute("SELECT 1")
+
+def test_close_closes_idle_connections_and_stops_pooling(db):
+    with db.connect() as conn:
+        pass
+    db.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+    with db.connect() as again:
+        assert again.execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
+    assert db._idle == []
@@ -0,0 +1,167 @@
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+import pytest
+import tenants
+import todoist_client
+from cache import cache_get, cache_set
+from conftest import FakeResponse
+from store import LABEL_MISS_TTL, SyncError, TaskStore
+
+def item(item_id, project_id="p1", labels=(), **fields):
+    return {"id": item_id, "content": f"Task {item_id}", "project_id": project_id, "labels": list(labels),
+            "checked": False, "is_deleted": False, **fields}
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Queue of Sync API replies; records the sync_token each request sent."""
+    replies, tokens = [], []
+
+    def sync(**data):
+        tokens.append(data.get("sync_token"))
+        return replies.pop(0)
+
+    monkeypatch.setattr(todoist_client, "sync", sync)
+    return replies, tokens
+
+def full_sync(items, **resources):
+    return FakeResponse({"full_sync": True, "sync_token": "t1", "items": items, "user": {"id": "u1"}, **resources})
+
+def delta(token, **resources):
+    return FakeResponse({"full_sync": False, "sync_token": token, **resources})
+
+def test_full_sync_skips_completed_and_deleted_items(tenant, upstream):
+    replies, tokens = upstream
+    replies.append(full_sync([item("1"), item("2", checked=True), item("3", is_deleted=True)],
+                             labels=[{"id": "l1", "name": "work"}]))
+    store = TaskStore(sync_interval=3600)
+    store.sync()
+    assert tokens == ["*"]
+    assert [t.id for t in store.get_tasks()] == ["1"]
+    assert store.label_ids(["work"]) == ["l1"]
+    assert store.user_id == "u1" and tenants.for_user("u1") is tenant
+
+def test_delta_upserts_moves_and_removes_tasks(tenant, upstream):
+    replies, tokens = upstream
+    replies.append(full_sync([item("1"), item("2"), item("3", labels=["a"])]))
+    store = TaskStore(sync_interval=3600)
+    store.sync()
+    replies.append(delta("t2", items=[
+        item("1", project_id="p2"), item("2", checked=True), item("3", is_deleted=True), item("4", labels=["a"]),
+    ]))
+    store.sync()
+    assert tokens == ["*", "t1"]
+    assert store.sync_token == "t2"
+    assert [t.id for t in store.query(project_id="p1")] == ["4"]
+    assert [t.id for t in store.query(project_id="p2")] == ["1"]
+    assert [t.id for t in store.query(label="a")] == ["4"]
+    assert store.get_task("2") is None and store.get_task("3") is None
+
+def test_delta_drops_cached_views_of_touched_tasks_only(tenant, upstream):
+    replies, _ = upstream
+    replies.append(full_sync([item("1"), item("2", project_id="p3")]))
+    store = TaskStore(sync_interval=3600)
+    store.sync()
+    cache_set("p1-view", ["1"], tags=("project:p1",))
+    cache_set("p2-view", [], tags=("project:p2",))
+    cache_set("p3-view", ["2"], tags=("project:p3",))
+    replies.append(delta("t2", items=[item("1", project_id="p2")]))
+    store.sync()
+    assert cache_get("p1-view") is None and cache_get("p2-view") is None
+    assert cache_get("p3-view") == ["2"]
+
+def test_failed_first_sync_raises_but_a_failed_delta_serves_the_mirror(tenant, upstream):
+    replies, _ = upstream
+    replies.append(FakeResponse(None, status_code=503))
+    store = TaskStore(sync_interval=3600)
+    with pytest.raises(SyncError):
+        store.get_tasks()
+    replies.append(full_sync([item("1")]))
+    assert [t.id for t in store.get_tasks()] == ["1"]
+    replies.append(FakeResponse(None, status_code=503))
+    store.mark_stale()
+    assert [t.id for t in store.get_tasks()] == ["1"]
+    assert replies == []
+
+def test_delta_applies_label_renames_and_deletions(tenant, upstream):
+    replies, _ = upstream
+    replies.append(full_sync([], labels=[{"id": "l1", "name": "old"}, {"id": "l2", "name": "gone"}]))
+    store = TaskStore(sync_interval=3600)
+    store.sync()
+    replies.append(delta("t2", labels=[{"id": "l1", "name": "new"}, {"id": "l2", "name": "gone", "is_deleted": True}]))
+    store.sync()
+    assert [label["name"] for label in store.get_labels()] == ["new"]
+    assert store.label_ids(["new"]) == ["l1"]
+
+def test_an_unknown_label_name_syncs_once_until_its_miss_expires(tenant, upstream, monkeypatch):
+    replies, tokens = upstream
+    replies.append(full_sync([], labels=[{"id": "l1", "name": "work"}]))
+    store = TaskStore(sync_interval=3600)
+    store.sync()
+    replies.append(delta("t2", labels=[{"id": "l2", "name": "new"}]))
+    assert store.label_ids(["work", "new"]) == ["l1", "l2"]
+    replies.append(delta("t3"))
+    assert store.label_ids(["typo", "work"]) == ["l1"]
+    assert store.label_ids(["typo"]) == []
+    assert tokens == ["*", "t1", "t2"]
+    monkeypatch.setattr(store, "_label_misses", {"typo": time.time() - LABEL_MISS_TTL - 1})
+    replies.append(delta("t4"))
+    assert store.label_ids(["typo"]) == []
+    assert tokens == ["*", "t1", "t2", "t3"]
+
+def later():
+    return (datetime.now(timezone.utc) + timedelta(seconds=30)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+@pytest.fixture
+def synced(todoist):
+    """Builds stores synced with the stand-in account, as separate workers would hold them."""
+    with tenants.use(tenants.get_tenant(tenants.default_token())):
+        def make():
+            store = TaskStore()
+            store.sync()
+            return store
+        yield make
+
+def test_state_tag_names_the_patched_contents(synced, todoist):
+    first, second, third = synced(), synced(), synced()
+    item = next(iter(todoist.account.items.values()))
+    assert first.state_tag() == second.state_tag() == f"{first.sync_token}.0"
+    when = later()
+    first.apply_event("items", {**item, "content": "one"}, triggered_at=when)
+    second.apply_event("items", {**item, "content": "two"}, triggered_at=when)
+    third.apply_event("items", {**item, "content": "one"}, triggered_at=when)
+    assert first.state_tag() != second.state_tag()
+    assert first.state_tag() == third.state_tag()
+    assert first.state_tag().startswith(f"{first.sync_token}.")
+
+def complete_upstream(todoist, task_id):
+    todoist.account.sync_commands([{"type": "item_close", "uuid": task_id, "args": {"id": task_id}}])
+
+def test_an_aged_mirror_is_served_while_one_background_sync_runs(synced, todoist, monkeypatch):
+    store = synced()
+    task_id = next(iter(todoist.account.items))
+    complete_upstream(todoist, task_id)
+    store.last_sync = time.time() - store.sync_interval - 1
+    started, release = threading.Event(), threading.Event()
+    sync = store._sync
+    def slow_sync():
+        started.set()
+        release.wait(5)
+        sync()
+    monkeypatch.setattr(store, "_sync", slow_sync)
+    for _ in range(5):
+        assert store.get_task(task_id) is not None
+    assert started.wait(5)
+    release.set()
+    deadline = time.time() + 5
+    while store.get_many([task_id]) and time.time() < deadline:
+        time.sleep(0.01)
+    assert store.get_task(task_id) is None
+    assert todoist.stats["POST /sync/v9/sync"] == 2
+
+def test_a_mirror_marked_stale_syncs_before_it_is_read(synced, todoist):
+    store = synced()
+    task_id = next(iter(todoist.account.items))
+    complete_upstream(todoist, task_id)
+    store.mark_stale()
+    assert store.get_task(task_id) is None
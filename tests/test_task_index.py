@@ -0,0 +1,79 @@
+from zoneinfo import ZoneInfo
+from models import Task
+from task_index import TaskIndex
+
+def task(task_id, project_id="p1", section_id=None, parent_id=None, labels=(), due=None):
+    return Task.from_sync_item({
+        "id": task_id, "content": f"Task {task_id}", "project_id": project_id, "section_id": section_id,
+        "parent_id": parent_id, "labels": list(labels), "due": {"date": due} if due else None,
+    })
+
+def ids(tasks):
+    return [t.id for t in tasks]
+
+def test_query_intersects_indexes_in_sync_order():
+    index = TaskIndex.build([
+        task("1", labels=["Work"]),
+        task("2", project_id="p2", labels=["work"]),
+        task("3", section_id="s1", labels=["home"]),
+        task("4", section_id="s1", labels=["WORK"]),
+    ])
+    assert ids(index.query(project_id="p1")) == ["1", "3", "4"]
+    assert ids(index.query(label="work")) == ["1", "2", "4"]
+    assert ids(index.query(project_id="p1", section_id="s1", label="Work")) == ["4"]
+    assert ids(index.query(project_id="nope")) == []
+    assert ids(index.query()) == ["1", "2", "3", "4"]
+
+def test_add_replaces_and_reindexes():
+    index = TaskIndex.build([task("1", labels=["a"], due="2024-05-01")])
+    index.add(task("1", project_id="p2", labels=["b"], due="2024-06-01"))
+    assert len(index) == 1
+    assert index.query(project_id="p1") == []
+    assert ids(index.query(project_id="p2", label="b")) == ["1"]
+    assert index.query(label="a") == []
+    assert index.ids_due_between("2024-05-01", "2024-05-31") == set()
+    assert index.ids_due_between("2024-06-01", "2024-06-01") == {"1"}
+
+def test_remove_drops_every_index_entry():
+    index = TaskIndex.build([task("1", section_id="s1", labels=["a"], due="2024-05-01"), task("2", parent_id="1")])
+    index.remove("1")
+    index.remove("missing")
+    assert index.get("1") is None
+    assert "p1" in index.by_project and "s1" not in index.by_section and "a" not in index.by_label
+    assert index.due_keys == []
+    assert ids(index.query(project_id="p1")) == ["2"]
+
+def test_added_tasks_keep_their_first_sync_position():
+    index = TaskIndex.build([task("1"), task("2")])
+    index.add(task("3"))
+    index.add(task("1", labels=["x"]))
+    assert ids(index.query(project_id="p1")) == ["1", "2", "3"]
+
+def test_descendants_lists_parents_before_children():
+    index = TaskIndex.build([
+        task("1"), task("2", parent_id="1"), task("3", parent_id="2"), task("4", parent_id="1"), task("5"),
+    ])
+    assert ids(index.descendants("1")) == ["2", "4", "3"]
+    assert index.descendants("5") == []
+
+def test_ids_due_between_all_day_tasks_ignore_the_timezone():
+    index = TaskIndex.build([
+        task("day", due="2024-05-01"),
+        task("floating", due="2024-05-01T23:30:00"),
+        task("next", due="2024-05-02"),
+    ])
+    for tz in (ZoneInfo("UTC"), ZoneInfo("Pacific/Auckland"), ZoneInfo("America/Los_Angeles")):
+        assert index.ids_due_between("2024-05-01", "2024-05-01", tz) == {"day", "floating"}
+    assert index.ids_due_between("2024-05-02", None) == {"next"}
+    assert index.ids_due_between(None, "2024-04-30") == set()
+
+def test_ids_due_between_fixed_time_tasks_fall_on_the_viewers_local_day():
+    # 23:30 UTC on May 1st is already May 2nd in Berlin, still May 1st in New York
+    index = TaskIndex.build([task("late", due="2024-05-01T23:30:00Z"), task("early", due="2024-05-01T02:00:00Z")])
+    utc, berlin, new_york = ZoneInfo("UTC"), ZoneInfo("Europe/Berlin"), ZoneInfo("America/New_York")
+    assert index.ids_due_between("2024-05-01", "2024-05-01", utc) == {"late", "early"}
+    assert index.ids_due_between("2024-05-01", "2024-05-01", berlin) == {"early"}
+    assert index.ids_due_between("2024-05-02", "2024-05-02", berlin) == {"late"}
+    assert index.ids_due_between("2024-05-01", "2024-05-01", new_york) == {"late"}
+    assert index.ids_due_between("2024-04-30", "2024-04-30", new_york) == {"early"}
+    assert ids(index.query(due_from="2024-05-02", due_to="2024-05-02", tz=berlin)) == ["late"]
@@ -0,0 +1,67 @@
+import json
+import pytest
+from tasks import tasks_bp
+
+@pytest.fixture
+def client(todoist, make_client):
+    return make_client(tasks_bp)
+
+def add_subtask(todoist, parent_id, content):
+    todoist.account.sync_commands([{"type": "item_add", "uuid": content, "temp_id": content,
+                                    "args": {"content": content, "parent_id": parent_id,
+                                             "project_id": todoist.account.items[parent_id]["project_id"]}}])
+    return next(i for i, item in todoist.account.items.items() if item["content"] == content)
+
+def test_move_task_is_one_sync_request(client, todoist):
+    client.get("/list-tasks")  # the mirror is warm, as in steady state
+    task_id = next(iter(todoist.account.items))
+    todoist.stats.clear()
+    resp = client.post("/move-task", json={"task_id": task_id, "project_id": "p9"})
+    assert resp.status_code == 200
+    assert resp.get_json()["project_id"] == "p9" and resp.get_json()["section_id"] is None
+    assert todoist.stats == {"POST /sync/v9/sync": 1}
+    assert todoist.account.items[task_id]["project_id"] == "p9"
+
+def test_move_task_reports_todoists_answer_for_an_unknown_task(client, todoist):
+    resp = client.post("/move-task", json={"task_id": "missing", "project_id": "p9"})
+    assert resp.status_code == 404
+
+def test_duplicate_task_copies_the_subtask_tree_in_one_batch(client, todoist):
+    root = next(iter(todoist.account.items))
+    child = add_subtask(todoist, root, "child")
+    add_subtask(todoist, child, "grandchild")
+    client.get("/list-tasks")
+    todoist.stats.clear()
+    resp = client.post("/duplicate-task", json={"task_id": root})
+    assert resp.status_code == 200
+    copy = resp.get_json()
+    assert copy["content"].startswith("Copy of: ") and len(copy["subtask_ids"]) == 2
+    copied_child, copied_grandchild = (todoist.account.items[i] for i in copy["subtask_ids"])
+    assert copied_child["parent_id"] == copy["id"] and copied_grandchild["parent_id"] == copied_child["id"]
+    assert todoist.stats == {"POST /sync/v9/sync": 1}
+
+def test_list_tasks_pages_through_every_task_with_cursors(client, todoist):
+    seen, cursor = [], None
+    while True:
+        resp = client.get("/list-tasks", query_string={"limit": 7, **({"cursor": cursor} if cursor else {})})
+        assert resp.status_code == 200
+        page = resp.get_json()
+        assert len(page) <= 7
+        seen += [task["id"] for task in page]
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == [task["id"] for task in client.get("/list-tasks").get_json()]
+    assert sorted(seen) == sorted(todoist.account.items)
+
+@pytest.mark.parametrize("fmt", ["stream", "ndjson"])
+def test_list_tasks_streams_the_same_tasks(client, fmt):
+    expected = client.get("/list-tasks").get_json()
+    resp = client.get("/list-tasks", query_string={"format": fmt})
+    body = resp.get_data(as_text=True)
+    tasks = json.loads(body) if fmt == "stream" else [json.loads(line) for line in body.splitlines()]
+    assert tasks == expected
+
+@pytest.mark.parametrize("query", [{"cursor": "bogus"}, {"limit": 0}, {"limit": "x"}, {"format": "xml"}])
+def test_list_tasks_rejects_bad_paging_arguments(client, query):
+    assert client.get("/list-tasks", query_string=query).status_code == 400
@@ -0,0 +1,49 @@
+import uuid
+import pytest
+import tenants
+import todoist_client
+
+def token():
+    return f"test-{uuid.uuid4().hex}"
+
+@pytest.fixture
+def resident(monkeypatch):
+    """At most two resident tenants, starting from none."""
+    monkeypatch.setattr(tenants, "TENANT_MAX_RESIDENT", 2)
+    monkeypatch.setattr(tenants, "_resident", tenants.OrderedDict())
+    monkeypatch.setattr(tenants, "_users", {})
+
+def test_bearer_token_picks_the_tenant(make_client):
+    app = make_client()
+    app.application.add_url_rule("/who", "who", lambda: tenants.current().key)
+    first = token()
+    assert app.get("/who", headers={"Authorization": f"Bearer {first}"}).text == tenants.tenant_key(first)
+
+def test_webhooks_route_only_to_the_tenant_that_reported_the_user(resident):
+    alice, bob = tenants.get_tenant(token()), tenants.get_tenant(token())
+    tenants.register_user(1, alice)
+    tenants.register_user("2", bob)
+    assert tenants.for_user("1") is alice and tenants.for_user(2) is bob
+    assert tenants.for_user(3) is None
+
+def test_evicting_a_tenant_forgets_its_token_users_and_session(resident):
+    oldest = tenants.get_tenant(token())
+    tenants.register_user(1, oldest)
+    with tenants.use(oldest):
+        todoist_client.get_session()
+    tenants.get_tenant(token())
+    tenants.get_tenant(token())
+    assert oldest.key not in tenants._resident
+    assert tenants.for_user(1) is None and tenants._users == {}
+    assert tenants.by_key(oldest.key) is None
+    assert oldest._resources == {}
+    tenants.register_user(1, oldest)
+    assert tenants._users == {}
+
+def test_each_tenant_session_has_its_own_bucket(resident):
+    first, second = tenants.get_tenant(token()), tenants.get_tenant(token())
+    with tenants.use(first):
+        one, again = todoist_client.get_session(), todoist_client.get_session()
+    with tenants.use(second):
+        two = todoist_client.get_session()
+    assert one is again and one.bucket is not two.bucket
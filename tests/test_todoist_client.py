@@ -0,0 +1,56 @@
+import todoist_client
+from conftest import FakeResponse
+
+class FakeSync:
+    """Sync endpoint that creates items for item_add and answers every command "ok"."""
+    def __init__(self, fail_chunk=None):
+        self.chunks = []
+        self.fail_chunk = fail_chunk
+        self.next_id = 100
+
+    def __call__(self, commands):
+        self.chunks.append(commands)
+        if len(self.chunks) == self.fail_chunk:
+            return FakeResponse(None, status_code=503)
+        mapping = {}
+        for cmd in commands:
+            if cmd.get("temp_id"):
+                self.next_id += 1
+                mapping[cmd["temp_id"]] = str(self.next_id)
+        return FakeResponse({"sync_status": {cmd["uuid"]: "ok" for cmd in commands}, "temp_id_mapping": mapping})
+
+def test_sync_commands_rewrites_temp_ids_from_earlier_chunks(monkeypatch):
+    fake = FakeSync()
+    monkeypatch.setattr(todoist_client, "sync", fake)
+    monkeypatch.setattr(todoist_client, "SYNC_COMMAND_LIMIT", 2)
+    parent = todoist_client.command("item_add", {"content": "parent"}, temp_id="tmp-parent")
+    child = todoist_client.command("item_add", {"content": "child", "parent_id": "tmp-parent"}, temp_id="tmp-child")
+    sibling = todoist_client.command("item_add", {"content": "sibling", "parent_id": "tmp-parent"}, temp_id="tmp-sib")
+    move = todoist_client.command("item_move", {"id": "tmp-child", "project_id": "p9"})
+    grandchild = todoist_client.command("item_add", {"content": "grandchild", "parent_id": "tmp-child"})
+
+    sync_status, mapping = todoist_client.sync_commands([parent, child, sibling, move, grandchild])
+
+    assert [len(chunk) for chunk in fake.chunks] == [2, 2, 1]
+    # Within the first chunk Todoist resolves the temp_id itself
+    assert fake.chunks[0][1]["args"]["parent_id"] == "tmp-parent"
+    assert fake.chunks[1][0]["args"]["parent_id"] == mapping["tmp-parent"]
+    assert fake.chunks[1][1]["args"] == {"id": mapping["tmp-child"], "project_id": "p9"}
+    assert fake.chunks[2][0]["args"]["parent_id"] == mapping["tmp-child"]
+    assert set(mapping) == {"tmp-parent", "tmp-child", "tmp-sib"}
+    assert set(sync_status.values()) == {"ok"} and len(sync_status) == 5
+    # The caller's commands are left as they were
+    assert move["args"]["id"] == "tmp-child"
+
+def test_sync_commands_reports_a_failed_chunk_per_command(monkeypatch):
+    fake = FakeSync(fail_chunk=2)
+    monkeypatch.setattr(todoist_client, "sync", fake)
+    monkeypatch.setattr(todoist_client, "SYNC_COMMAND_LIMIT", 1)
+    commands = [todoist_client.command("item_close", {"id": str(n)}) for n in range(3)]
+
+    sync_status, _ = todoist_client.sync_commands(commands)
+
+    assert sync_status[commands[0]["uuid"]] == "ok"
+    assert sync_status[commands[1]["uuid"]]["http_code"] == 503
+    assert todoist_client.command_result(sync_status[commands[1]["uuid"]]) == 503
+    assert sync_status[commands[2]["uuid"]] == "ok"
@@ -0,0 +1,76 @@
+import base64
+import hashlib
+import hmac
+import json
+from datetime import datetime, timedelta, timezone
+import pytest
+import tenants
+import webhook
+from store import get_store
+from webhook import webhook_bp
+
+def stamp(seconds_from_now):
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds_from_now)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+def updated(item, content, triggered_at):
+    return {"event_name": "item:updated", "triggered_at": triggered_at, "event_data": {**item, "content": content}}
+
+@pytest.fixture
+def client(todoist, make_client):
+    return make_client(webhook_bp)
+
+@pytest.fixture
+def store(todoist):
+    with tenants.use(tenants.get_tenant(tenants.default_token())):
+        store = get_store()
+        store.sync()
+        yield store
+
+def content(store, task_id):
+    tasks = store.get_many([task_id])
+    return tasks[0].content if tasks else None
+
+def test_signature_is_checked_when_a_secret_is_set(client, monkeypatch):
+    monkeypatch.setattr(webhook, "WEBHOOK_SECRET", "s3cret")
+    body = json.dumps({"event_name": "note:added"}).encode()
+    signature = base64.b64encode(hmac.new(b"s3cret", body, hashlib.sha256).digest()).decode()
+    headers = {"Content-Type": "application/json"}
+    assert client.post("/todoist-webhook", data=body, headers=headers).status_code == 401
+    assert client.post("/todoist-webhook", data=body,
+                       headers={**headers, "X-Todoist-Hmac-SHA256": "bogus"}).status_code == 401
+    assert client.post("/todoist-webhook", data=body,
+                       headers={**headers, "X-Todoist-Hmac-SHA256": signature}).status_code == 200
+
+def test_an_event_newer_than_the_last_sync_patches_the_mirror(client, store, todoist):
+    task_id, item = next(iter(todoist.account.items.items()))
+    resp = client.post("/todoist-webhook", json=updated(item, "hooked", stamp(30)))
+    assert resp.get_json() == {"status": "received"}
+    assert content(store, task_id) == "hooked"
+    assert store.state_tag() != f"{store.sync_token}.0"
+    assert not store.is_stale()
+
+def test_a_redelivered_event_is_applied_once(client, store, todoist):
+    task_id, item = next(iter(todoist.account.items.items()))
+    headers = {"X-Todoist-Delivery-ID": "d-1"}
+    assert client.post("/todoist-webhook", json=updated(item, "first", stamp(30)), headers=headers).get_json() == {"status": "received"}
+    assert client.post("/todoist-webhook", json=updated(item, "retry", stamp(31)), headers=headers).get_json() == {"status": "duplicate"}
+    assert content(store, task_id) == "first"
+
+def test_a_late_event_does_not_undo_what_a_sync_already_applied(client, store, todoist):
+    task_id, item = next(iter(todoist.account.items.items()))
+    before = stamp(-60)
+    todoist.account.sync_commands([{"type": "item_close", "uuid": "u", "args": {"id": task_id}}])
+    store.sync()
+    assert content(store, task_id) is None
+    # A retry of an update made before the task was completed
+    client.post("/todoist-webhook", json=updated(item, "stale", before))
+    assert content(store, task_id) is None
+    assert store.is_stale()
+    store.sync()
+    assert content(store, task_id) is None
+
+def test_an_event_without_a_time_only_marks_the_mirror_stale(client, store, todoist):
+    task_id, item = next(iter(todoist.account.items.items()))
+    client.post("/todoist-webhook", json=updated(item, "untimed", None))
+    assert content(store, task_id) == item["content"]
+    assert store.is_stale()
@@ -0,0 +1,150 @@
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import ratelimit
+import singleflight
+import tenants
+from access_log import record_upstream_call
+from metrics import observe_upstream
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+TODOIST_URL = "https://api.todoist.com"
+# Base URL for every Todoist call (overridable to point at a stand-in server)
+API_URL = os.getenv("TODOIST_API_URL", TODOIST_URL).rstrip("/")
+# Keep-alive connections per tenant per worker process
+POOL_SIZE = int(os.getenv("TODOIST_POOL_SIZE", "10"))
+# Seconds to wait for Todoist before giving up: connect, read
+TIMEOUT = (float(os.getenv("TODOIST_CONNECT_TIMEOUT", "5")), float(os.getenv("TODOIST_READ_TIMEOUT", "30")))
+# Todoist accepts at most this many commands per sync request
+SYNC_COMMAND_LIMIT = 100
+# Command args that may hold a temp_id from an earlier command
+TEMP_ID_ARGS = ("id", "item_id", "parent_id", "project_id", "section_id")
+# Transport-level retries for connection errors and 502/503/504 on idempotent methods
+RETRIES = int(os.getenv("TODOIST_RETRIES", "2"))
+
+def api_token():
+    """The current tenant's Todoist API token (see tenants.resolve)."""
+    return tenants.current().token
+
+class _StandInAdapter(HTTPAdapter):
+    """Sends calls addressed to TODOIST_URL (the SDK's hard-coded base) to API_URL instead."""
+    def send(self, request, **kwargs):
+        request.url = API_URL + request.url[len(TODOIST_URL):]
+        return super().send(request, **kwargs)
+
+def _build_session():
+    retry = Retry(
+        total=RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "DELETE"}),
+        raise_on_status=False,
+        # 429s are retried by RateLimitedSession through the token bucket, never in here
+        respect_retry_after_header=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = ratelimit.RateLimitedSession()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if API_URL != TODOIST_URL:
+        session.mount(TODOIST_URL, _StandInAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry))
+    return session
+
+def get_session():
+    """
+    Return the current tenant's pooled keep-alive Session, so one account's slow calls
+    can't hold every connection. Tenants are rebuilt after a fork, and so are their sessions.
+    """
+    return tenants.current().resource("session", _build_session)
+
+def request(method, path, **kwargs):
+    """
+    Send a request to Todoist through the pooled, rate-limited session.
+    `path` is relative to API_URL (e.g. "/rest/v2/tasks"); requests sets the content type.
+    Raises ratelimit.RateLimited if the call would queue longer than its lane allows.
+    """
+    headers = {"Authorization": f"Bearer {api_token()}", **kwargs.pop("headers", {})}
+    if method == "POST" and not path.startswith("/sync/"):
+        # Lets Todoist drop duplicates, which makes REST POSTs safe to retry after a 429
+        headers.setdefault("X-Request-Id", str(uuid.uuid4()))
+    kwargs.setdefault("timeout", TIMEOUT)
+    record_upstream_call()
+    started = time.perf_counter()
+    resp = None
+    try:
+        resp = get_session().request(method, API_URL + path, headers=headers, **kwargs)
+        return resp
+    finally:
+        observe_upstream(method, path, resp.status_code if resp is not None else "error",
+                         time.perf_counter() - started, len(resp.content) if resp is not None else 0)
+
+def get(path, **kwargs):
+    """GET through the pool; identical concurrent GETs share one upstream call and its response."""
+    key = ("GET", api_token(), path, repr(sorted((kwargs.get("params") or {}).items())))
+    return singleflight.do(key, lambda: request("GET", path, **kwargs))
+
+def post(path, **kwargs):
+    return request("POST", path, **kwargs)
+
+def delete(path, **kwargs):
+    return request("DELETE", path, **kwargs)
+
+def sync(**data):
+    """POST to the Sync API endpoint; pass commands=[...] or sync_token/resource_types."""
+    return post("/sync/v9/sync", json=data)
+
+def gather(*calls):
+    """
+    Run independent upstream calls concurrently and return their results in order.
+    Under the gevent worker (see gunicorn.conf.py) these run as greenlets.
+    Calls stay in the caller's rate-limit lane.
+    The first exception raised by any call is re-raised after all have finished.
+    """
+    if len(calls) < 2:
+        return [call() for call in calls]
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        futures = [pool.submit(ratelimit.bind(call)) for call in calls]
+    return [future.result() for future in futures]
+
+def command(command_type, args, temp_id=None):
+    """Build one Sync API command with a fresh uuid."""
+    cmd = {"type": command_type, "uuid": str(uuid.uuid4()), "args": args}
+    if temp_id:
+        cmd["temp_id"] = temp_id
+    return cmd
+
+def sync_commands(commands):
+    """
+    Send Sync API commands in chunks of SYNC_COMMAND_LIMIT.
+    Returns (sync_status, temp_id_mapping) merged across chunks. Commands in a chunk
+    whose request failed get {"error": ..., "http_code": ...} as their status.
+    A command may refer to a temp_id created in an earlier chunk; it is sent with the real ID.
+    """
+    sync_status, temp_id_mapping = {}, {}
+    for start in range(0, len(commands), SYNC_COMMAND_LIMIT):
+        chunk = commands[start:start + SYNC_COMMAND_LIMIT]
+        if temp_id_mapping:
+            chunk = [{**cmd, "args": {k: temp_id_mapping.get(v, v) if k in TEMP_ID_ARGS else v
+                                      for k, v in cmd["args"].items()}} for cmd in chunk]
+        resp = sync(commands=chunk)
+        try:
+            data = resp.json()
+        except ValueError:
+            data = None
+        if resp.status_code != 200 or not isinstance(data, dict):
+            failure = {"error": resp.text or "Sync request failed", "http_code": resp.status_code}
+            sync_status.update({cmd["uuid"]: failure for cmd in chunk})
+            continue
+        sync_status.update(data.get("sync_status", {}))
+        temp_id_mapping.update(data.get("temp_id_mapping", {}))
+    return sync_status, temp_id_mapping
+
+def command_result(status):
+    """Map a sync_status entry to an HTTP-like status code for per-item reports."""
+    if status == "ok":
+        return 200
+    if isinstance(status, dict):
+        return status.get("http_code", 400)
+    return 500
@@ -1,30 +1,24 @@
-import os
-import requests
+import todoist_client
 
 def get_headers():
     """
-    Returns headers for Todoist API requests using the API key from environment.
+    Returns headers for Todoist API requests with the current tenant's API token.
     """
-    api_key = os.getenv("TODOIST_API_KEY")
-    if not api_key:
-        raise ValueError("TODOIST_API_KEY environment variable not set.")
     return {
-        "Authorization": f"Bearer {api_key}",
+        "Authorization": f"Bearer {todoist_client.api_token()}",
         "Content-Type": "application/json"
     }
 
 def get_all_tasks():
     """
-    Fetch all active Todoist tasks using the environment API key.
+    Fetch all active Todoist tasks for the current tenant.
     """
-    headers = get_headers()
-    resp = requests.get("https://api.todoist.com/rest/v2/tasks", headers=headers)
+    resp = todoist_client.get("/rest/v2/tasks")
     return resp.json()
 
 def get_completed_tasks():
     """
-    Fetch all completed Todoist tasks using the environment API key.
+    Fetch all completed Todoist tasks for the current tenant.
     """
-    headers = get_headers()
-    resp = requests.get("https://api.todoist.com/sync/v9/completed/get_all", headers=headers)
+    resp = todoist_client.get("/sync/v9/completed/get_all")
     return resp.json()
@@ -1,20 +1,70 @@
+import os
+import hmac
+import base64
+import hashlib
 from flask import Blueprint, request, jsonify
-from cache import cache_clear
+from cache import cache_get, cache_set
+from store import get_store
+import tenants
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The app's client secret; when set, deliveries must carry a valid X-Todoist-Hmac-SHA256
+WEBHOOK_SECRET = os.getenv("TODOIST_CLIENT_SECRET")
+# Seconds a delivery ID is remembered, so Todoist's retries are applied only once
+WEBHOOK_DEDUPE_TTL = int(os.getenv("WEBHOOK_DEDUPE_TTL", "3600"))
+
+# Webhook object type -> store resource
+RESOURCES = {"item": "items", "label": "labels", "project": "projects", "section": "sections"}
+# Events whose effect on tasks isn't in the payload (moved, renamed or hidden tasks);
+# the mirror pulls a delta on the next read
+RESYNC_EVENTS = {
+    "label:updated", "label:deleted",
+    "project:deleted", "project:archived", "project:unarchived",
+    "section:deleted", "section:archived", "section:unarchived",
+}
 
 webhook_bp = Blueprint('webhook', __name__)
 
+def valid_signature(body, signature):
+    """Check X-Todoist-Hmac-SHA256: base64 HMAC-SHA256 of the raw body, keyed with the client secret."""
+    expected = base64.b64encode(hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).digest()).decode()
+    return hmac.compare_digest(expected, signature or "")
+
 @webhook_bp.route('/todoist-webhook', methods=['POST'])
 def todoist_webhook():
-    event = request.get_json()
-    print("Received webhook event:", event)
+    if WEBHOOK_SECRET and not valid_signature(request.get_data(), request.headers.get("X-Todoist-Hmac-SHA256")):
+        logger.warning("Rejected webhook with an invalid signature")
+        return jsonify({"error": "Invalid signature"}), 401
+
+    event = request.get_json(silent=True) or {}
+    logger.debug("Received webhook event: %s", event)
+
+    # Deliveries are addressed by Todoist user ID; accounts that aren't loaded in this
+    # worker catch up through their next delta sync
+    tenant = tenants.for_user(event.get("user_id"))
+    if tenant is None:
+        return jsonify({"status": "ignored"}), 200
+
+    with tenants.use(tenant):
+        delivery_id = request.headers.get("X-Todoist-Delivery-ID")
+        if delivery_id:
+            if cache_get(f"webhook_delivery_{delivery_id}"):
+                return jsonify({"status": "duplicate"}), 200
+            cache_set(f"webhook_delivery_{delivery_id}", True, ttl=WEBHOOK_DEDUPE_TTL)
 
-    event_type = event.get("event_name")
-    user_id = event.get("initiator", {}).get("id")  # If available
+        event_type = event.get("event_name") or ""
+        object_type, _, action = event_type.partition(":")
+        store = get_store()
 
-    if event_type in ["item:added", "item:updated", "item:deleted"]:
-        cache_clear()
-        print("Cache cleared due to item event.")
+        if object_type in RESOURCES:
+            # Patch the mirror from the payload; only views the object was or is in are dropped
+            store.apply_event(RESOURCES[object_type], event.get("event_data") or {}, removed=action == "deleted",
+                              triggered_at=event.get("triggered_at"))
+            if event_type in RESYNC_EVENTS:
+                store.mark_stale()
 
-    # Add more event handling as needed
+    # note:* events need nothing: comments aren't mirrored or cached
 
     return jsonify({"status": "received"}), 200